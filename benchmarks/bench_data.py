@@ -0,0 +1,156 @@
+import os
+import sys
+import json
+import atexit
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+from datetime import datetime
+
+import datagen
+
+# Đo hiệu năng tầng dữ liệu (DataManager) trên dữ liệu giả lập nhiều cỡ, ghi kết quả JSON và so sánh hai lần chạy
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PRESETS = {"small": (1000, 1000), "medium": (100000, 20000), "large": (1000000, 200000)}
+
+def import_app():
+    # main tạo store mặc định ngay khi import; chuyển sang thư mục tạm để không đụng vào dữ liệu thật
+    sys.path.insert(0, ROOT)
+    workdir = tempfile.mkdtemp(prefix="event_bench_app_")
+    atexit.register(shutil.rmtree, workdir, True)
+    os.chdir(workdir)
+    import main
+    return main
+
+def parse_size(text):
+    if text in PRESETS: return PRESETS[text]
+    events, _, users = text.partition("x")
+    return int(events), int(users or events)
+
+def make_store(app, backend, workdir):
+    data_path = os.path.join(workdir, app.DATA_FILE)
+    if backend == "json": return app.JsonStore(data_path)
+    if backend == "sqlite": return app.SqliteStore(os.path.join(workdir, app.SQLITE_FILE), json_path=None)
+    return app.JournalStore(data_path, data_path + ".journal")
+
+def summarize(op, samples, unit):
+    scale = 1000 if unit == "ms" else 1000000
+    values = sorted(s * scale for s in samples)
+    return {"op": op, "unit": unit, "n": len(values), "median": round(statistics.median(values), 3),
+            "p95": round(values[min(len(values) - 1, int(len(values) * 0.95))], 3),
+            "min": round(values[0], 3), "mean": round(statistics.fmean(values), 3)}
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+def bench_size(app, events, users, args):
+    workdir = tempfile.mkdtemp(prefix="event_bench_")
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    make_store(app, args.backend, workdir).save(datagen.generate(events, users, args.seed))
+    print(f"  sinh dữ liệu {events}x{users}: {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    results = []
+    try:
+        samples = []
+        for _ in range(args.repeat):
+            dm = app.DataManager(make_store(app, args.backend, workdir), load=False)
+            samples.append(timed(dm.load_data))
+        results.append(summarize("load_data", samples, "ms"))
+        results.append(summarize("save_data", [timed(dm.save_data) for _ in range(args.repeat)], "ms"))
+
+        n = min(args.ops, users)
+        picked = rng.sample(dm.data["users"], n)
+        results.append(summarize("login", [timed(dm.login, u["username"], u["password"]) for u in picked], "us"))
+        dm.flush()
+
+        samples = []
+        for i in range(args.ops):
+            user = {"username": f"bench{i}", "password": "x", "full_name": "Bench", "email": f"bench{i}@example.com", "role": "user"}
+            samples.append(timed(dm.register_user, user))
+        results.append(summarize("register_user", samples, "us"))
+        dm.flush()
+
+        event_ids = [e["id"] for e in rng.sample(dm.data["events"], min(args.ops, events))]
+        user_ids = [u["id"] for u in picked]
+        samples = [timed(dm.toggle_participation, event_ids[i % len(event_ids)], user_ids[i % len(user_ids)]) for i in range(args.ops)]
+        results.append(summarize("toggle_participation", samples, "us"))
+        dm.flush()
+
+        samples = []
+        for event_id in event_ids:
+            changed = {k: v for k, v in dm.get_event(event_id).items() if k not in ("id", "participants")}
+            changed["title"] += " (cập nhật)"
+            samples.append(timed(dm.update_event, event_id, changed))
+        results.append(summarize("update_event", samples, "us"))
+        dm.flush()
+
+        samples = []
+        for u in picked:
+            dm.login(u["username"], u["password"])
+            samples.append(timed(dm.delete_account))
+        results.append(summarize("delete_account", samples, "us"))
+        dm.flush()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    for r in results: r["size"] = f"{events}x{users}"
+    return results
+
+def run(args):
+    out = os.path.abspath(args.out) if args.out else None
+    app = import_app()
+    results = []
+    for text in args.sizes.split(","):
+        events, users = parse_size(text.strip())
+        print(f"== {events} sự kiện x {users} người dùng ({args.backend})", file=sys.stderr)
+        size_results = bench_size(app, events, users, args)
+        for r in size_results: print(f"  {r['op']:<22}{r['median']:>12.3f} {r['unit']:<3} (p95 {r['p95']:.3f}, n={r['n']})", file=sys.stderr)
+        results += size_results
+    report = {"meta": {"created": datetime.now().isoformat(timespec="seconds"), "backend": args.backend, "seed": args.seed,
+                       "repeat": args.repeat, "ops": args.ops, "python": platform.python_version(), "platform": platform.platform()},
+              "results": results}
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if out:
+        with open(out, "w", encoding="utf-8") as f: f.write(text)
+    else: print(text)
+    return 0
+
+def compare(args):
+    with open(args.base, encoding="utf-8") as f: base = {(r["size"], r["op"]): r for r in json.load(f)["results"]}
+    with open(args.new, encoding="utf-8") as f: new = {(r["size"], r["op"]): r for r in json.load(f)["results"]}
+    slower = []
+    print(f"{'size':<16}{'op':<22}{'base':>12}{'new':>12}{'change':>10}")
+    for key in sorted(base.keys() & new.keys()):
+        b, n = base[key]["median"], new[key]["median"]
+        change = (n - b) / b if b else 0.0
+        flag = change > args.threshold
+        if flag: slower.append(key)
+        print(f"{key[0]:<16}{key[1]:<22}{b:>12.3f}{n:>12.3f}{change:>+9.0%}{'  CHẬM HƠN' if flag else ''}")
+    for key in sorted(base.keys() ^ new.keys()): print(f"{key[0]:<16}{key[1]:<22} chỉ có trong {'base' if key in base else 'new'}")
+    if slower: print(f"{len(slower)} phép đo chậm hơn quá {args.threshold:.0%}", file=sys.stderr)
+    return 1 if slower else 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark tầng dữ liệu Quản Lý Sự Kiện")
+    commands = parser.add_subparsers(dest="command", required=True)
+    cmd = commands.add_parser("run")
+    cmd.add_argument("--sizes", default="small,medium", help="Danh sách cỡ dữ liệu: small/medium/large hoặc <events>x<users>")
+    cmd.add_argument("--backend", choices=("json", "journal", "sqlite"), default="journal")
+    cmd.add_argument("--repeat", type=int, default=3, help="Số lần đo load_data/save_data")
+    cmd.add_argument("--ops", type=int, default=200, help="Số thao tác cho mỗi phép đo nhỏ")
+    cmd.add_argument("--seed", type=int, default=42)
+    cmd.add_argument("-o", "--out", help="Ghi kết quả JSON ra file (mặc định in ra stdout)")
+    cmd = commands.add_parser("compare")
+    cmd.add_argument("base")
+    cmd.add_argument("new")
+    cmd.add_argument("--threshold", type=float, default=0.2, help="Báo chậm khi median tăng quá tỉ lệ này (mặc định 0.2 = 20%%)")
+    args = parser.parse_args(argv)
+    return run(args) if args.command == "run" else compare(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
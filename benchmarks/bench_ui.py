@@ -0,0 +1,216 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+
+import datagen
+from bench_data import PRESETS, ROOT, parse_size, summarize
+
+# Đo hiệu năng giao diện: chạy MainWindow thật với QPA "offscreen" trên dữ liệu giả lập, mỗi cỡ dữ liệu một tiến trình riêng
+try: import resource
+except ImportError: resource = None
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as f: return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1048576
+    except (OSError, ValueError, AttributeError): return None
+
+def peak_rss_mb():
+    if resource is None: return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1048576 if sys.platform == "darwin" else peak / 1024
+
+class Harness:
+    def __init__(self, app, main):
+        self.app = app
+        self.main = main
+        self.samples = {}
+        self.modal_hits = 0
+        self.dialog = None
+        # Hộp thoại modal bất ngờ (trùng lịch, báo lỗi...) sẽ chặn kịch bản: tự đóng và ghi nhận lại
+        self.watchdog = main.QTimer()
+        self.watchdog.setInterval(200)
+        self.watchdog.timeout.connect(self.close_modal)
+        self.watchdog.start()
+
+    def close_modal(self):
+        modal = self.main.QApplication.activeModalWidget()
+        if modal is not None:
+            self.modal_hits += 1
+            modal.close()
+
+    def pump(self, rounds=3):
+        # processEvents liên tục không nghỉ làm PySide6 crash, nên chờ một chút giữa các lượt
+        for _ in range(rounds):
+            self.app.processEvents()
+            time.sleep(0.01)
+        self.main.QCoreApplication.sendPostedEvents(None, self.main.QEvent.DeferredDelete)
+
+    def step(self, name, fn, target=None):
+        start = time.perf_counter()
+        fn()
+        (target() if target else self.window).repaint()
+        elapsed = time.perf_counter() - start
+        self.pump()
+        s = self.samples.setdefault(name, {"times": [], "widgets": 0, "rss_mb": 0.0, "peak_rss_mb": 0.0})
+        s["times"].append(elapsed)
+        s["widgets"] = max(s["widgets"], len(self.main.QApplication.allWidgets()))
+        s["rss_mb"] = max(s["rss_mb"], rss_mb() or 0.0)
+        s["peak_rss_mb"] = max(s["peak_rss_mb"], peak_rss_mb() or 0.0)
+
+    def start_window(self):
+        main = self.main
+        self.window = main.MainWindow()
+        self.window.resize(1280, 800)
+        self.window.show()
+        main.startup.mark("window_shown")
+        self.window.start()
+        while self.window.splash is not None: self.pump(1)
+        self.pump()
+        report = main.startup.report()
+        self.samples["startup"] = {"times": [(report["first_screen"] - report["window_shown"]) / 1000],
+                                   "widgets": len(main.QApplication.allWidgets()), "rss_mb": rss_mb() or 0.0, "peak_rss_mb": peak_rss_mb() or 0.0}
+
+    def login(self, name, user):
+        def fn():
+            self.window.navigate("login")
+            screen = self.window.screens.peek("login")
+            screen.txt_user.setText(user["username"])
+            screen.txt_pass.setText(user["password"])
+            screen.do_login()
+        self.step(name, fn)
+
+    def logout(self):
+        self.step("logout", lambda: self.window.screens.peek("home").do_logout())
+
+    def open_detail(self, event):
+        def fn():
+            home = self.window.screens.peek("home")
+            self.dialog = self.main.EventDetailDialog(event, self.main.db.data["current_user"], home)
+            self.dialog.show()
+        self.step("open_detail", fn, target=lambda: self.dialog)
+
+    def open_manage_detail(self, event):
+        # Mở chi tiết từ màn hình quản lý qua đúng open_event() của admin; hộp thoại modal được đóng ngay khi hiện lên
+        def fn():
+            manage = self.window.screens.peek("manage_event")
+            self.main.QTimer.singleShot(0, lambda: self.main.QApplication.activeModalWidget() and self.main.QApplication.activeModalWidget().reject())
+            manage.open_event(event)
+        self.step("manage_detail", fn)
+
+    def close_detail(self):
+        def fn():
+            self.dialog.close()
+            self.dialog.deleteLater()
+            self.dialog = None
+            self.window.navigate("home")
+        self.step("back", fn)
+
+    def round(self, student, admin, event):
+        self.login("login_student", student)
+        self.open_detail(event)
+        self.step("join", self.dialog.toggle_join, target=lambda: self.dialog)
+        self.close_detail()
+        self.logout()
+        self.login("login_admin", admin)
+        self.step("manage", lambda: self.window.navigate("manage_event"))
+        self.open_manage_detail(event)
+        self.step("edit", lambda: self.window.navigate("edit_event", event))
+        self.step("back_to_manage", lambda: self.window.navigate("manage_event"))
+        self.step("profile", lambda: self.window.navigate("profile"))
+        self.step("home", lambda: self.window.navigate("home"))
+        self.logout()
+
+def pick_events(main, student, count):
+    # Sự kiện sắp diễn ra, còn chỗ và không trùng lịch với sinh viên để nút "Tham Gia" không bật hộp thoại
+    db, now, picked = main.db, time.time(), []
+    for e in db.data["events"]:
+        times = db.time_index.times(e["id"])
+        if not times or times[1] < now or student["id"] in e["participants"]: continue
+        cap = main.event_capacity(e)
+        if cap is not None and len(e["participants"]) >= cap: continue
+        if db.join_conflicts(e["id"], student["id"]): continue
+        picked.append(e)
+        if len(picked) == count: break
+    return picked
+
+def worker(args):
+    with open("event_app_data.json", "w", encoding="utf-8") as f: json.dump(datagen.generate(args.events, args.users, args.seed), f, ensure_ascii=False)
+    os.environ["QT_QPA_PLATFORM"] = "offscreen"
+    sys.path.insert(0, ROOT)
+    import main
+    app = main.QApplication([])
+    harness = Harness(app, main)
+    harness.start_window()
+    users = main.db.data["users"]
+    admin = next(u for u in users if u.get("role") == "admin")
+    students = [u for u in users if u.get("role") != "admin"][:args.rounds]
+    for student in students:
+        events = pick_events(main, student, 1)
+        if not events: continue
+        harness.round(student, admin, events[0])
+    main.db.flush()
+    size = f"{args.events}x{args.users}"
+    results = []
+    for op, s in harness.samples.items():
+        r = summarize(op, s["times"], "ms")
+        r.update(size=size, widgets=s["widgets"], rss_mb=round(s["rss_mb"], 1), peak_rss_mb=round(s["peak_rss_mb"], 1))
+        results.append(r)
+    print(json.dumps({"results": results, "modal_dialogs": harness.modal_hits}))
+    sys.stdout.flush()
+    os._exit(0) # Bỏ qua dọn dẹp lúc thoát (PySide6 có thể crash khi hủy đối tượng ở bước này)
+
+def run(args):
+    out = os.path.abspath(args.out) if args.out else None
+    results = []
+    for text in args.sizes.split(","):
+        events, users = parse_size(text.strip())
+        workdir = tempfile.mkdtemp(prefix="event_bench_ui_")
+        print(f"== {events} sự kiện x {users} người dùng", file=sys.stderr)
+        try:
+            cmd = [sys.executable, os.path.abspath(__file__), "worker", "--events", str(events), "--users", str(users),
+                   "--rounds", str(args.rounds), "--seed", str(args.seed)]
+            proc = subprocess.run(cmd, cwd=workdir, capture_output=True, text=True, encoding="utf-8")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        if proc.returncode != 0 or not proc.stdout.strip():
+            print(proc.stderr, file=sys.stderr)
+            return 1
+        report = json.loads(proc.stdout.strip().splitlines()[-1])
+        if report["modal_dialogs"]: print(f"  cảnh báo: {report['modal_dialogs']} hộp thoại bị đóng tự động", file=sys.stderr)
+        for r in report["results"]:
+            print(f"  {r['op']:<16}{r['median']:>10.1f} ms (p95 {r['p95']:.1f}, n={r['n']})  widgets {r['widgets']:<6} RSS {r['rss_mb']:.0f} MB, đỉnh {r['peak_rss_mb']:.0f} MB", file=sys.stderr)
+        results += report["results"]
+    report = {"meta": {"created": datetime.now().isoformat(timespec="seconds"), "kind": "ui", "seed": args.seed, "rounds": args.rounds,
+                       "python": platform.python_version(), "platform": platform.platform()},
+              "results": results}
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if out:
+        with open(out, "w", encoding="utf-8") as f: f.write(text)
+    else: print(text)
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark giao diện Quản Lý Sự Kiện (offscreen)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    cmd = commands.add_parser("run", help="So sánh kết quả bằng: bench_data.py compare base.json new.json")
+    cmd.add_argument("--sizes", default="small", help="Danh sách cỡ dữ liệu: " + "/".join(PRESETS) + " hoặc <events>x<users>")
+    cmd.add_argument("--rounds", type=int, default=5, help="Số lần lặp kịch bản (mỗi lần một sinh viên khác)")
+    cmd.add_argument("--seed", type=int, default=42)
+    cmd.add_argument("-o", "--out", help="Ghi kết quả JSON ra file (mặc định in ra stdout)")
+    cmd = commands.add_parser("worker")
+    cmd.add_argument("--events", type=int, required=True)
+    cmd.add_argument("--users", type=int, required=True)
+    cmd.add_argument("--rounds", type=int, default=5)
+    cmd.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+    return run(args) if args.command == "run" else worker(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
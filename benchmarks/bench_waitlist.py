@@ -0,0 +1,102 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+from datetime import datetime
+
+from bench_data import import_app, summarize
+
+# Đợt đăng ký dồn dập vào một sự kiện ít chỗ: vài trăm người vào được, hàng chục nghìn người xếp hàng chờ, rồi người tham gia
+# lần lượt hủy để người đầu hàng được lên. Độ trễ được chia theo độ dài hàng chờ lúc thao tác để thấy có tăng theo hàng hay không
+
+def bucketed(op, samples, lengths, buckets):
+    # samples[i] đo khi hàng chờ dài lengths[i]; chia thành các khoảng đều nhau theo độ dài hàng
+    top = max(lengths) + 1
+    step = max(1, -(-top // buckets))
+    groups = {}
+    for t, n in zip(samples, lengths): groups.setdefault(n // step, []).append(t)
+    return [dict(summarize(op, groups[k], "us"), size=f"q{k * step}-{(k + 1) * step}") for k in sorted(groups)]
+
+def run(args):
+    out = os.path.abspath(args.out) if args.out else None
+    app = import_app()
+    workdir = tempfile.mkdtemp(prefix="event_bench_wait_")
+    results = []
+    try:
+        path = os.path.join(workdir, app.DATA_FILE)
+        db = app.DataManager(app.JournalStore(path, path + ".journal"), load=True)
+        db.add_event({"title": "Đăng ký dồn dập", "start_date": "01/01/2030", "end_date": "01/01/2030", "start_time": "08:00",
+                      "end_time": "11:00", "location": "Hội trường A2", "max_participants": str(args.capacity)})
+        event = db.data["events"][-1]
+        event_id = event["id"]
+        queue_len = lambda: db.waitlist_position(event_id, None)[1]
+        users = [f"rush{i}" for i in range(args.capacity + args.waiting)]
+        waits, wait_lengths = [], []
+        started = time.perf_counter()
+        for user_id in users:
+            queued = queue_len()
+            start = time.perf_counter()
+            status, _ = db.toggle_participation(event_id, user_id, waitlist=True)
+            elapsed = time.perf_counter() - start
+            if status == "waitlisted":
+                waits.append(elapsed)
+                wait_lengths.append(queued)
+        rush = time.perf_counter() - started
+        # Vài người trong hàng tự rời đi (xóa giữa hàng), rồi người tham gia hủy lần lượt: mỗi lần hủy kéo một người lên
+        for user_id in users[args.capacity + 1::args.cancel_every]: db.toggle_participation(event_id, user_id)
+        promotes, promote_lengths = [], []
+        while queue_len():
+            user_id, queued = next(iter(event["participants"])), queue_len()
+            start = time.perf_counter()
+            db.toggle_participation(event_id, user_id)
+            promotes.append(time.perf_counter() - start)
+            promote_lengths.append(queued)
+        # Gộp journal nền phải xong trước khi nạp lại (hai kho cùng gộp một file xoay vòng sẽ giẫm lên nhau) và trước khi xóa thư mục
+        db.flush()
+        db.store.wait_compaction()
+        waitlist_left = queue_len()
+        start = time.perf_counter()
+        reloaded = app.DataManager(app.JournalStore(path, path + ".journal"), load=True)
+        reload_ms = (time.perf_counter() - start) * 1000
+        ok = reloaded.waitlist_position(event_id, None)[1] == waitlist_left and set(reloaded.get_event(event_id)["participants"]) == set(event["participants"])
+        reloaded.flush()
+        reloaded.store.wait_compaction()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results += bucketed("wait", waits, wait_lengths, args.buckets)
+    results += bucketed("leave_promote", promotes, promote_lengths, args.buckets)
+    results.append({"op": "reload", "unit": "ms", "size": f"{args.waiting} chờ", "n": 1, "median": round(reload_ms, 3)})
+    for r in results: print(f"  {r['op']:<14}{r['size']:<16}{r['median']:>10.2f} {r['unit']}" + (f" (p95 {r['p95']:.2f}, n={r['n']})" if "p95" in r else ""), file=sys.stderr)
+    # Độ trễ "phẳng": median của khoảng hàng dài nhất không được vượt quá max-growth lần khoảng ngắn nhất
+    growth = {}
+    for op in ("wait", "leave_promote"):
+        rows = [r for r in results if r["op"] == op]
+        growth[op] = round(rows[-1]["median"] / rows[0]["median"], 2) if len(rows) > 1 and rows[0]["median"] else 1.0
+    print(f"  {len(users)} lượt đăng ký trong {rush:.2f}s, tăng trễ theo độ dài hàng: "
+          + ", ".join(f"{op} x{g}" for op, g in growth.items()) + ("" if ok else "; DỮ LIỆU NẠP LẠI KHÔNG KHỚP"), file=sys.stderr)
+    report = {"meta": {"created": datetime.now().isoformat(timespec="seconds"), "kind": "waitlist", "capacity": args.capacity,
+                       "waiting": args.waiting, "growth": growth, "consistent": ok,
+                       "python": platform.python_version(), "platform": platform.platform()},
+              "results": results}
+    if out:
+        with open(out, "w", encoding="utf-8") as f: json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0 if ok and all(g <= args.max_growth for g in growth.values()) else 1
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark đợt đăng ký dồn dập và danh sách chờ Quản Lý Sự Kiện")
+    parser.add_argument("--capacity", type=int, default=200, help="Số chỗ của sự kiện")
+    parser.add_argument("--waiting", type=int, default=50000, help="Số người phải xếp hàng chờ")
+    parser.add_argument("--cancel-every", type=int, default=10, help="Cứ bao nhiêu người chờ thì một người tự rời hàng")
+    parser.add_argument("--buckets", type=int, default=5, help="Số khoảng độ dài hàng chờ để so sánh độ trễ")
+    parser.add_argument("--max-growth", type=float, default=3.0, help="Trả mã thoát 1 nếu median tăng quá số lần này")
+    parser.add_argument("-o", "--out", help="Ghi kết quả JSON ra file")
+    args = parser.parse_args(argv)
+    return run(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
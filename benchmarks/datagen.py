@@ -0,0 +1,92 @@
+import sys
+import json
+import random
+import argparse
+from bisect import bisect_left
+from datetime import date, timedelta
+
+# Sinh dữ liệu giả lập có tính tất định (cùng seed -> cùng dữ liệu) theo đúng định dạng event_app_data.json
+BASE_DATE = date(2026, 1, 1)
+EVENT_ID_BASE = 1600000000
+USER_ID_BASE = 1500000000
+WORDS = ("hội", "thảo", "công", "nghệ", "sinh", "viên", "ngày", "hội", "việc", "làm", "tình", "nguyện", "mùa", "hè",
+         "xanh", "cuộc", "thi", "lập", "trình", "trí", "tuệ", "nhân", "tạo", "an", "toàn", "thông", "tin", "kỹ", "năng",
+         "mềm", "khởi", "nghiệp", "giao", "lưu", "văn", "nghệ", "thể", "thao", "bóng", "đá", "học", "bổng", "định", "hướng")
+LOCATIONS = ("Hội trường A2", "Hội trường A3", "Phòng 401-A2", "Phòng 305-A3", "Sân vận động", "Thư viện",
+             "Nhà thi đấu", "Phòng Lab 1", "Phòng Lab 2", "Sảnh tầng 1", "Online (Google Meet)", "Trung tâm hội nghị")
+TAGS = ("Hội thảo", "CNTT", "Tình nguyện", "Thể thao", "Văn nghệ", "Kỹ năng", "Tuyển dụng", "Học thuật",
+        "Khởi nghiệp", "AI", "An toàn thông tin", "CLB")
+CLASSES = ("D21CQCN01", "D21CQCN02", "D22CQAT01", "D22CQPT01", "D23CQCN03", "D23CQKT01")
+FIRST_NAMES = ("An", "Bình", "Chi", "Dũng", "Giang", "Hà", "Hải", "Hùng", "Lan", "Linh", "Minh", "Nam", "Ngọc", "Phương", "Quân", "Trang")
+LAST_NAMES = ("Nguyễn", "Trần", "Lê", "Phạm", "Hoàng", "Vũ", "Đặng", "Bùi", "Đỗ", "Ngô")
+
+def sentence(rng, low, high):
+    words = rng.choices(WORDS, k=rng.randint(low, high))
+    return " ".join(words).capitalize()
+
+def make_content(rng, title):
+    parts = [f"<h2>{title}</h2>"]
+    for _ in range(rng.randint(2, 5)): parts.append(f"<p>{sentence(rng, 15, 40)}.</p>")
+    if rng.random() < 0.5: parts.append("<ul>" + "".join(f"<li>{sentence(rng, 3, 8)}</li>" for _ in range(rng.randint(2, 4))) + "</ul>")
+    return "".join(parts)
+
+def make_user(rng, i):
+    return {
+        "id": str(USER_ID_BASE + i / 1000), "username": f"user{i}", "password": f"pass{i}",
+        "full_name": f"{rng.choice(LAST_NAMES)} {rng.choice(FIRST_NAMES)}", "email": f"user{i}@stu.ptit.edu.vn",
+        "role": "admin" if i == 0 else "user", "student_id": f"B{21 + i % 4}DCCN{i:06d}",
+        "class_name": rng.choice(CLASSES), "dob": "01/01/2003", "gender": rng.choice(("Nam", "Nữ")),
+        "address": "", "avatar": "",
+    }
+
+def make_event(rng, i, creator_id):
+    start = BASE_DATE + timedelta(days=rng.randint(-365, 365))
+    end = start + timedelta(days=rng.choice((0, 0, 0, 1, 2)))
+    hour = rng.randint(7, 18)
+    title = sentence(rng, 3, 8)
+    return {
+        "id": str(EVENT_ID_BASE + i / 1000), "title": title,
+        "date": start.strftime("%d/%m/%Y"), "start_date": start.strftime("%d/%m/%Y"), "end_date": end.strftime("%d/%m/%Y"),
+        "start_time": f"{hour:02d}:00", "end_time": f"{min(hour + rng.randint(1, 4), 23):02d}:30",
+        "location": rng.choice(LOCATIONS), "description": sentence(rng, 8, 20), "poster": "",
+        "content": make_content(rng, title), "tags": ", ".join(rng.sample(TAGS, rng.randint(0, 3))),
+        "max_participants": "", "fee": rng.choice(("0", "0", "0", "20000", "50000")),
+        "participants": [], "creator_id": creator_id,
+    }
+
+def generate(events=1000, users=1000, seed=42, skew=1.1, joins_per_user=3.0):
+    # Lượt tham gia lệch theo phân phối Zipf: vài sự kiện rất đông, đa số lèo tèo
+    rng = random.Random(seed)
+    user_list = [make_user(rng, i) for i in range(users)]
+    event_list = [make_event(rng, i, user_list[0]["id"] if user_list else "") for i in range(events)]
+    if events and users:
+        popularity = list(range(events))
+        rng.shuffle(popularity)
+        cum, total = [], 0.0
+        for rank in range(1, events + 1):
+            total += rank ** -skew
+            cum.append(total)
+        for u in user_list:
+            k = min(events, int(rng.expovariate(1 / joins_per_user)))
+            for rank in {bisect_left(cum, rng.random() * total) for _ in range(k)}:
+                event_list[popularity[min(rank, events - 1)]]["participants"].append(u["id"])
+        for e in event_list:
+            if e["participants"] and rng.random() < 0.3: e["max_participants"] = str(len(e["participants"]) + rng.randint(0, 50))
+    return {"users": user_list, "events": event_list, "current_user": None}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sinh file dữ liệu giả lập cho Quản Lý Sự Kiện")
+    parser.add_argument("events", type=int)
+    parser.add_argument("users", type=int)
+    parser.add_argument("-o", "--out", default="event_app_data.json")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skew", type=float, default=1.1)
+    args = parser.parse_args(argv)
+    data = generate(args.events, args.users, args.seed, args.skew)
+    with open(args.out, "w", encoding="utf-8") as f: json.dump(data, f, ensure_ascii=False)
+    joins = sum(len(e["participants"]) for e in data["events"])
+    print(f"Đã sinh {args.events} sự kiện, {args.users} người dùng, {joins} lượt tham gia -> {args.out}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+
+import datagen
+from bench_data import ROOT, summarize
+
+# Kiểm thử tải máy chủ dữ liệu (main.py serve): hàng trăm máy khách giả lập đồng thời đăng nhập và tham gia/hủy tham gia,
+# tập trung vào một nhóm sự kiện "nóng" để nhiều yêu cầu tranh cùng một sự kiện; cuối cùng đối chiếu lại dữ liệu trên máy chủ
+
+class Client:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.token = None
+        self.next_id = 0
+
+    async def call(self, op, **args):
+        self.next_id += 1
+        req = {"id": self.next_id, "op": op, "args": args, "token": self.token}
+        self.writer.write(json.dumps(req, ensure_ascii=False).encode("utf-8") + b"\n")
+        await self.writer.drain()
+        resp = json.loads(await self.reader.readline())
+        if "error" in resp: raise RuntimeError(resp["error"])
+        return resp["result"]
+
+async def run_client(host, port, user, hot_events, args, rng, stats, state):
+    reader, writer = await asyncio.open_connection(host, port, limit=64 * 1024 * 1024)
+    client = Client(reader, writer)
+    try:
+        start = time.perf_counter()
+        res = await client.call("login", identifier=user["username"], password=user["password"])
+        stats["login"].append(time.perf_counter() - start)
+        client.token = res["token"]
+        for _ in range(args.ops):
+            event_id = rng.choice(hot_events)
+            start = time.perf_counter()
+            res = await client.call("toggle_participation", event_id=event_id)
+            stats["toggle_participation"].append(time.perf_counter() - start)
+            # Ghi lại trạng thái mà máy chủ đã xác nhận cho cặp (sự kiện, người dùng) để đối chiếu cuối cùng
+            if res["status"] == "added": state[(event_id, user["id"])] = True
+            elif res["status"] == "removed": state[(event_id, user["id"])] = False
+            else: stats["full"].append(0)
+    finally:
+        writer.close()
+
+async def run_load(host, port, users, hot_events, args, admin):
+    stats = {"login": [], "toggle_participation": [], "full": []}
+    state = {}
+    rng = random.Random(args.seed)
+    tasks = [run_client(host, port, u, hot_events, args, random.Random(rng.random()), stats, state) for u in users]
+    start = time.perf_counter()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    errors = [r for r in results if isinstance(r, Exception)]
+    # Ảnh chụp cần phiên đăng nhập
+    reader, writer = await asyncio.open_connection(host, port, limit=256 * 1024 * 1024)
+    client = Client(reader, writer)
+    client.token = (await client.call("login", identifier=admin["username"], password=admin["password"]))["token"]
+    snapshot = await client.call("snapshot")
+    writer.close()
+    return stats, state, errors, elapsed, snapshot
+
+def verify(snapshot, state, hot_events):
+    events = {e["id"]: e for e in snapshot["data"]["events"]}
+    problems = []
+    for (event_id, user_id), joined in state.items():
+        if (user_id in events[event_id]["participants"]) != joined: problems.append(f"{event_id}/{user_id}: lệch trạng thái tham gia")
+    for event_id in hot_events:
+        e = events[event_id]
+        cap = str(e.get("max_participants", "")).strip()
+        if cap.isdigit() and int(cap) > 0 and len(e["participants"]) > int(cap): problems.append(f"{event_id}: vượt số lượng tối đa")
+        if len(set(e["participants"])) != len(e["participants"]): problems.append(f"{event_id}: trùng người tham gia")
+    return problems
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Kiểm thử tải máy chủ dữ liệu Quản Lý Sự Kiện")
+    parser.add_argument("--clients", type=int, default=300)
+    parser.add_argument("--ops", type=int, default=20, help="Số lần tham gia/hủy của mỗi máy khách")
+    parser.add_argument("--hot", type=int, default=20, help="Số sự kiện bị tranh chấp")
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("-o", "--out", help="Ghi kết quả JSON ra file")
+    args = parser.parse_args(argv)
+    out = os.path.abspath(args.out) if args.out else None
+
+    workdir = tempfile.mkdtemp(prefix="event_load_")
+    data = datagen.generate(args.events, max(args.users, args.clients + 1), args.seed)
+    with open(os.path.join(workdir, "event_app_data.json"), "w", encoding="utf-8") as f: json.dump(data, f, ensure_ascii=False)
+    users = [u for u in data["users"] if u["role"] != "admin"][:args.clients]
+    admin = next(u for u in data["users"] if u["role"] == "admin")
+    hot_events = [e["id"] for e in random.Random(args.seed).sample(data["events"], args.hot)]
+    env = dict(os.environ, EVENT_APP_STORAGE="journal")
+    env.pop("EVENT_APP_SERVER", None)
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT, "main.py"), "serve", "--port", "0"], cwd=workdir, env=env,
+                              stdout=subprocess.PIPE, text=True)
+    try:
+        line = server.stdout.readline()
+        if not line.startswith("listening"):
+            print("Không khởi động được máy chủ", file=sys.stderr)
+            return 1
+        host, port = line.split()[1].rsplit(":", 1)
+        print(f"Máy chủ {host}:{port}, {len(users)} máy khách x {args.ops} thao tác trên {args.hot} sự kiện nóng", file=sys.stderr)
+        stats, state, errors, elapsed, snapshot = asyncio.run(run_load(host, int(port), users, hot_events, args, admin))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    problems = verify(snapshot, state, hot_events)
+    total_ops = len(stats["login"]) + len(stats["toggle_participation"])
+    size = f"{args.clients}c x {args.ops}"
+    results = [dict(summarize(op, stats[op], "ms"), size=size) for op in ("login", "toggle_participation") if stats[op]]
+    results.append({"op": "throughput", "unit": "ops/s", "size": size, "n": total_ops, "median": round(total_ops / elapsed, 1)})
+    for r in results: print(f"  {r['op']:<22}{r['median']:>10.2f} {r['unit']}" + (f" (p95 {r['p95']:.2f}, n={r['n']})" if "p95" in r else ""), file=sys.stderr)
+    print(f"  {len(stats['full'])} lượt bị từ chối vì đủ số lượng, {len(errors)} máy khách lỗi, {len(problems)} sai lệch dữ liệu", file=sys.stderr)
+    for e in errors[:5]: print(f"  lỗi: {e!r}", file=sys.stderr)
+    for p in problems[:10]: print(f"  sai lệch: {p}", file=sys.stderr)
+    report = {"meta": {"created": datetime.now().isoformat(timespec="seconds"), "kind": "server_load", "clients": args.clients,
+                       "ops": args.ops, "hot": args.hot, "events": args.events, "seed": args.seed,
+                       "python": platform.python_version(), "platform": platform.platform(),
+                       "errors": len(errors), "inconsistencies": len(problems)},
+              "results": results}
+    if out:
+        with open(out, "w", encoding="utf-8") as f: json.dump(report, f, ensure_ascii=False, indent=2)
+    return 1 if errors or problems else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import hashlib
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+
+import datagen
+from bench_data import ROOT, import_app, summarize
+
+# Kiểm thử nhiều tiến trình cùng ghi một file dữ liệu (EVENT_APP_STORAGE=shared): mỗi tiến trình đăng ký người dùng mới
+# (kể cả tranh cùng một tên đăng nhập) và tham gia/hủy tham gia một nhóm sự kiện "nóng" có giới hạn chỗ, journal được gộp
+# liên tục trong lúc chạy; cuối cùng đối chiếu file trên đĩa với mọi kết quả mà các tiến trình đã được xác nhận
+
+def digest(db, hot_events):
+    parts = [(e, sorted(db.get_event(e)["participants"])) for e in hot_events]
+    parts.append(sorted(u["username"] for u in db.data["users"]))
+    return hashlib.sha1(json.dumps(parts).encode("utf-8")).hexdigest()
+
+def worker(args):
+    sys.path.insert(0, ROOT)
+    import main
+    db = main.db
+    db.load_data()
+    hot_events = args.hot_events.split(",")
+    rng = random.Random(args.seed * 1000 + args.worker)
+    # Mỗi người dùng chỉ do một tiến trình thao tác, nên lượt xác nhận cuối cùng của tiến trình đó là trạng thái đúng
+    mine = [u["id"] for u in db.data["users"] if u.get("role") != "admin" and int(u["username"][4:]) % args.workers == args.worker]
+    stats = {"register_user": [], "toggle_participation": []}
+    registered, duplicates, toggles = [], [], {}
+    while time.time() < args.start_at: time.sleep(0.001)
+    started = time.perf_counter()
+    for i in range(args.ops):
+        if rng.random() < args.register_ratio:
+            # Cứ vài lượt lại tranh cùng một tên đăng nhập với các tiến trình khác: chỉ đúng một tiến trình được thành công
+            name = f"dup{i}" if i % 5 == 0 else f"w{args.worker}_{i}"
+            user = {"username": name, "password": "Abc@1234", "full_name": name, "email": f"{name}@example.com", "role": "user"}
+            start = time.perf_counter()
+            ok, _ = db.register_user(user)
+            stats["register_user"].append(time.perf_counter() - start)
+            if ok:
+                registered.append([name, user["id"]])
+                mine.append(user["id"])
+            elif not name.startswith("dup"): raise RuntimeError(f"Đăng ký {name} thất bại")
+            else: duplicates.append(name)
+        else:
+            event_id, user_id = rng.choice(hot_events), rng.choice(mine)
+            start = time.perf_counter()
+            status, _ = db.toggle_participation(event_id, user_id)
+            stats["toggle_participation"].append(time.perf_counter() - start)
+            if status != "full": toggles[f"{event_id}|{user_id}"] = status == "added"
+    elapsed = time.perf_counter() - started
+    # Chờ mọi tiến trình ghi xong rồi kéo về: bản sao trong bộ nhớ phải khớp với file trên đĩa
+    open(f"done.{args.worker}", "w").close()
+    while sum(name.startswith("done.") for name in os.listdir(".")) < args.workers: time.sleep(0.05)
+    db.sync()
+    print(json.dumps({"stats": stats, "registered": registered, "duplicates": duplicates, "toggles": toggles,
+                      "conflicts": db.conflicts, "elapsed": elapsed, "digest": digest(db, hot_events)}))
+    sys.stdout.flush()
+    os._exit(0)
+
+def verify(app, workdir, reports, hot_events):
+    path = os.path.join(workdir, app.DATA_FILE)
+    db = app.DataManager(app.SharedJournalStore(path, path + ".journal"), load=True)
+    problems = db.check_indexes()
+    users = {u["username"]: u for u in db.data["users"]}
+    if len(users) != len(db.data["users"]): problems.append("trùng tên đăng nhập")
+    winners = {}
+    for report in reports:
+        for name, user_id in report["registered"]:
+            if name not in users or users[name]["id"] != user_id: problems.append(f"{name}: mất lượt đăng ký")
+            if name.startswith("dup"): winners[name] = winners.get(name, 0) + 1
+        for key, joined in report["toggles"].items():
+            event_id, user_id = key.split("|")
+            if (user_id in db.get_event(event_id)["participants"]) != joined: problems.append(f"{key}: lệch trạng thái tham gia")
+    problems += [f"{name}: {n} tiến trình cùng đăng ký thành công" for name, n in winners.items() if n > 1]
+    for event_id in hot_events:
+        e = db.get_event(event_id)
+        cap = app.event_capacity(e)
+        if cap is not None and len(e["participants"]) > cap: problems.append(f"{event_id}: vượt số lượng tối đa")
+    expected = digest(db, hot_events)
+    problems += [f"tiến trình {i}: bản sao trong bộ nhớ khác file trên đĩa" for i, r in enumerate(reports) if r["digest"] != expected]
+    # Lần nạp ở trên có thể đã khởi động gộp journal nền: chờ xong trước khi xóa thư mục làm việc
+    db.flush()
+    db.store.wait_compaction()
+    return problems
+
+def run(args):
+    out = os.path.abspath(args.out) if args.out else None
+    app = import_app()
+    workdir = tempfile.mkdtemp(prefix="event_stress_")
+    data = datagen.generate(args.events, args.users, args.seed)
+    hot_events = [e["id"] for e in random.Random(args.seed).sample(data["events"], args.hot)]
+    for e in data["events"]:
+        if e["id"] in hot_events: e["max_participants"] = str(args.capacity)
+        e["participants"] = [] if e["id"] in hot_events else e["participants"]
+    with open(os.path.join(workdir, app.DATA_FILE), "w", encoding="utf-8") as f: json.dump(data, f, ensure_ascii=False)
+    env = dict(os.environ, EVENT_APP_STORAGE="shared", EVENT_APP_JOURNAL_COMPACT_BYTES=str(args.compact_bytes), QT_QPA_PLATFORM="offscreen")
+    env.pop("EVENT_APP_SERVER", None)
+    start_at = time.time() + 3 + args.workers * 0.3
+    print(f"{args.workers} tiến trình x {args.ops} thao tác trên {args.hot} sự kiện nóng (tối đa {args.capacity} chỗ)", file=sys.stderr)
+    procs = []
+    try:
+        for i in range(args.workers):
+            cmd = [sys.executable, os.path.abspath(__file__), "worker", "--worker", str(i), "--workers", str(args.workers),
+                   "--ops", str(args.ops), "--seed", str(args.seed), "--register-ratio", str(args.register_ratio),
+                   "--hot-events", ",".join(hot_events), "--start-at", str(start_at)]
+            procs.append(subprocess.Popen(cmd, cwd=workdir, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, encoding="utf-8"))
+        outputs = [p.communicate(timeout=args.timeout) for p in procs]
+        failed = [(i, err) for i, (p, (_, err)) in enumerate(zip(procs, outputs)) if p.returncode != 0]
+        if failed:
+            for i, err in failed: print(f"tiến trình {i} lỗi:\n{err}", file=sys.stderr)
+            return 1
+        reports = [json.loads(o.strip().splitlines()[-1]) for o, _ in outputs]
+        problems = verify(app, workdir, reports, hot_events)
+    finally:
+        for p in procs:
+            if p.poll() is None: p.kill()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    size = f"{args.workers}p x {args.ops}"
+    results = []
+    for op in ("register_user", "toggle_participation"):
+        samples = [t for r in reports for t in r["stats"][op]]
+        if samples: results.append(dict(summarize(op, samples, "ms"), size=size))
+    total = sum(len(r["stats"][op]) for r in reports for op in r["stats"])
+    elapsed = max(r["elapsed"] for r in reports)
+    results.append({"op": "throughput", "unit": "ops/s", "size": size, "n": total, "median": round(total / elapsed, 1)})
+    conflicts = sum(r["conflicts"] for r in reports)
+    for r in results: print(f"  {r['op']:<22}{r['median']:>10.2f} {r['unit']}" + (f" (p95 {r['p95']:.2f}, n={r['n']})" if "p95" in r else ""), file=sys.stderr)
+    print(f"  {conflicts} lần thử lại do xung đột, {len(problems)} sai lệch dữ liệu", file=sys.stderr)
+    for p in problems[:10]: print(f"  sai lệch: {p}", file=sys.stderr)
+    report = {"meta": {"created": datetime.now().isoformat(timespec="seconds"), "kind": "shared_stress", "workers": args.workers,
+                       "ops": args.ops, "hot": args.hot, "capacity": args.capacity, "seed": args.seed, "conflicts": conflicts,
+                       "python": platform.python_version(), "platform": platform.platform(), "inconsistencies": len(problems)},
+              "results": results}
+    if out:
+        with open(out, "w", encoding="utf-8") as f: json.dump(report, f, ensure_ascii=False, indent=2)
+    return 1 if problems else 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Kiểm thử nhiều tiến trình dùng chung file dữ liệu Quản Lý Sự Kiện")
+    commands = parser.add_subparsers(dest="command", required=True)
+    cmd = commands.add_parser("run")
+    cmd.add_argument("--workers", type=int, default=6)
+    cmd.add_argument("--ops", type=int, default=400, help="Số thao tác của mỗi tiến trình")
+    cmd.add_argument("--hot", type=int, default=10, help="Số sự kiện bị tranh chấp")
+    cmd.add_argument("--capacity", type=int, default=30, help="Số chỗ tối đa của mỗi sự kiện nóng")
+    cmd.add_argument("--events", type=int, default=2000)
+    cmd.add_argument("--users", type=int, default=500)
+    cmd.add_argument("--register-ratio", type=float, default=0.3)
+    cmd.add_argument("--compact-bytes", type=int, default=64 * 1024, help="Ngưỡng gộp journal (nhỏ để gộp nhiều lần trong lúc chạy)")
+    cmd.add_argument("--seed", type=int, default=42)
+    cmd.add_argument("--timeout", type=float, default=600)
+    cmd.add_argument("-o", "--out", help="Ghi kết quả JSON ra file")
+    cmd = commands.add_parser("worker")
+    cmd.add_argument("--worker", type=int, required=True)
+    cmd.add_argument("--workers", type=int, required=True)
+    cmd.add_argument("--ops", type=int, required=True)
+    cmd.add_argument("--seed", type=int, default=42)
+    cmd.add_argument("--register-ratio", type=float, default=0.3)
+    cmd.add_argument("--hot-events", required=True)
+    cmd.add_argument("--start-at", type=float, required=True)
+    args = parser.parse_args(argv)
+    return run(args) if args.command == "run" else worker(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
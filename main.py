@@ -2,19 +2,85 @@ import sys
 import os
 import json
 import re
+import threading
+import sqlite3
+import time
+import atexit
+import hashlib
+import heapq
+import queue
+import html
+import unicodedata
+import csv
+import argparse
+import asyncio
+import signal
+import socket
+import secrets
+import tracemalloc
+from functools import wraps
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict, deque
+from array import array
+from bisect import bisect_left, bisect_right, insort
 from datetime import datetime, timedelta
+try: import fcntl
+except ImportError: fcntl = None
+try: import msvcrt
+except ImportError: msvcrt = None
+STARTUP_ORIGIN = time.perf_counter() # Mốc 0 của báo cáo khởi động, đặt trước khi nạp Qt
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
     QLabel, QLineEdit, QPushButton, QStackedWidget, QMessageBox, 
     QComboBox, QScrollArea, QGridLayout, QDialog, QTextEdit, 
     QFileDialog, QDateEdit, QTimeEdit, QMenu, QFrame, QRadioButton, QButtonGroup,
-    QCalendarWidget, QToolButton, QAbstractItemView, QSpinBox
+    QCalendarWidget, QToolButton, QAbstractItemView, QSpinBox, QListView, QStyledItemDelegate, QStyle
 )
-from PySide6.QtCore import Qt, QSize, QDate, QTime, QTimer
-from PySide6.QtGui import QPixmap, QIcon, QAction, QColor, QPainter, QPainterPath, QFont
+from PySide6.QtCore import Qt, QSize, QDate, QTime, QTimer, QObject, QEvent, Signal, QAbstractListModel, QModelIndex, QRect, QRectF, QCoreApplication
+from PySide6.QtGui import QPixmap, QImage, QImageReader, QIcon, QAction, QColor, QPainter, QPainterPath, QFont, QFontMetrics, QPen
+from shiboken6 import isValid
 
 DATA_FILE = "event_app_data.json"
+JOURNAL_FILE = DATA_FILE + ".journal"
+JOURNAL_COMPACT_BYTES = int(os.environ.get("EVENT_APP_JOURNAL_COMPACT_BYTES", str(1024 * 1024)))
+SAVE_DEBOUNCE_MS = int(os.environ.get("EVENT_APP_SAVE_DEBOUNCE_MS", "300"))
+SQLITE_FILE = "event_app_data.db"
+STORAGE_BACKEND = os.environ.get("EVENT_APP_STORAGE", "journal") # "json" | "journal" | "shared" | "sqlite"
+SHARED_LOCK_TIMEOUT = 10.0
+SHARED_RETRIES = 5
+SHARED_POLL_MS = 1000
 LOGO_PATH = "Logo_PTIT.png"
+THUMB_CACHE_DIR = os.path.join("event_app_cache", "thumbnails")
+THUMB_MEMORY_ITEMS = 300
+THUMB_DISK_LIMIT_MB = 200
+IMAGE_DECODE_THREADS = int(os.environ.get("EVENT_APP_IMAGE_THREADS", "2"))
+IMAGE_POLL_MS = 30
+AVATAR_CACHE_ITEMS = 16
+EVENT_PAGE_SIZE = int(os.environ.get("EVENT_APP_PAGE_SIZE", "24"))
+SEARCH_DEBOUNCE_MS = 250
+SEARCH_MIN_PREFIX = 2
+FACET_LIMIT = 12
+IMPORT_BATCH = 1000
+IMPORT_COMMIT_ROWS = 5000 # số bản ghi hợp lệ gom lại cho mỗi lần bulk_import khi nhập file
+STARTUP_REPORT = os.environ.get("EVENT_APP_STARTUP_REPORT", "") # "-" in ra stderr, còn lại là đường dẫn file JSON
+DATA_POLL_MS = 20
+TRACE_FILE = os.environ.get("EVENT_APP_TRACE", "") # bật đo đạc: đường dẫn file Chrome trace (.json)
+TRACE_MAX_EVENTS = 500000
+SERVER_ADDRESS = os.environ.get("EVENT_APP_SERVER", "") # "host:port": dùng máy chủ chung thay cho file dữ liệu cục bộ
+SERVER_PORT = 8765
+SERVER_WORKERS = 8
+SERVER_LINE_LIMIT = 16 * 1024 * 1024
+SERVER_RESET_TTL = 15 * 60 # giây; mã đặt lại mật khẩu chỉ in ra console máy chủ
+SERVER_RESET_ATTEMPTS = 5
+CHANGE_LOG_SIZE = 20000
+PUBLIC_USER_FIELDS = ("id", "username", "full_name", "version") # máy chủ chỉ gửi các trường này của người dùng khác
+REMOTE_SYNC_MS = 2000
+SCREEN_WIDGET_BUDGET = int(os.environ.get("EVENT_APP_SCREEN_BUDGET", "120")) # tổng số widget của các màn hình tạm đang ẩn
+SCREEN_STATS = os.environ.get("EVENT_APP_SCREEN_STATS") == "1"
+USER_FIELDS = ("username", "full_name", "email", "role", "student_id", "class_name", "dob", "gender", "address", "avatar")
+EVENT_FIELDS = ("title", "start_date", "end_date", "start_time", "end_time", "location", "description", "content", "tags", "max_participants", "fee", "poster")
+SEARCH_FIELDS = (("title", 5), ("tags", 3), ("location", 2), ("description", 1), ("content", 1))
 THEME_COLOR = "#D32F2F"
 THEME_HOVER = "#B71C1C"
 TEXT_COLOR = "#333333"
@@ -179,6 +245,12 @@ STYLESHEET = f"""
         text-align: left; padding: 0;
     }}
     QPushButton.link:hover {{ text-decoration: underline; }}
+    QPushButton.chip {{
+        background-color: {CARD_BG}; color: {TEXT_COLOR}; border: 1px solid #CCCCCC;
+        border-radius: 12px; padding: 4px 12px; font-size: 13px;
+    }}
+    QPushButton.chip:hover {{ border: 1px solid {THEME_COLOR}; }}
+    QPushButton.chip:checked {{ background-color: {THEME_COLOR}; color: white; border: 1px solid {THEME_COLOR}; }}
 
     /* Typography */
     QLabel.title {{
@@ -187,6 +259,11 @@ STYLESHEET = f"""
     QLabel.header {{
         font-size: 18px; font-weight: bold; margin-top: 10px; margin-bottom: 5px;
     }}
+    QPushButton.header {{
+        font-size: 18px; font-weight: bold; margin-top: 10px; margin-bottom: 5px;
+        background-color: transparent; border: none; text-align: left; padding: 0;
+    }}
+    QPushButton.header:hover {{ color: {THEME_COLOR}; }}
     
     /* Cards */
     QFrame#Card {{
@@ -201,6 +278,95 @@ STYLESHEET = f"""
     QFrame#Navbar {{ background-color: {THEME_COLOR}; border-bottom: 2px solid #B71C1C; }}
 """
 
+class StartupTimer:
+    # Mốc thời gian khởi động tính bằng ms từ STARTUP_ORIGIN; mỗi mốc chỉ ghi lần đầu
+    def __init__(self, origin):
+        self.origin = origin
+        self.marks = OrderedDict()
+
+    def mark(self, name):
+        if name not in self.marks: self.marks[name] = round((time.perf_counter() - self.origin) * 1000, 1)
+
+    def report(self):
+        return dict(self.marks)
+
+    def emit(self, target=STARTUP_REPORT):
+        if not target: return
+        if target == "-": print("startup: " + ", ".join(f"{k}={v}ms" for k, v in self.marks.items()), file=sys.stderr)
+        else: write_json_atomic(target, self.report(), indent=2)
+
+startup = StartupTimer(STARTUP_ORIGIN)
+
+class Tracer:
+    # Ghi thời gian các đoạn mã nóng dạng Chrome trace (mở bằng chrome://tracing hoặc ui.perfetto.dev).
+    # Khi tắt, traced() trả lại nguyên hàm nên không tốn gì thêm
+    def __init__(self, path):
+        self.path = path
+        self.enabled = bool(path)
+        self.pid = os.getpid()
+        self.events = []
+        self.dropped = 0
+        self.threads = {}
+        self.screen_memory = {}
+        if self.enabled:
+            tracemalloc.start()
+            atexit.register(self.export)
+
+    def traced(self, name, cat="app", arg=None):
+        # arg: vị trí tham số (tính cả self) được ghép vào tên, vd. navigate("home") -> "navigate home"
+        if not self.enabled: return lambda fn: fn
+        def decorate(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try: return fn(*args, **kwargs)
+                finally:
+                    label = f"{name} {args[arg]}" if arg is not None and len(args) > arg else name
+                    self.span(label, cat, start, time.perf_counter())
+            return wrapper
+        return decorate
+
+    def span(self, name, cat, start, end):
+        if len(self.events) >= TRACE_MAX_EVENTS:
+            self.dropped += 1
+            return
+        tid = threading.get_ident()
+        if tid not in self.threads: self.threads[tid] = threading.current_thread().name
+        self.events.append({"name": name, "cat": cat, "ph": "X", "pid": self.pid, "tid": tid,
+                            "ts": round((start - STARTUP_ORIGIN) * 1e6, 1), "dur": round((end - start) * 1e6, 1)})
+
+    def sample_memory(self, screen):
+        if not self.enabled: return
+        current, peak = tracemalloc.get_traced_memory()
+        self.screen_memory[screen] = max(self.screen_memory.get(screen, 0), current)
+        self.events.append({"name": "python_memory", "ph": "C", "pid": self.pid, "ts": round((time.perf_counter() - STARTUP_ORIGIN) * 1e6, 1),
+                            "args": {"current_mb": round(current / 1048576, 2), "peak_mb": round(peak / 1048576, 2)}})
+
+    def summary(self):
+        stats = {}
+        for ev in list(self.events):
+            if ev["ph"] != "X": continue
+            s = stats.setdefault(ev["name"], [0, 0.0, 0.0])
+            s[0] += 1
+            s[1] += ev["dur"]
+            s[2] = max(s[2], ev["dur"])
+        return {name: {"count": n, "total_ms": round(total / 1000, 2), "mean_ms": round(total / n / 1000, 3), "max_ms": round(worst / 1000, 2)}
+                for name, (n, total, worst) in sorted(stats.items(), key=lambda kv: -kv[1][1])}
+
+    def export(self):
+        meta = [{"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}} for tid, name in self.threads.items()]
+        with open(self.path, "w", encoding="utf-8") as f: json.dump({"traceEvents": meta + self.events, "displayTimeUnit": "ms"}, f)
+        lines = [f"{'name':<40}{'count':>8}{'total ms':>12}{'mean ms':>10}{'max ms':>10}"]
+        for name, s in self.summary().items(): lines.append(f"{name[:39]:<40}{s['count']:>8}{s['total_ms']:>12.1f}{s['mean_ms']:>10.2f}{s['max_ms']:>10.1f}")
+        if self.screen_memory:
+            lines.append("")
+            lines.append("Bộ nhớ Python (tracemalloc) cao nhất khi ở từng màn hình:")
+            for screen, size in sorted(self.screen_memory.items(), key=lambda kv: -kv[1]): lines.append(f"  {screen:<20}{size / 1048576:>10.1f} MB")
+        if self.dropped: lines.append(f"Bỏ qua {self.dropped} sự kiện do vượt giới hạn {TRACE_MAX_EVENTS}")
+        with open(os.path.splitext(self.path)[0] + ".summary.txt", "w", encoding="utf-8") as f: f.write("\n".join(lines) + "\n")
+
+tracer = Tracer(TRACE_FILE)
+
 def get_logo_pixmap(height=100):
     if os.path.exists(LOGO_PATH):
         pixmap = QPixmap(LOGO_PATH)
@@ -226,6 +392,289 @@ def mask_image_circular(pixmap, size):
     painter.end()
     return out_pixmap
 
+class ThumbnailCache:
+    # Ảnh thu nhỏ theo (đường dẫn, mtime, kích thước file, kích thước đích): tầng bộ nhớ LRU + thư mục cache trên đĩa
+    def __init__(self, cache_dir=THUMB_CACHE_DIR, memory_items=THUMB_MEMORY_ITEMS, disk_limit_bytes=THUMB_DISK_LIMIT_MB * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.memory_items = memory_items
+        self.disk_limit_bytes = disk_limit_bytes
+        self.memory = OrderedDict()
+        self.disk_entries = None
+        self.disk_bytes = 0
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evicted": 0}
+        self.lock = threading.RLock()
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, memory_items=len(self.memory), disk_bytes=self.disk_bytes)
+
+    def get(self, path, width, height, mode="expand"):
+        if not path: return QPixmap()
+        pix = self.peek(path, width, height, mode)
+        if pix is not None: return pix
+        name, image = self.load_image(path, width, height, mode)
+        return self.put(path, width, height, mode, name, image)
+
+    def stamp(self, path, width, height, mode="expand"):
+        # Tên entry chứa mtime và kích thước file gốc, dùng làm dấu phiên bản cho các cache dựng trên ảnh thu nhỏ
+        with self.lock:
+            entry = self.memory.get((path, width, height, mode))
+            return entry[0] if entry else None
+
+    def peek(self, path, width, height, mode="expand"):
+        # Chỉ tra tầng bộ nhớ, không đụng tới đĩa nên gọi được trong paint()
+        key = (path, width, height, mode)
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is None: return None
+            self.memory.move_to_end(key)
+            self.counters["memory_hits"] += 1
+            return entry[1]
+
+    def put(self, path, width, height, mode, name, image):
+        # QPixmap chỉ được tạo trên luồng giao diện; ảnh lỗi/không tồn tại được nhớ dưới dạng pixmap rỗng
+        pix = QPixmap.fromImage(image) if image is not None else QPixmap()
+        with self.lock:
+            self.memory[(path, width, height, mode)] = (name, pix)
+            while len(self.memory) > self.memory_items: self.memory.popitem(last=False)
+        return pix
+
+    @tracer.traced("load_image", cat="image")
+    def load_image(self, path, width, height, mode):
+        # An toàn khi gọi từ luồng nền: chỉ làm việc với QImage và file
+        try: st = os.stat(path)
+        except OSError:
+            self.evict_disk(path)
+            return None, None
+        name = self.entry_name(path, st, width, height, mode)
+        with self.lock:
+            entries = self.scan_disk().setdefault(name.split("_", 1)[0], set())
+            on_disk = name in entries
+        if on_disk:
+            image = QImage(os.path.join(self.cache_dir, name))
+            if not image.isNull():
+                with self.lock: self.counters["disk_hits"] += 1
+                return name, image
+        with self.lock: self.counters["misses"] += 1
+        image = self.decode_scaled(path, width, height, mode)
+        if image is None: return name, None
+        self.store(name, image)
+        return name, image
+
+    @staticmethod
+    @tracer.traced("decode_scaled", cat="image")
+    def decode_scaled(path, width, height, mode):
+        # Giải mã thẳng ở kích thước gần đích (JPEG giải mã theo tỉ lệ nên không phải dựng ảnh gốc đầy đủ)
+        reader = QImageReader(path)
+        size = reader.size()
+        if size.isValid() and size.width() > 0 and size.height() > 0:
+            pick = max if mode == "expand" else min
+            factor = pick(width / size.width(), height / size.height())
+            if factor < 1: reader.setScaledSize(QSize(max(1, round(size.width() * factor)), max(1, round(size.height() * factor))))
+        image = reader.read()
+        if image.isNull(): return None
+        aspect = Qt.KeepAspectRatioByExpanding if mode == "expand" else Qt.KeepAspectRatio
+        image = image.scaled(width, height, aspect, Qt.SmoothTransformation)
+        if mode == "expand": image = image.copy((image.width() - width) // 2, (image.height() - height) // 2, width, height)
+        return image
+
+    def store(self, name, image):
+        # Không ghi được cache đĩa (thư mục chỉ đọc, đầy đĩa...) thì vẫn dùng ảnh vừa giải mã
+        target = os.path.join(self.cache_dir, name)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            if not image.save(target, "PNG"): return
+            size = os.path.getsize(target)
+        except OSError: return
+        with self.lock:
+            path_key = name.split("_", 1)[0]
+            # Ảnh gốc đã đổi (mtime/size khác) thì các bản thu nhỏ cũ của cùng đường dẫn trở nên lỗi thời
+            version = name.rsplit("_", 2)[0] + "_"
+            stale = [n for n in self.disk_entries.get(path_key, ()) if not n.startswith(version)]
+            for n in stale: self.remove_entry(n)
+            self.disk_entries.setdefault(path_key, set()).add(name)
+            self.disk_bytes += size
+            if self.disk_bytes > self.disk_limit_bytes:
+                try: self.prune_disk()
+                except OSError: pass
+
+    def evict_path(self, path):
+        with self.lock:
+            self.evict_disk(path)
+            self.forget(path)
+
+    def forget(self, path):
+        # Bỏ ảnh khỏi tầng bộ nhớ để lần sau stat lại file gốc; tầng đĩa tự kiểm tra theo mtime
+        with self.lock:
+            for key in [key for key in self.memory if key[0] == path]: del self.memory[key]
+
+    def on_data_changed(self, change, payload):
+        # Tầng bộ nhớ không stat file gốc, nên poster bị thay tại chỗ (cùng đường dẫn) chỉ được đọc lại khi sự kiện được lưu
+        if change in ("event_added", "event_updated") and payload["event"].get("poster"): self.forget(payload["event"]["poster"])
+
+    def evict_disk(self, path):
+        with self.lock:
+            for n in list(self.scan_disk().get(self.path_key(path), ())): self.remove_entry(n)
+
+    def scan_disk(self):
+        if self.disk_entries is None:
+            self.disk_entries = {}
+            if os.path.isdir(self.cache_dir):
+                for entry in os.scandir(self.cache_dir):
+                    if entry.name.endswith(".png"):
+                        self.disk_entries.setdefault(entry.name.split("_", 1)[0], set()).add(entry.name)
+                        self.disk_bytes += entry.stat().st_size
+        return self.disk_entries
+
+    def prune_disk(self):
+        files = sorted(os.scandir(self.cache_dir), key=lambda e: e.stat().st_atime)
+        for entry in files:
+            if self.disk_bytes <= self.disk_limit_bytes * 0.8: break
+            self.remove_entry(entry.name)
+
+    def remove_entry(self, name):
+        target = os.path.join(self.cache_dir, name)
+        try:
+            size = os.path.getsize(target)
+            os.remove(target)
+        except OSError: return
+        self.disk_bytes -= size
+        self.disk_entries.get(name.split("_", 1)[0], set()).discard(name)
+        self.counters["evicted"] += 1
+
+    @staticmethod
+    def path_key(path):
+        return hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:16]
+
+    @classmethod
+    def entry_name(cls, path, st, width, height, mode):
+        return f"{cls.path_key(path)}_{st.st_mtime_ns}_{st.st_size}_{width}x{height}_{mode}.png"
+
+thumbnails = ThumbnailCache()
+
+class DecodeJob:
+    def __init__(self, future, path, width, height, mode):
+        self.future = future
+        self.path, self.width, self.height, self.mode = path, width, height, mode
+        self.owners = set()
+
+class ImageLoader(QObject):
+    # Giải mã ảnh trên nhóm luồng nền; kết quả được gom vào hàng đợi và luồng giao diện lấy ra theo nhịp timer
+    image_ready = Signal(str)
+
+    def __init__(self, threads=IMAGE_DECODE_THREADS):
+        super().__init__()
+        self.pool = ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix="image-decode")
+        self.jobs = {}
+        self.results = queue.SimpleQueue()
+        self.timer = QTimer(self)
+        self.timer.setInterval(IMAGE_POLL_MS)
+        self.timer.timeout.connect(self.drain)
+        app = QCoreApplication.instance()
+        if app: app.aboutToQuit.connect(self.shutdown)
+
+    @staticmethod
+    def key(path, width, height, mode="expand"):
+        return f"{width}x{height}_{mode}|{path}"
+
+    def set_concurrency(self, threads):
+        # Các yêu cầu đã xếp hàng vẫn chạy trên nhóm cũ; yêu cầu mới dùng nhóm với số luồng mới
+        old, self.pool = self.pool, ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix="image-decode")
+        old.shutdown(wait=False)
+
+    def pixmap(self, path, width, height, mode="expand", owner=None):
+        # Trả về ảnh nếu đã có trong bộ nhớ; nếu chưa thì xếp hàng giải mã và trả về None để bên gọi vẽ ảnh tạm
+        if not path: return QPixmap()
+        pix = thumbnails.peek(path, width, height, mode)
+        if pix is not None: return pix
+        key = self.key(path, width, height, mode)
+        job = self.jobs.get(key)
+        if job is None:
+            future = self.pool.submit(self.decode, key, path, width, height, mode)
+            job = self.jobs[key] = DecodeJob(future, path, width, height, mode)
+            if not self.timer.isActive(): self.timer.start()
+        if owner is not None: job.owners.add(owner)
+        return None
+
+    def decode(self, key, path, width, height, mode):
+        # Luôn trả một kết quả (lỗi thì là ảnh rỗng), nếu không job nằm mãi trong self.jobs và timer không bao giờ dừng
+        try: name, image = thumbnails.load_image(path, width, height, mode)
+        except Exception: name, image = None, None
+        self.results.put((key, name, image))
+
+    def cancel(self, owner):
+        # Huỷ các yêu cầu chưa chạy mà không còn ai chờ; yêu cầu đang giải mã vẫn hoàn tất và được đưa vào cache
+        for key, job in list(self.jobs.items()):
+            if owner not in job.owners: continue
+            job.owners.discard(owner)
+            if not job.owners and job.future.cancel(): del self.jobs[key]
+
+    def drain(self):
+        while True:
+            try: key, name, image = self.results.get_nowait()
+            except queue.Empty: break
+            job = self.jobs.pop(key, None)
+            if job is None: continue
+            thumbnails.put(job.path, job.width, job.height, job.mode, name, image)
+            self.image_ready.emit(key)
+        if not self.jobs: self.timer.stop()
+
+    def shutdown(self):
+        self.timer.stop()
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+_image_loader = None
+
+def image_loader():
+    global _image_loader
+    if _image_loader is None: _image_loader = ImageLoader()
+    return _image_loader
+
+class AvatarCache:
+    # Ảnh đại diện đã cắt tròn theo (đường dẫn, mtime, kích thước); chỉ dùng trên luồng giao diện
+    def __init__(self, max_items=AVATAR_CACHE_ITEMS):
+        self.max_items = max_items
+        self.items = OrderedDict()
+        self.user_paths = {}
+        self.counters = {"hits": 0, "misses": 0}
+
+    def get(self, path, size, owner=None):
+        # Giống ImageLoader.pixmap: None nghĩa là ảnh đang được giải mã
+        pix = image_loader().pixmap(path, size, size, owner=owner)
+        if pix is None or pix.isNull(): return pix
+        key = (path, size)
+        stamp = thumbnails.stamp(path, size, size)
+        entry = self.items.get(key)
+        if entry is not None and entry[0] == stamp:
+            self.items.move_to_end(key)
+            self.counters["hits"] += 1
+            return entry[1]
+        self.counters["misses"] += 1
+        masked = mask_image_circular(pix, size)
+        self.items[key] = (stamp, masked)
+        while len(self.items) > self.max_items: self.items.popitem(last=False)
+        return masked
+
+    def invalidate(self, path):
+        if not path: return
+        for key in [key for key in self.items if key[0] == path]: del self.items[key]
+        thumbnails.forget(path)
+
+    def on_data_changed(self, change, payload):
+        if change != "user_updated": return
+        user = payload["user"]
+        path = user.get("avatar", "")
+        old = self.user_paths.get(user["id"])
+        if old == path: return
+        self.user_paths[user["id"]] = path
+        self.invalidate(old)
+        self.invalidate(path)
+
+    def stats(self):
+        return dict(self.counters, items=len(self.items))
+
+avatars = AvatarCache()
+
 def is_valid_email(email):
     return re.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', email)
 
@@ -237,145 +686,2125 @@ def is_valid_password(password):
     if not re.search(r"[@$!%*?&]", password): return False
     return True
 
-class DataManager:
+_last_record_id = 0.0
+_record_id_lock = threading.Lock()
+
+def new_record_id():
+    # Vẫn là timestamp như trước nhưng luôn tăng, để nhiều bản ghi tạo trong cùng một tích tắc (nhập hàng loạt) không trùng id
+    global _last_record_id
+    with _record_id_lock:
+        _last_record_id = max(datetime.now().timestamp(), _last_record_id + 1e-6)
+        return str(_last_record_id)
+
+def empty_data():
+    return {"users": [], "events": [], "current_user": None}
+
+def journal_records(lines):
+    for line in lines:
+        try: yield json.loads(line)
+        except ValueError: return # Dòng cuối bị ghi dở khi tắt đột ngột
+
+def replay_journal(data, path):
+    if not os.path.exists(path): return
+    with open(path, 'r', encoding='utf-8') as f: apply_journal(data, journal_records(f))
+
+def apply_journal(data, records):
+    users = {u["id"]: i for i, u in enumerate(data["users"])}
+    events = {e["id"]: i for i, e in enumerate(data["events"])}
+    session = data["current_user"]["id"] if data.get("current_user") else None
+    for rec in records:
+        op = rec.get("op")
+        if op == "put_user":
+            u = rec["user"]
+            if u["id"] in users: data["users"][users[u["id"]]] = u
+            else:
+                users[u["id"]] = len(data["users"])
+                data["users"].append(u)
+        elif op == "put_event":
+            e = rec["event"]
+            if e["id"] in events: data["events"][events[e["id"]]] = e
+            else:
+                events[e["id"]] = len(data["events"])
+                data["events"].append(e)
+        elif op in ("del_user", "del_event"):
+            key = "users" if op == "del_user" else "events"
+            pos = users if op == "del_user" else events
+            if rec["id"] in pos:
+                data[key] = [x for x in data[key] if x["id"] != rec["id"]]
+                pos.clear()
+                pos.update({x["id"]: i for i, x in enumerate(data[key])})
+        elif op in ("join", "leave", "wait", "unwait", "promote") and rec["event"] in events:
+            # Sự kiện có thay đổi tham gia được chuyển sang ParticipantSet/WaitList để mỗi bản ghi chỉ tốn O(1)
+            event = data["events"][events[rec["event"]]]
+            if "version" in rec: event["version"] = rec["version"]
+            if not isinstance(event["participants"], ParticipantSet): event["participants"] = ParticipantSet(event["participants"])
+            if op in ("wait", "unwait", "promote") and not isinstance(event.get("waitlist"), WaitList):
+                event["waitlist"] = WaitList(event.get("waitlist", ()))
+            if op == "join": event["participants"].add(rec["user"])
+            elif op == "leave": event["participants"].discard(rec["user"])
+            elif op == "wait": event["waitlist"].push(rec["user"])
+            else:
+                event["waitlist"].discard(rec["user"])
+                if op == "promote": event["participants"].add(rec["user"])
+        elif op == "session":
+            session = rec["user"]
+    data["current_user"] = data["users"][users[session]] if session in users else None
+
+class ParticipantSet:
+    # Tập người tham gia giữ thứ tự đăng ký: dict rỗng giá trị cho in/add/discard/len O(1)
+    __slots__ = ("_members",)
+
+    def __init__(self, members=()):
+        self._members = dict.fromkeys(members)
+
+    def __contains__(self, user_id): return user_id in self._members
+    def __len__(self): return len(self._members)
+    def __iter__(self): return iter(self._members)
+
+    def add(self, user_id, limit=None):
+        if user_id in self._members: return True
+        if limit is not None and len(self._members) >= limit: return False
+        self._members[user_id] = None
+        return True
+
+    def discard(self, user_id):
+        self._members.pop(user_id, None)
+
+    def to_list(self):
+        return list(self._members)
+
+class WaitList:
+    # Hàng chờ FIFO: deque giữ thứ tự vé, dict user -> số vé cho in/push/discard/pop O(1).
+    # Người rời hàng chỉ bị xóa khỏi dict, vé cũ trong deque bị bỏ qua khi tới lượt và được dọn khi chiếm quá nửa
+    __slots__ = ("_queue", "_tickets", "_next")
+
+    def __init__(self, members=()):
+        self._queue = deque()
+        self._tickets = {}
+        self._next = 0
+        for user_id in members: self.push(user_id)
+
+    def __contains__(self, user_id): return user_id in self._tickets
+    def __len__(self): return len(self._tickets)
+    def __iter__(self): return (user_id for user_id, ticket in self._queue if self._tickets.get(user_id) == ticket)
+
+    def push(self, user_id):
+        if user_id in self._tickets: return False
+        self._tickets[user_id] = self._next
+        self._queue.append((user_id, self._next))
+        self._next += 1
+        return True
+
+    def discard(self, user_id):
+        if self._tickets.pop(user_id, None) is None: return
+        if len(self._queue) > 2 * len(self._tickets) + 64: self._queue = deque(self._live())
+
+    def pop(self):
+        while self._queue:
+            user_id, ticket = self._queue.popleft()
+            if self._tickets.get(user_id) == ticket:
+                del self._tickets[user_id]
+                return user_id
+        return None
+
+    def position(self, user_id):
+        # Vị trí tính từ 1, duyệt từ đầu hàng nên chỉ tốn O(vị trí); chỉ dùng để hiển thị
+        ticket = self._tickets.get(user_id)
+        if ticket is None: return None
+        pos = 0
+        for other, t in list(self._queue):
+            if self._tickets.get(other) == t: pos += 1
+            if t == ticket: return pos
+        return None
+
+    def _live(self):
+        return [(user_id, ticket) for user_id, ticket in self._queue if self._tickets.get(user_id) == ticket]
+
+    def to_list(self):
+        # Chụp deque/dict trước (mỗi lệnh sao chép là nguyên tử) vì sự kiện có thể đang được sửa dưới khóa riêng của nó
+        queue, tickets = list(self._queue), dict(self._tickets)
+        return [user_id for user_id, ticket in queue if tickets.get(user_id) == ticket]
+
+def json_default(obj):
+    if isinstance(obj, (ParticipantSet, WaitList)): return obj.to_list()
+    raise TypeError(f"Không thể ghi {type(obj).__name__} ra JSON")
+
+def event_capacity(event):
+    max_p = str(event.get("max_participants", "")).strip()
+    return int(max_p) if max_p.isdigit() and int(max_p) > 0 else None
+
+def parse_local_time(date_str, time_str):
+    # Tương đương strptime("%d/%m/%Y %H:%M") nhưng nhanh hơn nhiều lần; dựng chỉ mục và nhập hàng loạt gọi hàm này cho mọi sự kiện
+    day, month, year = date_str.split("/")
+    hour, minute = time_str.split(":")
+    return datetime(int(year), int(month), int(day), int(hour), int(minute)).timestamp()
+
+def parse_event_times(event):
+    s_date = event.get("start_date", event.get("date"))
+    e_date = event.get("end_date", s_date)
+    try:
+        start = parse_local_time(s_date, event.get('start_time', '00:00'))
+        end = parse_local_time(e_date, event.get('end_time', '23:59'))
+    except (AttributeError, TypeError, ValueError): return None
+    return start, end
+
+class EventTimeIndex:
+    # Mốc thời gian (epoch giây) được parse một lần; _ends/_starts là mảng đã sắp xếp để chia nhóm bằng bisect
     def __init__(self):
-        self.data = {"users": [], "events": [], "current_user": None}
-        self.load_data()
+        self.version = 0
+        self._times = {}
+        self._ends, self._end_ids = array('d'), []
+        self._starts, self._start_ids = array('d'), []
 
-    def load_data(self):
-        if os.path.exists(DATA_FILE):
+    def rebuild(self, events):
+        self._times = {}
+        for e in events:
+            t = parse_event_times(e)
+            if t: self._times[e["id"]] = t
+        self._end_ids = sorted(self._times, key=lambda i: self._times[i][1])
+        self._ends = array('d', (self._times[i][1] for i in self._end_ids))
+        self._start_ids = sorted(self._times, key=lambda i: self._times[i][0])
+        self._starts = array('d', (self._times[i][0] for i in self._start_ids))
+        self.version += 1
+
+    def put(self, event):
+        self._discard(event["id"])
+        t = parse_event_times(event)
+        if t:
+            self._times[event["id"]] = t
+            self._insert(self._starts, self._start_ids, t[0], event["id"])
+            self._insert(self._ends, self._end_ids, t[1], event["id"])
+        self.version += 1
+
+    def remove(self, event_id):
+        self._discard(event_id)
+        self.version += 1
+
+    def times(self, event_id):
+        return self._times.get(event_id)
+
+    def ended_between(self, since, until):
+        return self._end_ids[bisect_left(self._ends, since):bisect_left(self._ends, until)]
+
+    def partition(self, cutoff):
+        # Sự kiện kết thúc trước cutoff là hết hạn; đang diễn ra xếp theo giờ kết thúc gần nhất, hết hạn xếp mới nhất trước
+        i = bisect_left(self._ends, cutoff)
+        return self._end_ids[i:], self._end_ids[i - 1::-1] if i else []
+
+    def starting_soon(self, now, within_seconds):
+        lo = bisect_left(self._starts, now)
+        hi = bisect_right(self._starts, now + within_seconds)
+        return self._start_ids[lo:hi]
+
+    def _discard(self, event_id):
+        t = self._times.pop(event_id, None)
+        if t:
+            self._delete(self._starts, self._start_ids, t[0], event_id)
+            self._delete(self._ends, self._end_ids, t[1], event_id)
+
+    @staticmethod
+    def _insert(keys, ids, key, event_id):
+        i = bisect_right(keys, key)
+        keys.insert(i, key)
+        ids.insert(i, event_id)
+
+    @staticmethod
+    def _delete(keys, ids, key, event_id):
+        i = bisect_left(keys, key)
+        while ids[i] != event_id: i += 1
+        del keys[i]
+        del ids[i]
+
+class IntervalIndex:
+    # Khoảng [start, end) chia nhóm theo độ dài (nhóm k: dài dưới 2^k giây), mỗi nhóm sắp theo start. Truy vấn chồng lấn
+    # trong nhóm k chỉ quét các khoảng bắt đầu từ start - 2^k, nên một sự kiện rất dài chỉ nằm trong nhóm của nó thay vì
+    # nới rộng vùng quét của mọi truy vấn: O(số nhóm * log n + k)
+    def __init__(self):
+        self._times = {}
+        self._buckets = {}
+
+    def __len__(self):
+        return len(self._times)
+
+    @staticmethod
+    def _bucket(start, end):
+        return int(end - start).bit_length()
+
+    def put(self, event_id, start, end):
+        self.remove(event_id)
+        self._times[event_id] = (start, end)
+        starts, ids = self._buckets.setdefault(self._bucket(start, end), (array('d'), []))
+        EventTimeIndex._insert(starts, ids, start, event_id)
+
+    def remove(self, event_id):
+        t = self._times.pop(event_id, None)
+        if t:
+            k = self._bucket(*t)
+            starts, ids = self._buckets[k]
+            EventTimeIndex._delete(starts, ids, t[0], event_id)
+            if not ids: del self._buckets[k]
+
+    def overlapping(self, start, end, exclude=None):
+        found = []
+        for k, (starts, ids) in self._buckets.items():
+            lo = bisect_left(starts, start - (1 << k))
+            hi = bisect_left(starts, end)
+            found += [i for i in ids[lo:hi] if self._times[i][1] > start and i != exclude]
+        if len(self._buckets) > 1: found.sort(key=lambda i: self._times[i][0])
+        return found
+
+def location_key(value):
+    return " ".join(fold_text(value or "").split())
+
+class ScheduleIndex:
+    # Khoảng thời gian của sự kiện theo từng địa điểm (đã chuẩn hoá) và theo từng sinh viên đã tham gia
+    def __init__(self):
+        self.times = {}
+        self.by_location = {}
+        self.by_user = {}
+        self.locations = {}
+
+    def rebuild(self, events):
+        self.times, self.by_location, self.by_user, self.locations = {}, {}, {}, {}
+        for e in events: self.put(e)
+
+    def put(self, event):
+        self.remove(event)
+        t = parse_event_times(event)
+        if not t: return
+        event_id = event["id"]
+        self.times[event_id] = t
+        loc = location_key(event.get("location"))
+        if loc:
+            self.locations[event_id] = loc
+            self.by_location.setdefault(loc, IntervalIndex()).put(event_id, *t)
+        for user_id in event.get("participants", ()): self.join(user_id, event_id)
+
+    def remove(self, event):
+        event_id = event["id"]
+        if self.times.pop(event_id, None) is None: return
+        loc = self.locations.pop(event_id, None)
+        if loc:
+            self.by_location[loc].remove(event_id)
+            if not self.by_location[loc]: del self.by_location[loc]
+        for user_id in event.get("participants", ()): self.leave(user_id, event_id)
+
+    def join(self, user_id, event_id):
+        t = self.times.get(event_id)
+        if t: self.by_user.setdefault(user_id, IntervalIndex()).put(event_id, *t)
+
+    def leave(self, user_id, event_id):
+        if user_id in self.by_user: self.by_user[user_id].remove(event_id)
+
+    def location_conflicts(self, location, start, end, exclude=None):
+        index = self.by_location.get(location_key(location))
+        return index.overlapping(start, end, exclude) if index else []
+
+    def user_conflicts(self, user_id, start, end, exclude=None):
+        index = self.by_user.get(user_id)
+        return index.overlapping(start, end, exclude) if index else []
+
+# Bảng bỏ dấu cho các khối chữ Latin (gồm tiếng Việt): "Hội thảo Đà Nẵng" -> "hoi thao da nang"
+FOLD_TABLE = {c: unicodedata.normalize("NFD", chr(c))[0] for c in list(range(0xC0, 0x250)) + list(range(0x1E00, 0x1F00)) if unicodedata.normalize("NFD", chr(c))[0] != chr(c)}
+FOLD_TABLE.update({ord("đ"): "d", ord("Đ"): "d"})
+
+def fold_text(text):
+    return text.lower().translate(FOLD_TABLE)
+
+def tokenize(text):
+    return re.findall(r"\w+", fold_text(text))
+
+def html_to_text(value):
+    value = re.sub(r"(?is)<(head|style|script)[^>]*>.*?</\1>", " ", value)
+    return html.unescape(re.sub(r"<[^>]+>", " ", value))
+
+class SearchIndex:
+    # Chỉ mục đảo: token đã bỏ dấu -> {event_id: trọng số}; danh sách token được sắp xếp để tra theo tiền tố
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.built = False
+        self.pending = None
+        self.postings = {}
+        self.doc_terms = {}
+        self.terms = []
+
+    @staticmethod
+    def event_terms(event):
+        weights = {}
+        for field, weight in SEARCH_FIELDS:
+            value = event.get(field) or ""
+            if field == "content": value = html_to_text(value)
+            for term in set(tokenize(value)): weights[term] = weights.get(term, 0) + weight
+        return weights
+
+    def begin(self):
+        # Gọi trong lúc còn giữ khoá dữ liệu khi chụp danh sách sự kiện: từ đây put()/remove() được ghi vào pending
+        with self.lock:
+            if self.pending is None and not self.built: self.pending = {}
+
+    def rebuild(self, events):
+        # Dựng ngoài khoá từ danh sách chụp sau begin(); thay đổi xảy ra trong lúc dựng được áp lại ở cuối
+        self.begin()
+        built = SearchIndex()
+        for e in events: built._put(e, keep_sorted=False)
+        with self.lock:
+            if self.built: return # Lượt dựng song song khác đã xong và đang được cập nhật trực tiếp
+            self.postings, self.doc_terms, self.terms = built.postings, built.doc_terms, sorted(built.postings)
+            for event_id, event in self.pending.items():
+                self._remove(event_id)
+                if event is not None: self._put(event)
+            self.pending = None
+            self.built = True
+
+    def put(self, event):
+        with self.lock:
+            if self.built:
+                self._remove(event["id"])
+                self._put(event)
+            elif self.pending is not None: self.pending[event["id"]] = event
+            # Chưa dựng thì bỏ qua: lần tìm kiếm đầu tiên sẽ dựng từ dữ liệu hiện tại
+
+    def remove(self, event_id):
+        with self.lock:
+            if self.built: self._remove(event_id)
+            elif self.pending is not None: self.pending[event_id] = None
+
+    def _put(self, event, keep_sorted=True):
+        weights = self.event_terms(event)
+        self.doc_terms[event["id"]] = weights
+        for term, weight in weights.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = {}
+                if keep_sorted: insort(self.terms, term)
+            posting[event["id"]] = weight
+
+    def _remove(self, event_id):
+        for term in self.doc_terms.pop(event_id, ()):
+            posting = self.postings[term]
+            del posting[event_id]
+            if not posting:
+                del self.postings[term]
+                del self.terms[bisect_left(self.terms, term)]
+
+    def query(self, text, limit=None):
+        # Mọi token đều phải khớp (khớp tiền tố chỉ được nửa điểm so với khớp trọn từ); token dài, ít kết quả được xét trước
+        tokens = sorted(set(tokenize(text)), key=len, reverse=True)
+        if not tokens: return []
+        scores = None
+        with self.lock:
+            for token in tokens:
+                lo = bisect_left(self.terms, token)
+                # Token quá ngắn chỉ khớp trọn từ, tránh quét gần như toàn bộ từ điển
+                hi = bisect_left(self.terms, token + "\uffff") if len(token) >= SEARCH_MIN_PREFIX else lo + (self.terms[lo:lo + 1] == [token])
+                matched = {}
+                if scores is not None and len(scores) < hi - lo:
+                    for event_id in scores:
+                        best = max((w if t == token else w / 2 for t, w in self.doc_terms[event_id].items() if t.startswith(token)), default=0)
+                        if best: matched[event_id] = best
+                else:
+                    for i in range(lo, hi):
+                        term = self.terms[i]
+                        posting = self.postings[term]
+                        if term != token: posting = {event_id: weight / 2 for event_id, weight in posting.items()}
+                        if hi - lo == 1: matched = posting # Chỉ đọc, không cần sao chép
+                        else:
+                            get = matched.get
+                            matched.update({event_id: weight for event_id, weight in posting.items() if weight > get(event_id, 0)})
+                scores = matched if scores is None else {i: sc + matched[i] for i, sc in scores.items() if i in matched}
+                if not scores: return []
+            if limit: return heapq.nlargest(limit, scores, key=scores.get)
+            return sorted(scores, key=scores.get, reverse=True)
+
+def parse_tags(value):
+    # "IT, Hội thảo; #AI" -> {"it": "IT", "hoi thao": "Hội thảo", "ai": "AI"}; khoá đã bỏ dấu, giữ nhãn gặp đầu tiên để hiển thị
+    tags = {}
+    for label in re.split(r"[,;#\n]", value or ""):
+        label = " ".join(label.split())
+        key = fold_text(label)
+        if key and key not in tags: tags[key] = label
+    return tags
+
+class TagIndex:
+    # Nhãn đã chuẩn hoá -> tập id sự kiện; lọc AND/OR là phép giao/hợp trên các tập này
+    def __init__(self):
+        self.events = {}
+        self.labels = {}
+        self.event_tags = {}
+
+    def rebuild(self, events):
+        self.events, self.labels, self.event_tags = {}, {}, {}
+        for e in events: self.put(e)
+
+    def put(self, event):
+        self.remove(event["id"])
+        tags = parse_tags(event.get("tags", ""))
+        self.event_tags[event["id"]] = frozenset(tags)
+        for key, label in tags.items():
+            self.events.setdefault(key, set()).add(event["id"])
+            self.labels.setdefault(key, label)
+
+    def remove(self, event_id):
+        for key in self.event_tags.pop(event_id, ()):
+            ids = self.events[key]
+            ids.discard(event_id)
+            if not ids:
+                del self.events[key]
+                del self.labels[key]
+
+    def tags_of(self, event_id):
+        return self.event_tags.get(event_id, frozenset())
+
+    def match(self, keys, mode="and"):
+        sets = sorted((self.events.get(k, set()) for k in keys), key=len)
+        if not sets: return None
+        return set.intersection(*sets) if mode == "and" else set().union(*sets)
+
+    def counts(self, scope=None):
+        # Không có scope: số sự kiện của từng nhãn; có scope: chỉ đếm trong tập id đó
+        if scope is None: return {k: len(ids) for k, ids in self.events.items()}
+        counts = {}
+        for event_id in scope:
+            for k in self.event_tags.get(event_id, ()): counts[k] = counts.get(k, 0) + 1
+        return counts
+
+def write_text_atomic(path, text):
+    tmp = path + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def write_json_atomic(path, data, indent=4):
+    write_text_atomic(path, json.dumps(data, ensure_ascii=False, indent=indent, default=json_default))
+
+def file_key(path):
+    # Nhận dạng snapshot để biết đã bị thay chưa (inode có thể được dùng lại nên kèm cả mtime, kích thước); None nếu không tồn tại
+    try: st = os.stat(path)
+    except FileNotFoundError: return None
+    return st.st_ino, st.st_dev, st.st_mtime_ns, st.st_size
+
+def journal_header(f):
+    # Journal dùng chung mở đầu bằng dòng {"op": "journal", "id": ...}; journal cũ không có thì dùng inode
+    try: rec = json.loads(f.readline())
+    except ValueError: rec = {}
+    if rec.get("op") == "journal": return rec["id"]
+    st = os.fstat(f.fileno())
+    return st.st_ino, st.st_dev
+
+def journal_id(path):
+    try:
+        with open(path, 'rb') as f: return journal_header(f)
+    except FileNotFoundError: return None
+
+def read_journal(path, offset=0):
+    # Đọc các dòng hoàn chỉnh từ offset (byte); trả về (bản ghi, offset sau dòng hoàn chỉnh cuối, id journal)
+    try: f = open(path, 'rb')
+    except FileNotFoundError: return [], offset, None
+    with f:
+        key = journal_header(f)
+        f.seek(offset)
+        chunk = f.read()
+    end = chunk.rfind(b"\n") + 1
+    return list(journal_records(chunk[:end].splitlines())), offset + end, key
+
+class FileLock:
+    # Khóa độc quyền giữa các tiến trình trên một file riêng (flock trên POSIX, msvcrt.locking trên Windows).
+    # Khóa flock gắn với file đang mở nên các luồng trong cùng tiến trình còn phải chờ nhau qua _local; cùng một luồng thì lồng được
+    def __init__(self, path, timeout=SHARED_LOCK_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self._fd = None
+        self._local = threading.Lock()
+        self._owner = None
+        self._depth = 0
+
+    def held(self):
+        return self._owner == threading.get_ident()
+
+    def acquire(self, blocking=True):
+        if self.held():
+            self._depth += 1
+            return True
+        if not self._local.acquire(blocking): return False
+        try:
+            if self._fd is None: self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            if blocking and fcntl: fcntl.flock(self._fd, fcntl.LOCK_EX)
+            else:
+                deadline, delay = time.monotonic() + self.timeout, 0.001
+                while not self._try_lock():
+                    if not blocking: raise BlockingIOError
+                    if time.monotonic() > deadline: raise TimeoutError(f"Không lấy được khóa {self.path}")
+                    time.sleep(delay)
+                    delay = min(delay * 2, 0.05)
+        except BlockingIOError:
+            self._local.release()
+            return False
+        except BaseException:
+            self._local.release()
+            raise
+        self._owner, self._depth = threading.get_ident(), 1
+        return True
+
+    def _try_lock(self):
+        try:
+            if fcntl: fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else: msvcrt.locking(self._fd, msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError: return False
+
+    def release(self):
+        self._depth -= 1
+        if self._depth: return
+        self._owner = None
+        if fcntl: fcntl.flock(self._fd, fcntl.LOCK_UN)
+        else: msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        self._local.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+# Store: prepare() chạy khi đang giữ khóa dữ liệu (chụp lại trạng thái), write() làm I/O ngoài khóa
+class JsonStore:
+    def __init__(self, path=DATA_FILE):
+        self.path = path
+
+    def load(self):
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except: pass
+        return None
+
+    def save(self, data):
+        write_json_atomic(self.path, data)
+
+    def prepare(self, data, records):
+        return json.dumps(data, ensure_ascii=False, indent=4, default=json_default)
+
+    def write(self, payload):
+        write_text_atomic(self.path, payload)
+
+    def append(self, data, records):
+        self.write(self.prepare(data, records))
+
+    def maintain(self): pass
+
+class JournalStore(JsonStore):
+    def __init__(self, path=DATA_FILE, journal_path=JOURNAL_FILE, compact_bytes=JOURNAL_COMPACT_BYTES):
+        super().__init__(path)
+        self.journal_path = journal_path
+        self.rotated_path = journal_path + ".1"
+        self.compact_bytes = compact_bytes
+        self._journal = None
+        self._compactor = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        data = super().load() or empty_data()
+        for path in (self.rotated_path, self.journal_path): replay_journal(data, path)
+        return data
+
+    def save(self, data):
+        self.wait_compaction()
+        with self._lock:
+            self._close_journal()
+            super().save(data)
+            for path in (self.journal_path, self.rotated_path):
+                if os.path.exists(path): os.remove(path)
+
+    def prepare(self, data, records):
+        return "".join(json.dumps(r, ensure_ascii=False, default=json_default) + "\n" for r in records)
+
+    def write(self, payload):
+        with self._lock:
+            if self._journal is None: self._journal = open(self.journal_path, 'a', encoding='utf-8')
+            self._journal.write(payload)
+            self._journal.flush()
+            size = self._journal.tell()
+        if size >= self.compact_bytes: self.compact()
+
+    def compact(self):
+        with self._lock:
+            if self._compactor and self._compactor.is_alive(): return
+            if not os.path.exists(self.rotated_path):
+                self._close_journal()
+                if not os.path.exists(self.journal_path): return
+                os.replace(self.journal_path, self.rotated_path)
+            self._compactor = threading.Thread(target=self._compact_rotated, daemon=True)
+            self._compactor.start()
+
+    def maintain(self):
+        # Gộp journal sau khi nạp nếu còn file xoay vòng sót lại hoặc journal đã quá ngưỡng (chạy nền)
+        size = os.path.getsize(self.journal_path) if os.path.exists(self.journal_path) else 0
+        if os.path.exists(self.rotated_path) or size >= self.compact_bytes: self.compact()
+
+    def wait_compaction(self):
+        if self._compactor: self._compactor.join()
+
+    def _compact_rotated(self):
+        # Chỉ đọc snapshot + journal đã xoay vòng trên đĩa, không chạm vào dữ liệu đang dùng trên UI thread
+        data = JsonStore.load(self) or empty_data()
+        replay_journal(data, self.rotated_path)
+        JsonStore.save(self, data)
+        os.remove(self.rotated_path)
+
+    def _close_journal(self):
+        if self._journal:
+            self._journal.close()
+            self._journal = None
+
+class SharedJournalStore(JournalStore):
+    # Nhiều tiến trình (nhiều cửa sổ ứng dụng, CLI) dùng chung một file dữ liệu. Ghi: chỉ nối các bản ghi đã thay đổi vào journal
+    # trong khóa file ngắn. Đọc: không bao giờ lấy khóa, mỗi tiến trình nhớ vị trí đã đọc trong journal để kéo phần mới về.
+    # Gộp journal dựng snapshot mới ngoài khóa ghi rồi thay file nguyên tử, nên người đọc/ghi không phải chờ
+    shared = True
+
+    def __init__(self, path=DATA_FILE, journal_path=JOURNAL_FILE, compact_bytes=JOURNAL_COMPACT_BYTES):
+        super().__init__(path, journal_path, compact_bytes)
+        self.file_lock = FileLock(path + ".lock")
+        self.compact_lock = FileLock(path + ".compact.lock")
+        self.snapshot_key = None
+        self.rotated_key = None
+        self.journal_key = None
+        self.offset = 0
+
+    def load(self):
+        # Đọc lạc quan: nếu giữa chừng snapshot bị thay hoặc journal bị xoay vòng thì đọc lại từ đầu
+        while True:
+            snapshot_key = file_key(self.path)
+            data = JsonStore.load(self) or empty_data()
+            rotated, _, rotated_key = read_journal(self.rotated_path)
+            records, offset, journal_key = read_journal(self.journal_path)
+            if file_key(self.path) == snapshot_key and journal_id(self.rotated_path) == rotated_key: break
+        apply_journal(data, rotated + records)
+        data["current_user"] = None # Phiên đăng nhập thuộc về từng tiến trình, không lấy từ file chung
+        self.snapshot_key, self.rotated_key, self.journal_key, self.offset = snapshot_key, rotated_key, journal_key, offset
+        return data
+
+    def read_new(self):
+        # Các bản ghi tiến trình khác vừa nối thêm; None khi không nối tiếp được với lần đọc trước (phải nạp lại toàn bộ)
+        records = []
+        key = journal_id(self.journal_path)
+        if self.journal_key is None:
+            if file_key(self.path) != self.snapshot_key or journal_id(self.rotated_path) != self.rotated_key: return None
+            if key is None: return records
+            self.journal_key, self.offset = key, 0
+        elif key != self.journal_key:
+            # Journal đang đọc dở đã bị xoay vòng thành .1: đọc nốt phần còn lại rồi sang journal mới
+            rest, _, rotated_key = read_journal(self.rotated_path, self.offset)
+            if rotated_key != self.journal_key: return None
+            records += rest
+            self.rotated_key, self.journal_key, self.offset = rotated_key, key, 0
+            if key is None: return records
+        more, self.offset, key = read_journal(self.journal_path, self.offset)
+        if key != self.journal_key: return None # Bị xoay vòng đúng lúc đang đọc
+        return records + more
+
+    def changed(self):
+        # Journal (hoặc snapshot khi chưa có journal) đã có dữ liệu mà tiến trình này chưa đọc
+        if self.journal_key is None and (file_key(self.path) != self.snapshot_key or journal_id(self.rotated_path) != self.rotated_key): return True
+        key = journal_id(self.journal_path)
+        return key != self.journal_key or key is not None and os.path.getsize(self.journal_path) != self.offset
+
+    def prepare(self, data, records):
+        return super().prepare(data, [r for r in records if r["op"] != "session"])
+
+    def write(self, payload):
+        if not payload: return
+        with self.file_lock:
+            caught_up = not self.changed()
+            with open(self.journal_path, 'ab') as f:
+                if f.tell() == 0:
+                    key = secrets.token_hex(8)
+                    f.write(json.dumps({"op": "journal", "id": key}).encode("utf-8") + b"\n")
+                    if caught_up: self.journal_key = key
+                f.write(payload.encode("utf-8"))
+                f.flush()
+                size = f.tell()
+            # Chưa đọc kịp phần người khác ghi thì giữ nguyên vị trí: lần kéo sau đọc lại cả bản ghi của mình và bỏ qua theo phiên bản
+            if caught_up: self.offset = size
+
+    def save(self, data):
+        # Không ghi đè bằng bản sao trong bộ nhớ (có thể đã cũ so với tiến trình khác): gộp lại từ chính dữ liệu trên đĩa
+        self.compact()
+        self.wait_compaction()
+
+    def compact(self):
+        if self._compactor and self._compactor.is_alive(): return
+        if not self.compact_lock.acquire(blocking=False): return # Tiến trình khác đang gộp
+        try:
+            with self.file_lock:
+                if not os.path.exists(self.rotated_path):
+                    if not os.path.exists(self.journal_path):
+                        self.compact_lock.release()
+                        return
+                    os.replace(self.journal_path, self.rotated_path)
+        except BaseException:
+            self.compact_lock.release()
+            raise
+        self._compactor = threading.Thread(target=self._compact_rotated, daemon=True)
+        self._compactor.start()
+
+    def _compact_rotated(self):
+        try:
+            data = JsonStore.load(self) or empty_data()
+            records, _, _ = read_journal(self.rotated_path)
+            apply_journal(data, records)
+            data["current_user"] = None
+            JsonStore.save(self, data)
+            try: os.remove(self.rotated_path)
+            except OSError: pass # Windows: tiến trình khác đang mở file, lần gộp sau xóa tiếp (áp lại journal là lũy đẳng)
+        finally:
+            self.compact_lock.release()
+
+class SqliteStore:
+    # Tìm tài khoản theo tên đăng nhập/email và sự kiện theo giờ kết thúc chạy bằng truy vấn trên chỉ mục của bảng (DataManager.indexed).
+    # username/email lưu dạng chữ thường để khớp đúng như so sánh .lower() của các kho khác, end_key là epoch giây giờ kết thúc
+    indexed = True
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (id TEXT PRIMARY KEY, username TEXT, email TEXT, data TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS events (id TEXT PRIMARY KEY, end_key REAL, data TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS participants (event_id TEXT NOT NULL, user_id TEXT NOT NULL, PRIMARY KEY (event_id, user_id));
+        CREATE TABLE IF NOT EXISTS waitlist (ticket INTEGER PRIMARY KEY AUTOINCREMENT, event_id TEXT NOT NULL, user_id TEXT NOT NULL, UNIQUE (event_id, user_id));
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+    """
+    INDEXES = """
+        CREATE INDEX IF NOT EXISTS idx_users_username ON users (username);
+        CREATE INDEX IF NOT EXISTS idx_users_email ON users (email);
+        CREATE INDEX IF NOT EXISTS idx_events_end ON events (end_key);
+    """
+
+    def __init__(self, path=SQLITE_FILE, json_path=DATA_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        # WAL: giao dịch nhỏ của từng tài khoản không phải chờ fsync cả file
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        self._lock = threading.Lock()
+        self._upgrade()
+        self.conn.executescript(self.INDEXES)
+        if json_path and not self._get_meta("migrated_from"): migrate_json_to_sqlite(self, json_path)
+
+    def _upgrade(self):
+        # File tạo bởi bản chưa có cột tra cứu: thêm cột rồi điền lại từ data
+        if "username" not in {row[1] for row in self.conn.execute("PRAGMA table_info(users)")}:
+            with self.conn:
+                self.conn.execute("ALTER TABLE users ADD COLUMN username TEXT")
+                self.conn.execute("ALTER TABLE users ADD COLUMN email TEXT")
+                for uid, raw in self.conn.execute("SELECT id, data FROM users").fetchall():
+                    u = json.loads(raw)
+                    self.conn.execute("UPDATE users SET username = ?, email = ? WHERE id = ?", (u.get("username", "").lower(), u.get("email", "").lower(), uid))
+        if "end_key" not in {row[1] for row in self.conn.execute("PRAGMA table_info(events)")}:
+            with self.conn:
+                self.conn.execute("ALTER TABLE events ADD COLUMN end_key REAL")
+                for eid, raw in self.conn.execute("SELECT id, data FROM events").fetchall():
+                    t = parse_event_times(json.loads(raw))
+                    self.conn.execute("UPDATE events SET end_key = ? WHERE id = ?", (t[1] if t else None, eid))
+
+    def user_id_by(self, column, value):
+        # column: "username" hoặc "email"; value đã là chữ thường
+        with self._lock:
+            row = self.conn.execute(f"SELECT id FROM users WHERE {column} = ? LIMIT 1", (value,)).fetchone()
+        return row[0] if row else None
+
+    def events_ended_between(self, since, until):
+        with self._lock:
+            return [row[0] for row in self.conn.execute("SELECT id FROM events WHERE end_key >= ? AND end_key < ? ORDER BY end_key", (since, until))]
+
+    def load(self):
+        with self._lock:
+            users = [json.loads(row[0]) for row in self.conn.execute("SELECT data FROM users ORDER BY rowid")]
+            events = []
+            index = {}
+            for eid, raw in self.conn.execute("SELECT id, data FROM events ORDER BY rowid"):
+                e = json.loads(raw)
+                e["participants"] = []
+                index[eid] = e
+                events.append(e)
+            for eid, uid in self.conn.execute("SELECT event_id, user_id FROM participants ORDER BY rowid"):
+                if eid in index: index[eid]["participants"].append(uid)
+            for eid, uid in self.conn.execute("SELECT event_id, user_id FROM waitlist ORDER BY ticket"):
+                if eid in index: index[eid].setdefault("waitlist", []).append(uid)
+            session = self._get_meta("current_user")
+        current = next((u for u in users if u["id"] == session), None) if session else None
+        return {"users": users, "events": events, "current_user": current}
+
+    def save(self, data):
+        stmts = [(f"DELETE FROM {table}", ()) for table in ("users", "events", "participants", "waitlist")]
+        for u in data["users"]: stmts += self._put_user(u)
+        for e in data["events"]: stmts += self._put_event(e, with_participants=True)
+        current = data.get("current_user")
+        stmts += self._set_meta("current_user", current["id"] if current else None)
+        self.write(stmts)
+
+    def prepare(self, data, records):
+        stmts = []
+        for rec in records:
+            op = rec["op"]
+            if op == "put_user": stmts += self._put_user(rec["user"])
+            elif op == "del_user": stmts.append(("DELETE FROM users WHERE id = ?", (rec["id"],)))
+            elif op == "put_event": stmts += self._put_event(rec["event"])
+            elif op == "del_event":
+                stmts.append(("DELETE FROM events WHERE id = ?", (rec["id"],)))
+                stmts.append(("DELETE FROM participants WHERE event_id = ?", (rec["id"],)))
+                stmts.append(("DELETE FROM waitlist WHERE event_id = ?", (rec["id"],)))
+            elif op == "join":
+                stmts.append(("INSERT OR IGNORE INTO participants (event_id, user_id) VALUES (?, ?)", (rec["event"], rec["user"])))
+            elif op == "leave":
+                stmts.append(("DELETE FROM participants WHERE event_id = ? AND user_id = ?", (rec["event"], rec["user"])))
+            elif op == "wait":
+                stmts.append(("INSERT OR IGNORE INTO waitlist (event_id, user_id) VALUES (?, ?)", (rec["event"], rec["user"])))
+            elif op in ("unwait", "promote"):
+                stmts.append(("DELETE FROM waitlist WHERE event_id = ? AND user_id = ?", (rec["event"], rec["user"])))
+                if op == "promote":
+                    stmts.append(("INSERT OR IGNORE INTO participants (event_id, user_id) VALUES (?, ?)", (rec["event"], rec["user"])))
+            elif op == "session": stmts += self._set_meta("current_user", rec["user"])
+        return stmts
+
+    def write(self, stmts):
+        with self._lock, self.conn:
+            for sql, params in stmts: self.conn.execute(sql, params)
+
+    def append(self, data, records):
+        self.write(self.prepare(data, records))
+
+    def maintain(self): pass
+
+    def _put_user(self, u):
+        return [("INSERT OR REPLACE INTO users (id, username, email, data) VALUES (?, ?, ?, ?)",
+                 (u["id"], u.get("username", "").lower(), u.get("email", "").lower(), json.dumps(u, ensure_ascii=False)))]
+
+    def _put_event(self, e, with_participants=False):
+        body = {k: v for k, v in e.items() if k not in ("participants", "waitlist")}
+        t = parse_event_times(e)
+        stmts = [("INSERT INTO events (id, end_key, data) VALUES (?, ?, ?) ON CONFLICT(id) DO UPDATE SET end_key = excluded.end_key, data = excluded.data",
+                  (e["id"], t[1] if t else None, json.dumps(body, ensure_ascii=False)))]
+        if with_participants:
+            stmts += [("INSERT OR IGNORE INTO participants (event_id, user_id) VALUES (?, ?)", (e["id"], uid)) for uid in e["participants"]]
+            stmts += [("INSERT OR IGNORE INTO waitlist (event_id, user_id) VALUES (?, ?)", (e["id"], uid)) for uid in e.get("waitlist", ())]
+        return stmts
+
+    def _get_meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        return [("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))]
+
+def migrate_json_to_sqlite(store, json_path=DATA_FILE):
+    data = JournalStore(json_path, json_path + ".journal").load() if os.path.exists(json_path) else None
+    with store._lock:
+        has_rows = store.conn.execute("SELECT 1 FROM users UNION ALL SELECT 1 FROM events LIMIT 1").fetchone()
+    stmts = []
+    if data and not has_rows:
+        for u in data["users"]: stmts += store._put_user(u)
+        for e in data["events"]: stmts += store._put_event(e, with_participants=True)
+        current = data.get("current_user")
+        stmts += store._set_meta("current_user", current["id"] if current else None)
+    stmts += store._set_meta("migrated_from", os.path.abspath(json_path))
+    store.write(stmts)
+
+class PersistenceWriter(threading.Thread):
+    def __init__(self, store, lock, debounce_ms=SAVE_DEBOUNCE_MS):
+        super().__init__(daemon=True)
+        self.store = store
+        self.lock = lock
+        self.debounce = debounce_ms / 1000
+        self.last_flush_ms = None
+        self.last_flush_at = None
+        self.flush_count = 0
+        self.last_error = None
+        self._data = None
+        self._pending = []
+        self._first_pending_at = None
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+
+    def mark_dirty(self, data, records):
+        with self._cond:
+            self._data = data
+            self._pending.extend(records)
+            if self._first_pending_at is None: self._first_pending_at = time.monotonic()
+            self._cond.notify_all()
+
+    def run(self):
+        while True:
+            with self._cond:
+                while self._first_pending_at is None: self._cond.wait()
+                # Gom mọi thay đổi đến trong cửa sổ debounce thành một lần ghi
+                remaining = self._first_pending_at + self.debounce - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+            self.flush()
+
+    @tracer.traced("writer_flush", cat="data")
+    def flush(self):
+        with self._write_lock:
+            with self._cond:
+                records, data = self._pending, self._data
+                self._pending, self._first_pending_at = [], None
+            if not records: return
+            start = time.perf_counter()
             try:
-                with open(DATA_FILE, 'r', encoding='utf-8') as f:
-                    self.data = json.load(f)
-            except: pass 
-        self.save_data() 
+                with self.lock: payload = self.store.prepare(data, records)
+                self.store.write(payload)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                with self._cond:
+                    self._pending[:0] = records
+                    if self._first_pending_at is None: self._first_pending_at = time.monotonic()
+                return
+            self.last_flush_ms = (time.perf_counter() - start) * 1000
+            self.last_flush_at = datetime.now()
+            self.flush_count += 1
+
+    def status(self):
+        with self._cond: pending = len(self._pending)
+        return {"dirty": pending > 0, "pending": pending, "last_flush_ms": self.last_flush_ms,
+                "last_flush_at": self.last_flush_at, "flushes": self.flush_count,
+                "last_error": self.last_error}
 
+def create_store():
+    if STORAGE_BACKEND == "json": return JsonStore()
+    if STORAGE_BACKEND == "sqlite": return SqliteStore()
+    if STORAGE_BACKEND == "shared": return SharedJournalStore()
+    return JournalStore()
+
+def shared_write(method):
+    # Thao tác ghi trên kho dùng chung chạy trong DataManager.transaction; các kho khác gọi thẳng
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not self.shared: return method(self, *args, **kwargs)
+        return self.transaction(method, *args, **kwargs)
+    return wrapper
+
+class DataManager:
+    def __init__(self, store=None, load=True):
+        self.data = empty_data()
+        self.store = store or create_store()
+        self.lock = threading.RLock() # Người dùng, danh sách và chỉ mục dùng chung; sửa một sự kiện giữ thêm event_lock của nó
+        self._event_locks = {}
+        self.listeners = []
+        self.time_index = EventTimeIndex()
+        self.search = SearchIndex()
+        self.tags = TagIndex()
+        self.schedule = ScheduleIndex()
+        self.ready = threading.Event()
+        self.load_error = None
+        self.change_log = None # Máy chủ gắn ChangeLog vào đây để máy khách kéo thay đổi
+        self.shared = getattr(self.store, "shared", False)
+        self.indexed = getattr(self.store, "indexed", False) # Kho trả lời được tra cứu tài khoản/giờ kết thúc bằng truy vấn
+        self.conflicts = 0
+        self.writer = PersistenceWriter(self.store, self.lock)
+        self.writer.start()
+        atexit.register(self.flush)
+        if load: self.load_data()
+
+    @tracer.traced("load_data", cat="data")
+    def load_data(self):
+        # Chỉ đọc, không ghi lại file khi khởi động
+        try: data = self.store.load()
+        except Exception as e: data, self.load_error = None, str(e)
+        startup.mark("data_parsed")
+        with self.lock:
+            if data: self.data = data
+            self.build_indexes()
+        startup.mark("data_indexed")
+        self.store.maintain()
+        self.ready.set()
+
+    def load_async(self):
+        self.ready.clear()
+        threading.Thread(target=self.load_data, name="data-load", daemon=True).start()
+
+    @tracer.traced("save_data", cat="data")
     def save_data(self):
-        with open(DATA_FILE, 'w', encoding='utf-8') as f:
-            json.dump(self.data, f, ensure_ascii=False, indent=4)
+        self.flush()
+        with self.lock: self.store.save(self.data)
+
+    def commit(self, *records):
+        self.stamp(records)
+        if self.change_log is not None: self.change_log.append(records)
+        if self.shared: self.store.write(self.store.prepare(self.data, records))
+        else:
+            if self.indexed:
+                # Tài khoản ghi ngay (giao dịch nhỏ) để truy vấn tên đăng nhập/email thấy được liền; lỗi thì để luồng nền ghi lại sau
+                users = [r for r in records if r["op"] in ("put_user", "del_user")]
+                if users:
+                    try:
+                        self.store.write(self.store.prepare(self.data, users))
+                        records = [r for r in records if r["op"] not in ("put_user", "del_user")]
+                    except sqlite3.Error: pass
+            if records: self.writer.mark_dirty(self.data, records)
+
+    def stamp(self, records):
+        # Mỗi bản ghi mang số phiên bản mới của đối tượng nó thay đổi; nơi nhận bỏ qua bản ghi không mới hơn bản đang có
+        for rec in records:
+            op = rec["op"]
+            if op in ("put_user", "put_event"):
+                item = rec["user" if op == "put_user" else "event"]
+                item["version"] = item.get("version", 0) + 1
+            elif op in ("join", "leave", "wait", "unwait", "promote"):
+                e = self._events_by_id.get(rec["event"])
+                if e: rec["version"] = e["version"] = e.get("version", 0) + 1
+
+    def transaction(self, method, *args, **kwargs):
+        # Lạc quan: kéo thay đổi của tiến trình khác khi chưa giữ khóa file, vào khóa chỉ kiểm tra journal không đổi rồi chạy thao tác.
+        # Có tiến trình chen vào ghi thì thả khóa, kéo tiếp và thử lại; lần cuối kéo luôn trong khóa để chắc chắn ghi được
+        for attempt in range(SHARED_RETRIES):
+            self.sync()
+            with self.lock, self.store.file_lock:
+                if self.store.changed():
+                    if attempt < SHARED_RETRIES - 1:
+                        self.conflicts += 1
+                        continue
+                    self.sync()
+                result = method(self, *args, **kwargs)
+            if self.store.offset >= self.store.compact_bytes: self.store.compact()
+            return result
+
+    def sync(self):
+        # Kho dùng chung: áp các bản ghi tiến trình khác vừa ghi (không lấy khóa file nên không bao giờ chờ người ghi)
+        if not self.shared: return
+        with self.lock:
+            records = self.store.read_new()
+            if records is None: return self.reload()
+            for rec in records: self.apply_record(rec)
+
+    def reload(self):
+        current = self.data["current_user"]
+        self.load_data()
+        with self.lock:
+            if current: self.data["current_user"] = self._users_by_id.get(current["id"])
+        self.notify("data_reloaded")
+
+    def apply_record(self, rec):
+        # Áp một bản ghi từ nơi khác (máy chủ, tiến trình khác) lên bản sao cục bộ, giữ nguyên đối tượng cũ để màn hình đang tham chiếu thấy dữ liệu mới
+        op = rec["op"]
+        if op == "put_event":
+            e = rec["event"]
+            old = self._events_by_id.get(e["id"])
+            if old and e.get("version", 0) <= old.get("version", 0): return
+            e["participants"] = ParticipantSet(e.get("participants", []))
+            if e.get("waitlist"): e["waitlist"] = WaitList(e["waitlist"])
+            if old:
+                self.schedule.remove(old)
+                old.clear()
+                old.update(e)
+                e = old
+            else:
+                self.data["events"].append(e)
+                self._events_by_id[e["id"]] = e
+            self.time_index.put(e)
+            self.search.put(e)
+            self.tags.put(e)
+            self.schedule.put(e)
+            self.notify("event_updated" if old else "event_added", event=e)
+        elif op == "del_event":
+            e = self._events_by_id.pop(rec["id"], None)
+            if not e: return
+            self.data["events"].remove(e)
+            self.schedule.remove(e)
+            self.time_index.remove(rec["id"])
+            self.search.remove(rec["id"])
+            self.tags.remove(rec["id"])
+            self.notify("event_deleted", event_id=rec["id"])
+        elif op in ("join", "leave", "wait", "unwait", "promote"):
+            e = self._events_by_id.get(rec["event"])
+            if not e or rec.get("version", 0) and rec["version"] <= e.get("version", 0): return
+            if "version" in rec: e["version"] = rec["version"]
+            user_id = rec["user"]
+            if op in ("wait", "unwait", "promote"):
+                queue = self._waitlist(e, create=op == "wait")
+                if op == "wait": queue.push(user_id)
+                elif queue is not None: queue.discard(user_id)
+                if op != "promote":
+                    self.notify("participation_changed", event_id=e["id"], user_id=user_id, status="waitlisted" if op == "wait" else "unwaitlisted")
+                    return
+            if (user_id in e["participants"]) == (op != "leave"): return
+            if op == "leave":
+                e["participants"].discard(user_id)
+                self.schedule.leave(user_id, e["id"])
+            else:
+                e["participants"].add(user_id)
+                self.schedule.join(user_id, e["id"])
+            self.notify("participation_changed", event_id=e["id"], user_id=user_id, status={"join": "added", "leave": "removed", "promote": "promoted"}[op])
+        elif op == "put_user":
+            u = rec["user"]
+            old = self._users_by_id.get(u["id"])
+            if old and u.get("version", 0) <= old.get("version", 0): return
+            if old:
+                self._unindex_user(old)
+                old.clear()
+                old.update(u)
+                u = old
+            else: self.data["users"].append(u)
+            self._index_user(u)
+            self.notify("user_updated", user=u)
+        elif op == "del_user":
+            u = self._users_by_id.get(rec["id"])
+            if not u: return
+            self._unindex_user(u)
+            self.data["users"].remove(u)
+            if self.is_current(rec["id"]): self.data["current_user"] = None
+
+    def flush(self):
+        self.writer.flush()
+
+    def writer_status(self):
+        return self.writer.status()
+
+    # change: event_added / event_updated / event_deleted / participation_changed / user_updated
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        if listener in self.listeners: self.listeners.remove(listener)
+
+    def notify(self, change, **payload):
+        for listener in list(self.listeners): listener(change, payload)
+
+    def build_indexes(self):
+        self._users_by_id = {}
+        self._users_by_username = {}
+        self._users_by_email = {}
+        for u in self.data["users"]: self._index_user(u)
+        self._events_by_id = {}
+        for e in self.data["events"]:
+            if not isinstance(e.get("participants"), ParticipantSet): e["participants"] = ParticipantSet(e.get("participants", []))
+            if e.get("waitlist") and not isinstance(e["waitlist"], WaitList): e["waitlist"] = WaitList(e["waitlist"])
+            self._events_by_id[e["id"]] = e
+        self.time_index.rebuild(self.data["events"])
+        self.tags.rebuild(self.data["events"])
+        self.schedule.rebuild(self.data["events"])
+        self.search = SearchIndex() # Dựng lười ở lần tìm kiếm đầu tiên để không làm chậm khởi động
+        current = self.data.get("current_user")
+        self.data["current_user"] = self._users_by_id.get(current["id"]) if current else None
+
+    def _index_user(self, u):
+        self._users_by_id[u["id"]] = u
+        self._users_by_username[u.get("username", "").lower()] = u
+        self._users_by_email[u.get("email", "").lower()] = u
+
+    def _unindex_user(self, u):
+        self._users_by_id.pop(u["id"], None)
+        for index, key in ((self._users_by_username, "username"), (self._users_by_email, "email")):
+            if index.get(u.get(key, "").lower()) is u: index.pop(u.get(key, "").lower())
+
+    def check_indexes(self):
+        problems = []
+        users, events = self.data["users"], self.data["events"]
+        if len(self._users_by_id) != len(users) or any(self._users_by_id.get(u["id"]) is not u for u in users):
+            problems.append("users_by_id không khớp danh sách users")
+        if len(self._events_by_id) != len(events) or any(self._events_by_id.get(e["id"]) is not e for e in events):
+            problems.append("events_by_id không khớp danh sách events")
+        for index, key in ((self._users_by_username, "username"), (self._users_by_email, "email")):
+            if set(index) != {u.get(key, "").lower() for u in users}:
+                problems.append(f"users_by_{key} thiếu hoặc thừa khóa")
+            for k, u in index.items():
+                if u.get(key, "").lower() != k or self._users_by_id.get(u["id"]) is not u:
+                    problems.append(f"users_by_{key}[{k!r}] trỏ sai người dùng")
+        current = self.data.get("current_user")
+        if current and self._users_by_id.get(current["id"]) is not current:
+            problems.append("current_user không nằm trong danh sách users")
+        return problems
+
+    def get_user(self, user_id):
+        return self._users_by_id.get(user_id)
+
+    def _user_by(self, key, value):
+        if self.indexed: return self._users_by_id.get(self.store.user_id_by(key, value.lower()))
+        return (self._users_by_username if key == "username" else self._users_by_email).get(value.lower())
+
+    def find_user(self, identifier):
+        return self._user_by("username", identifier) or self._user_by("email", identifier)
+
+    def find_user_by_email(self, email):
+        return self._user_by("email", email)
+
+    def events_ended_between(self, since, until):
+        # Kho SQLite: ghi nốt thay đổi đang chờ (gọi ngoài self.lock) rồi truy vấn theo end_key
+        if not self.indexed: return self.time_index.ended_between(since, until)
+        self.flush()
+        return [i for i in self.store.events_ended_between(since, until) if i in self._events_by_id]
+
+    def search_events(self, text, limit=None):
+        # Có thể gọi từ luồng nền; trả về danh sách id sự kiện theo thứ tự liên quan giảm dần
+        search = self.search
+        if not search.built:
+            with self.lock:
+                search.begin()
+                events = list(self.data["events"])
+            search.rebuild(events)
+        return search.query(text, limit)
 
+    @shared_write
+    def bulk_import(self, users=(), events=()):
+        # Thêm hàng loạt và ghi đúng một lần; chỉ mục thời gian/lịch được dựng lại một lần thay vì chèn từng phần tử.
+        # Trả về số bản ghi đã thêm: người dùng trùng tên đăng nhập/email với dữ liệu hiện tại bị bỏ qua
+        with self.lock:
+            records = []
+            for u in users:
+                # Kiểm tra lại dưới khóa vì có thể đã có người đăng ký trùng sau bước kiểm tra theo lô
+                if u["username"].lower() in self._users_by_username or u["email"].lower() in self._users_by_email: continue
+                u["id"] = new_record_id()
+                self.data["users"].append(u)
+                self._index_user(u)
+                records.append({"op": "put_user", "user": u})
+            for e in events:
+                e["id"] = new_record_id()
+                e["participants"] = ParticipantSet()
+                self.data["events"].append(e)
+                self._events_by_id[e["id"]] = e
+                self.tags.put(e)
+                self.search.put(e)
+                records.append({"op": "put_event", "event": e})
+            if events:
+                self.time_index.rebuild(self.data["events"])
+                self.schedule.rebuild(self.data["events"])
+            if records: self.commit(*records)
+        self.flush()
+        return len(records) - len(events), len(events)
+
+    def location_conflicts(self, event_data, exclude_id=None):
+        # Các sự kiện cùng địa điểm có thời gian giao với event_data (chưa cần lưu)
+        t = parse_event_times(event_data)
+        if not t: return []
+        with self.lock: return [self._events_by_id[i] for i in self.schedule.location_conflicts(event_data.get("location"), *t, exclude=exclude_id)]
+
+    def join_conflicts(self, event_id, user_id):
+        # Các sự kiện user đã tham gia trùng thời gian với event_id
+        with self.lock:
+            t = self.schedule.times.get(event_id)
+            if not t: return []
+            return [self._events_by_id[i] for i in self.schedule.user_conflicts(user_id, *t, exclude=event_id)]
+
+    def event_lock(self, event_id):
+        # Khóa riêng từng sự kiện: tham gia/hủy ở các sự kiện khác nhau không chờ nhau. Thứ tự luôn là event_lock rồi mới self.lock
+        # (kho dùng chung đã giữ self.lock cả giao dịch, RLock nên lấy lại được)
+        return self._event_locks.setdefault(event_id, threading.Lock())
+
+    def get_event(self, event_id):
+        return self._events_by_id.get(event_id)
+
+    @shared_write
     def register_user(self, user_data):
-        for u in self.data["users"]:
-            if u["username"] == user_data["username"]: return False, "Tên đăng nhập đã tồn tại."
-            if u["email"] == user_data["email"]: return False, "Email đã được sử dụng."
-        user_data["id"] = str(datetime.now().timestamp())
-        defaults = {"student_id": "", "class_name": "", "dob": "", "gender": "Nam", "address": "", "avatar": ""}
-        user_data.update(defaults)
-        self.data["users"].append(user_data)
-        self.save_data()
-        return True, "Đăng ký thành công!"
+        with self.lock:
+            if self._user_by("username", user_data["username"]): return False, "Tên đăng nhập đã tồn tại."
+            if self._user_by("email", user_data["email"]): return False, "Email đã được sử dụng."
+            user_data["id"] = new_record_id()
+            defaults = {"student_id": "", "class_name": "", "dob": "", "gender": "Nam", "address": "", "avatar": ""}
+            user_data.update(defaults)
+            self.data["users"].append(user_data)
+            self._index_user(user_data)
+            self.commit({"op": "put_user", "user": user_data})
+            return True, "Đăng ký thành công!"
 
     def login(self, identifier, password):
-        for u in self.data["users"]:
-            if (u["username"] == identifier or u["email"] == identifier) and u["password"] == password:
+        self.sync()
+        with self.lock:
+            u = self.find_user(identifier)
+            if u and u["password"] == password:
                 self.data["current_user"] = u
-                self.save_data()
+                self.commit({"op": "session", "user": u["id"]})
                 return True, u
-        return False, None
-
-    def update_user(self, updated_data):
-        if not self.data["current_user"]: return False
-        for i, u in enumerate(self.data["users"]):
-            if u["id"] == self.data["current_user"]["id"]:
-                self.data["users"][i].update(updated_data)
-                self.data["current_user"] = self.data["users"][i]
-                self.save_data()
-                return True
-        return False
+            return False, None
 
-    def delete_account(self):
-        if not self.data["current_user"]: return
-        uid = self.data["current_user"]["id"]
-        self.data["users"] = [u for u in self.data["users"] if u["id"] != uid]
-        self.logout()
+    @shared_write
+    def reset_password(self, email, password):
+        with self.lock:
+            user = self.find_user_by_email(email)
+            if not user: return False
+            user["password"] = password
+            self.commit({"op": "put_user", "user": user})
+            self.notify("user_updated", user=user)
+            return True
+
+    def is_current(self, user_id):
+        return bool(self.data["current_user"]) and self.data["current_user"]["id"] == user_id
+
+    @shared_write
+    def update_user(self, updated_data, user_id=None):
+        # user_id: máy chủ cập nhật theo phiên của từng máy khách; mặc định là người đang đăng nhập
+        with self.lock:
+            if user_id is None:
+                if not self.data["current_user"]: return False
+                user_id = self.data["current_user"]["id"]
+            u = self._users_by_id.get(user_id)
+            if not u: return False
+            self._unindex_user(u)
+            version = u.get("version", 0) # Bản sao cũ trên form không được kéo lùi số phiên bản
+            u.update(updated_data)
+            u["version"] = version
+            self._index_user(u)
+            if self.is_current(user_id): self.data["current_user"] = u
+            self.commit({"op": "put_user", "user": u})
+            self.notify("user_updated", user=u)
+            return True
+
+    @shared_write
+    def delete_account(self, user_id=None):
+        with self.lock:
+            if user_id is None:
+                if not self.data["current_user"]: return
+                user_id = self.data["current_user"]["id"]
+            u = self._users_by_id.get(user_id)
+            if u:
+                self._unindex_user(u)
+                self.data["users"].remove(u)
+            joined = [e["id"] for e in self.data["events"] if user_id in e["participants"] or e.get("waitlist") and user_id in e["waitlist"]]
+        # Trả lại chỗ và rời mọi hàng chờ, để _promote không đưa một tài khoản đã xóa vào sự kiện; từng sự kiện dưới khóa riêng của nó
+        changes = []
+        for event_id in joined:
+            with self.event_lock(event_id):
+                e = self._events_by_id.get(event_id)
+                if not e: continue
+                records = []
+                if e.get("waitlist") and user_id in e["waitlist"]:
+                    self._waitlist(e).discard(user_id)
+                    records.append({"op": "unwait", "event": event_id, "user": user_id})
+                with self.lock:
+                    if user_id in e["participants"]:
+                        e["participants"].discard(user_id)
+                        promoted = self._promote(e)
+                        records.append({"op": "leave", "event": event_id, "user": user_id})
+                        records += [{"op": "promote", "event": event_id, "user": p} for p in promoted]
+                        changes += [(event_id, user_id, "removed")] + [(event_id, p, "promoted") for p in promoted]
+                    if records: self.commit(*records)
+        with self.lock:
+            self.schedule.by_user.pop(user_id, None)
+            self.commit({"op": "del_user", "id": user_id})
+        for event_id, p, status in changes: self.notify("participation_changed", event_id=event_id, user_id=p, status=status)
+        if self.is_current(user_id): self.logout()
 
     def logout(self):
-        self.data["current_user"] = None
-        self.save_data()
+        with self.lock:
+            self.data["current_user"] = None
+            self.commit({"op": "session", "user": None})
+        self.flush()
 
+    @shared_write
     def add_event(self, event_data):
-        event_data["id"] = str(datetime.now().timestamp())
-        event_data["participants"] = []
-        self.data["events"].append(event_data)
-        self.save_data()
+        with self.lock:
+            event_data["id"] = new_record_id()
+            event_data["participants"] = ParticipantSet()
+            self.data["events"].append(event_data)
+            self._events_by_id[event_data["id"]] = event_data
+            self.time_index.put(event_data)
+            self.search.put(event_data)
+            self.tags.put(event_data)
+            self.schedule.put(event_data)
+            self.commit({"op": "put_event", "event": event_data})
+            self.notify("event_added", event=event_data)
 
+    @shared_write
     def update_event(self, event_id, new_data):
-        for i, e in enumerate(self.data["events"]):
-            if e["id"] == event_id:
-                new_data["participants"] = e["participants"]
-                new_data["id"] = event_id
-                self.data["events"][i] = new_data
-                self.save_data()
-                return True
-        return False
+        with self.event_lock(event_id), self.lock:
+            e = self._events_by_id.get(event_id)
+            if not e: return False
+            self.schedule.remove(e)
+            new_data["participants"] = e["participants"]
+            if "waitlist" in e: new_data["waitlist"] = e["waitlist"]
+            new_data["id"] = event_id
+            new_data["version"] = e.get("version", 0)
+            # Cập nhật tại chỗ để các màn hình đang giữ tham chiếu tới sự kiện thấy dữ liệu mới
+            e.clear()
+            e.update(new_data)
+            self.time_index.put(e)
+            self.search.put(e)
+            self.tags.put(e)
+            self.schedule.put(e)
+            promoted = self._promote(e) # Tăng số chỗ tối đa thì người đầu hàng chờ được vào luôn
+            self.commit({"op": "put_event", "event": e}, *({"op": "promote", "event": event_id, "user": u} for u in promoted))
+            self.notify("event_updated", event=e)
+            return True
 
+    @shared_write
     def delete_event(self, event_id):
-        self.data["events"] = [e for e in self.data["events"] if e["id"] != event_id]
-        self.save_data()
-
-    def toggle_participation(self, event_id, user_id):
-        for event in self.data["events"]:
-            if event["id"] == event_id:
-                if user_id in event["participants"]:
-                    event["participants"].remove(user_id)
-                    status = "removed"
-                else:
-                    event["participants"].append(user_id)
-                    status = "added"
-                self.save_data()
-                return status, len(event["participants"])
-        return None, 0
+        with self.event_lock(event_id), self.lock:
+            e = self._events_by_id.pop(event_id, None)
+            if e:
+                self.data["events"].remove(e)
+                self.schedule.remove(e)
+            self.time_index.remove(event_id)
+            self.search.remove(event_id)
+            self.tags.remove(event_id)
+            self.commit({"op": "del_event", "id": event_id})
+            self._event_locks.pop(event_id, None) # Luồng đang chờ khóa cũ sẽ thấy sự kiện đã mất
+            if e: self.notify("event_deleted", event_id=event_id)
 
-db = DataManager()
+    @shared_write
+    def toggle_participation(self, event_id, user_id, waitlist=False):
+        # waitlist=True: sự kiện đã đủ chỗ thì xếp vào hàng chờ thay vì trả "full"; người đang chờ bấm lần nữa là rời hàng.
+        # Quyết định và sửa danh sách dưới khóa của sự kiện; self.lock chỉ giữ ngắn khi cập nhật lịch và ghi nhật ký
+        with self.event_lock(event_id):
+            event = self._events_by_id.get(event_id)
+            if not event: return None, 0
+            participants = event["participants"]
+            queue = self._waitlist(event)
+            promoted = []
+            if user_id in participants:
+                participants.discard(user_id)
+                status, op = "removed", "leave"
+            elif queue is not None and user_id in queue:
+                queue.discard(user_id)
+                status, op = "unwaitlisted", "unwait"
+            elif participants.add(user_id, event_capacity(event)):
+                status, op = "added", "join"
+            elif waitlist:
+                with self.lock: queue = self._waitlist(event, create=True) # Thêm khóa "waitlist" vào sự kiện khi không ai đang ghi file
+                queue.push(user_id)
+                status, op = "waitlisted", "wait"
+            else:
+                return "full", len(participants)
+            with self.lock:
+                if op == "leave":
+                    self.schedule.leave(user_id, event_id)
+                    promoted = self._promote(event)
+                elif op == "join": self.schedule.join(user_id, event_id)
+                self.commit({"op": op, "event": event_id, "user": user_id}, *({"op": "promote", "event": event_id, "user": u} for u in promoted))
+            self.notify("participation_changed", event_id=event_id, user_id=user_id, status=status)
+            for u in promoted: self.notify("participation_changed", event_id=event_id, user_id=u, status="promoted")
+            return status, len(event["participants"])
 
-class EventCountdown(QLabel):
-    def __init__(self, event_data, parent=None):
-        super().__init__(parent)
-        self.event_data = event_data
-        self.setStyleSheet("font-weight: bold; font-size: 12px; margin-top: 5px;")
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.update_time)
-        self.timer.start(1000)
-        self.update_time()
+    def _waitlist(self, event, create=False):
+        # Chỉ sự kiện từng có người chờ mới mang WaitList, để hàng triệu sự kiện còn lại không tốn thêm bộ nhớ
+        queue = event.get("waitlist")
+        if isinstance(queue, WaitList): return queue
+        if not queue and not create: return None
+        queue = event["waitlist"] = WaitList(queue or ())
+        return queue
+
+    def _promote(self, event):
+        # Còn chỗ thì lấy người đầu hàng chờ vào danh sách tham gia, O(1) mỗi người
+        queue, promoted = self._waitlist(event), []
+        cap = event_capacity(event)
+        while queue and (cap is None or len(event["participants"]) < cap):
+            user_id = queue.pop()
+            event["participants"].add(user_id)
+            self.schedule.join(user_id, event["id"])
+            promoted.append(user_id)
+        return promoted
 
-    def update_time(self):
+    def waitlist_position(self, event_id, user_id):
+        # (vị trí tính từ 1 hoặc None nếu không chờ, tổng số người đang chờ)
+        with self.lock:
+            event = self._events_by_id.get(event_id)
+            queue = self._waitlist(event) if event else None
+            if queue is None: return None, 0
+            return queue.position(user_id), len(queue)
+
+class RemoteError(Exception): pass
+
+class ChangeLog:
+    # Các thay đổi gần nhất đánh số liên tục để máy khách chỉ kéo phần chênh lệch; bỏ bản ghi phiên, hồ sơ người dùng
+    # chỉ giữ các trường công khai (chính chủ nhận bản đầy đủ qua EventServer.op_changes)
+    def __init__(self, size=CHANGE_LOG_SIZE):
+        self.size = size
+        self.seq = 0
+        self.records = []
+        self.lock = threading.Lock()
+
+    def append(self, records):
+        with self.lock:
+            for rec in records:
+                if rec["op"] == "session": continue
+                if rec["op"] == "put_user": rec = dict(rec, user=public_user(rec["user"]))
+                rec = json.loads(json.dumps(rec, ensure_ascii=False, default=json_default))
+                self.records.append(rec)
+                self.seq += 1
+            if len(self.records) > 2 * self.size: del self.records[:-self.size]
+
+    def since(self, seq):
+        # None: máy khách tụt quá xa (hoặc máy chủ đã khởi động lại), phải nạp lại ảnh chụp
+        with self.lock:
+            first = self.seq - len(self.records)
+            if seq < first or seq > self.seq: return self.seq, None
+            return self.seq, self.records[seq - first:]
+
+def public_user(user, full=False):
+    # full: hồ sơ của chính người đang đăng nhập (trừ mật khẩu); người khác chỉ thấy id, tên đăng nhập, họ tên
+    if full: return {k: v for k, v in user.items() if k != "password"}
+    return {k: user[k] for k in PUBLIC_USER_FIELDS if k in user}
+
+class EventServer:
+    # Máy chủ asyncio giữ kho dữ liệu chung. Giao thức: mỗi dòng một JSON {"id", "op", "args", "token"}
+    # -> {"id", "ok", "result"} hoặc {"id", "error"}. Thao tác chạy trên pool luồng để vòng asyncio không bị chặn;
+    # các thao tác ghi được tuần tự hóa bởi khóa chung db.lock của DataManager (giữ rất ngắn, ghi đĩa chạy nền)
+    def __init__(self, manager, workers=SERVER_WORKERS):
+        self.db = manager
+        self.sessions = {}
+        self.resets = {} # email -> [mã, hạn, số lần nhập sai]
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="server")
+        self.ops = {
+            "snapshot": self.op_snapshot, "changes": self.op_changes, "login": self.op_login, "logout": self.op_logout,
+            "register_user": self.op_register_user, "request_reset": self.op_request_reset, "reset_password": self.op_reset_password,
+            "update_user": self.op_update_user, "delete_account": self.op_delete_account,
+            "add_event": self.op_add_event, "update_event": self.op_update_event,
+            "delete_event": self.op_delete_event, "toggle_participation": self.op_toggle_participation,
+        }
+
+    def require_user(self, user_id, admin=False):
+        user = self.db.get_user(user_id) if user_id else None
+        if not user: raise RemoteError("Chưa đăng nhập hoặc phiên đã hết hạn.")
+        if admin and user.get("role") != "admin": raise RemoteError("Chỉ quản trị viên được thực hiện thao tác này.")
+        return user
+
+    def op_snapshot(self, user_id, args):
+        me = self.require_user(user_id)
+        with self.db.lock:
+            data = {"users": [public_user(u, u is me) for u in self.db.data["users"]], "events": self.db.data["events"], "current_user": None}
+            return {"seq": self.db.change_log.seq, "data": json.loads(json.dumps(data, ensure_ascii=False, default=json_default))}
+
+    def op_changes(self, user_id, args):
+        self.require_user(user_id)
+        seq, records = self.db.change_log.since(int(args.get("since", 0)))
+        if records is None: return {"seq": seq, "reset": True}
+        if any(r["op"] == "put_user" and r["user"]["id"] == user_id for r in records):
+            # Hồ sơ của chính mình: thay bản công khai bằng bản đầy đủ hiện tại
+            with self.db.lock: me = public_user(self.db.get_user(user_id), full=True)
+            records = [dict(r, user=me) if r["op"] == "put_user" and r["user"]["id"] == user_id else r for r in records]
+        return {"seq": seq, "records": records}
+
+    def op_login(self, user_id, args):
+        with self.db.lock:
+            u = self.db.find_user(args.get("identifier", ""))
+            if not u or u["password"] != args.get("password"): raise RemoteError("Sai tên đăng nhập hoặc mật khẩu!")
+            token = secrets.token_hex(16)
+            self.sessions[token] = u["id"]
+            return {"token": token, "user": public_user(u, full=True)}
+
+    def op_logout(self, user_id, args):
+        self.sessions.pop(args.get("_token"), None)
+        return True
+
+    def op_register_user(self, user_id, args):
+        ok, message = self.db.register_user(dict(args["user"]))
+        return {"ok": ok, "message": message}
+
+    def op_request_reset(self, user_id, args):
+        # Mã xác nhận đi qua kênh ngoài (quản trị máy chủ đọc trên console rồi chuyển cho người dùng), không trả qua mạng;
+        # luôn trả True để không lộ email nào đã đăng ký
+        email = str(args.get("email", "")).lower()
+        with self.db.lock:
+            u = self.db.find_user_by_email(email)
+            if not u: return True
+            code = f"{secrets.randbelow(10 ** 6):06d}"
+            self.resets[email] = [code, time.time() + SERVER_RESET_TTL, 0]
+        print(f"reset {u['username']} <{email}>: {code} (hết hạn sau {SERVER_RESET_TTL // 60} phút)", flush=True)
+        return True
+
+    def op_reset_password(self, user_id, args):
+        email = str(args.get("email", "")).lower()
+        with self.db.lock:
+            entry = self.resets.get(email)
+            ok = bool(entry) and entry[1] >= time.time() and secrets.compare_digest(entry[0], str(args.get("code", "")))
+            if entry:
+                entry[2] += 1
+                if ok or entry[1] < time.time() or entry[2] >= SERVER_RESET_ATTEMPTS: del self.resets[email]
+        if not ok: raise RemoteError("Mã xác nhận không đúng hoặc đã hết hạn.")
+        return self.db.reset_password(email, args["password"])
+
+    def op_update_user(self, user_id, args):
+        self.require_user(user_id)
+        data = {k: v for k, v in args["data"].items() if k not in ("id", "role", "username")}
+        return self.db.update_user(data, user_id=user_id)
+
+    def op_delete_account(self, user_id, args):
+        self.require_user(user_id)
+        self.db.delete_account(user_id=user_id)
+        for token in [t for t, uid in self.sessions.items() if uid == user_id]: self.sessions.pop(token, None)
+        return True
+
+    def op_add_event(self, user_id, args):
+        self.require_user(user_id, admin=True)
+        event = dict(args["event"])
+        self.db.add_event(event)
+        return event["id"]
+
+    def op_update_event(self, user_id, args):
+        self.require_user(user_id, admin=True)
+        return self.db.update_event(args["event_id"], dict(args["event"]))
+
+    def op_delete_event(self, user_id, args):
+        self.require_user(user_id, admin=True)
+        self.db.delete_event(args["event_id"])
+        return True
+
+    def op_toggle_participation(self, user_id, args):
+        self.require_user(user_id)
+        status, count = self.db.toggle_participation(args["event_id"], user_id, bool(args.get("waitlist")))
+        return {"status": status, "count": count}
+
+    async def dispatch(self, req):
+        handler = self.ops.get(req.get("op"))
+        if handler is None: return {"id": req.get("id"), "error": f"Thao tác không hợp lệ: {req.get('op')}"}
+        args = dict(req.get("args") or {}, _token=req.get("token"))
+        user_id = self.sessions.get(req.get("token"))
+        try: result = await asyncio.get_running_loop().run_in_executor(self.executor, handler, user_id, args)
+        except RemoteError as e: return {"id": req.get("id"), "error": str(e)}
+        except Exception as e: return {"id": req.get("id"), "error": f"Yêu cầu không hợp lệ: {e!r}"}
+        return {"id": req.get("id"), "ok": True, "result": result}
+
+    async def handle(self, reader, writer):
         try:
-            s_date = self.event_data.get("start_date", self.event_data.get("date"))
-            e_date = self.event_data.get("end_date", s_date)
-            s_time = self.event_data.get("start_time", "00:00")
-            e_time = self.event_data.get("end_time", "23:59")
-            
-            fmt = "%d/%m/%Y %H:%M"
+            while True:
+                line = await reader.readline()
+                if not line: break
+                try: req = json.loads(line)
+                except ValueError: req = None
+                resp = await self.dispatch(req) if isinstance(req, dict) else {"id": None, "error": "JSON không hợp lệ"}
+                writer.write(json.dumps(resp, ensure_ascii=False, default=json_default).encode("utf-8") + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.LimitOverrunError, asyncio.IncompleteReadError): pass
+        finally: writer.close()
+
+    async def serve(self, host="127.0.0.1", port=SERVER_PORT):
+        server = await asyncio.start_server(self.handle, host, port, limit=SERVER_LINE_LIMIT)
+        host, port = server.sockets[0].getsockname()[:2]
+        print(f"listening {host}:{port}", flush=True)
+        # SIGTERM dừng êm như Ctrl+C để dữ liệu đang chờ được ghi xuống đĩa
+        stop = asyncio.Event()
+        try: asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+        except (NotImplementedError, RuntimeError): pass
+        async with server: await stop.wait()
+
+class RemoteClient:
+    # Kết nối đồng bộ tới EventServer; chỉ tự kết nối lại và gửi lại với các thao tác đọc (gửi lại thao tác ghi có thể bị lặp)
+    RETRY_OPS = ("snapshot", "changes", "login")
+
+    def __init__(self, address, timeout=10):
+        host, _, port = address.rpartition(":")
+        self.address = (host or "127.0.0.1", int(port or SERVER_PORT))
+        self.timeout = timeout
+        self.token = None
+        self.sock = None
+        self.stream = None
+        self.next_id = 0
+        self.lock = threading.Lock()
+
+    def connect(self):
+        self.sock = socket.create_connection(self.address, self.timeout)
+        self.stream = self.sock.makefile("rwb")
+
+    def close(self):
+        if self.sock:
             try:
-                start_dt = datetime.strptime(f"{s_date} {s_time}", fmt)
-                end_dt = datetime.strptime(f"{e_date} {e_time}", fmt)
-            except:
-                self.setText(""); return
-
-            now = datetime.now()
-            if now < start_dt:
-                delta = start_dt - now
-                self.setStyleSheet("color: #E64A19; font-weight: bold; font-size: 12px; margin-top: 5px;")
-                self.setText(f"🕒 Bắt đầu sau {self.format_delta(delta)}")
-            elif start_dt <= now <= end_dt:
-                delta = end_dt - now
-                self.setStyleSheet("color: #388E3C; font-weight: bold; font-size: 12px; margin-top: 5px;")
-                self.setText(f"⏳ Kết thúc sau {self.format_delta(delta)}")
-            else:
-                self.timer.stop()
-                self.setStyleSheet("color: #757575; font-style: italic; font-size: 12px; margin-top: 5px;")
-                self.setText("🏁 Đã kết thúc")
-        except: self.setText("")
-
-    def format_delta(self, delta):
-        total = int(delta.total_seconds())
-        d = total // 86400
-        h = (total % 86400) // 3600
-        m = (total % 3600) // 60
-        s = total % 60
-        if d > 0: return f"{d} ngày {h:02}:{m:02}:{s:02}"
-        elif h > 0: return f"{h:02}:{m:02}:{s:02}"
-        else: return f"{m:02}:{s:02}"
+                self.stream.close()
+                self.sock.close()
+            except OSError: pass
+        self.sock = self.stream = None
+
+    def call(self, op, **args):
+        with self.lock:
+            for attempt in range(2 if op in self.RETRY_OPS else 1):
+                try:
+                    if self.stream is None: self.connect()
+                    self.next_id += 1
+                    req = {"id": self.next_id, "op": op, "args": args, "token": self.token}
+                    self.stream.write(json.dumps(req, ensure_ascii=False, default=json_default).encode("utf-8") + b"\n")
+                    self.stream.flush()
+                    line = self.stream.readline()
+                    if not line: raise ConnectionError("Máy chủ đã đóng kết nối")
+                    break
+                except OSError:
+                    self.close()
+                    if attempt or op not in self.RETRY_OPS: raise
+        resp = json.loads(line)
+        if "error" in resp: raise RemoteError(resp["error"])
+        return resp["result"]
+
+class RemoteStore:
+    # Kho của chế độ máy khách: chỉ nạp ảnh chụp từ máy chủ, không ghi gì xuống đĩa
+    def __init__(self, client):
+        self.client = client
+        self.seq = 0
+
+    def load(self):
+        # Ảnh chụp cần phiên đăng nhập: trước khi đăng nhập máy khách chưa có dữ liệu nào
+        if not self.client.token: return None
+        res = self.client.call("snapshot")
+        self.seq = res["seq"]
+        return res["data"]
+
+    def save(self, data): pass
+    def prepare(self, data, records): return None
+    def write(self, payload): pass
+    def maintain(self): pass
+
+class RemoteDataManager(DataManager):
+    # Chế độ máy khách: đọc trên bản sao cục bộ (chỉ mục, tìm kiếm như thường), thao tác ghi gửi lên máy chủ
+    # rồi áp lại từ nhật ký thay đổi qua sync() nên các màn hình nhận thông báo như khi chạy cục bộ
+    def __init__(self, address, load=True):
+        self.client = RemoteClient(address)
+        super().__init__(RemoteStore(self.client), load)
+
+    def commit(self, *records): pass
+
+    def login(self, identifier, password):
+        try: res = self.client.call("login", identifier=identifier, password=password)
+        except RemoteError: return False, None
+        self.client.token = res["token"]
+        self.reload()
+        with self.lock:
+            self.data["current_user"] = self._users_by_id.get(res["user"]["id"])
+            return True, self.data["current_user"]
+
+    def logout(self):
+        try: self.client.call("logout")
+        except (RemoteError, OSError): pass
+        self.client.token = None
+        self.clear()
+
+    def register_user(self, user_data):
+        res = self.client.call("register_user", user=user_data)
+        self.sync()
+        return res["ok"], res["message"]
+
+    def request_reset(self, email):
+        return self.client.call("request_reset", email=email)
+
+    def reset_password(self, email, password, code=""):
+        try: return self.client.call("reset_password", email=email, password=password, code=code)
+        except RemoteError: return False
+
+    def update_user(self, updated_data, user_id=None):
+        ok = self.client.call("update_user", data=updated_data)
+        self.sync()
+        return ok
+
+    def delete_account(self, user_id=None):
+        self.client.call("delete_account")
+        self.client.token = None
+        self.clear()
+
+    def add_event(self, event_data):
+        self.client.call("add_event", event=event_data)
+        self.sync()
+
+    def update_event(self, event_id, new_data):
+        ok = self.client.call("update_event", event_id=event_id, event=new_data)
+        self.sync()
+        return ok
+
+    def delete_event(self, event_id):
+        self.client.call("delete_event", event_id=event_id)
+        self.sync()
+
+    def toggle_participation(self, event_id, user_id, waitlist=False):
+        res = self.client.call("toggle_participation", event_id=event_id, waitlist=waitlist)
+        self.sync()
+        return res["status"], res["count"]
+
+    def bulk_import(self, users=(), events=()):
+        raise RemoteError("Nhập hàng loạt chỉ chạy trên máy chủ.")
+
+    def clear(self):
+        # Đăng xuất: bỏ bản sao dữ liệu đã nhận theo phiên vừa kết thúc; lần đăng nhập sau reload() sẽ báo data_reloaded
+        with self.lock:
+            self.data = empty_data()
+            self.build_indexes()
+            self.store.seq = 0
+
+    def sync(self):
+        if not self.client.token: return
+        res = self.client.call("changes", since=self.store.seq)
+        if res.get("reset"): return self.reload()
+        with self.lock:
+            for rec in res["records"]: self.apply_record(rec)
+            self.store.seq = res["seq"]
+
+def create_data_manager():
+    if SERVER_ADDRESS: return RemoteDataManager(SERVER_ADDRESS, load=False)
+    return DataManager(load=False)
+
+db = create_data_manager() # GUI nạp nền qua load_async(), CLI gọi load_data()
+db.subscribe(avatars.on_data_changed)
+db.subscribe(thumbnails.on_data_changed)
+search_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search")
+
+class CountdownTicker(QObject):
+    event_ended = Signal(str)
+
+    def __init__(self):
+        super().__init__()
+        self.clients = set()
+        self.last_check = time.time()
+        self.timer = QTimer(self)
+        self.timer.setInterval(1000)
+        self.timer.timeout.connect(self.tick)
+        self.timer.start()
+
+    def register(self, widget): self.clients.add(widget)
+    def unregister(self, widget): self.clients.discard(widget)
+
+    def watch_window(self, window):
+        window.installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if event.type() in (QEvent.Show, QEvent.Hide, QEvent.WindowStateChange):
+            if obj.isVisible() and not obj.isMinimized():
+                if not self.timer.isActive():
+                    self.timer.start()
+                    self.tick()
+            else: self.timer.stop()
+        return False
+
+    def tick(self):
+        now = time.time()
+        for event_id in db.events_ended_between(self.last_check, now): self.event_ended.emit(event_id)
+        self.last_check = now
+        for widget in list(self.clients):
+            if not isValid(widget): self.clients.discard(widget)
+            elif widget.isVisible() and not widget.visibleRegion().isEmpty(): widget.update_time(now)
+
+_countdown_ticker = None
+def countdown_ticker():
+    global _countdown_ticker
+    if _countdown_ticker is None: _countdown_ticker = CountdownTicker()
+    return _countdown_ticker
+
+def format_delta(seconds):
+    total = int(seconds)
+    d = total // 86400
+    h = (total % 86400) // 3600
+    m = (total % 3600) // 60
+    s = total % 60
+    if d > 0: return f"{d} ngày {h:02}:{m:02}:{s:02}"
+    elif h > 0: return f"{h:02}:{m:02}:{s:02}"
+    else: return f"{m:02}:{s:02}"
+
+def countdown_status(event_id, now):
+    times = db.time_index.times(event_id)
+    if not times: return None, ""
+    start_ts, end_ts = times
+    if now < start_ts: return "upcoming", f"🕒 Bắt đầu sau {format_delta(start_ts - now)}"
+    if now <= end_ts: return "running", f"⏳ Kết thúc sau {format_delta(end_ts - now)}"
+    return "ended", "🏁 Đã kết thúc"
+
+CARD_WIDTH, CARD_HEIGHT = 230, 310
+POSTER_WIDTH, POSTER_HEIGHT = 208, 140
+
+def event_time_text(event):
+    s_date = event.get("start_date", event.get("date"))
+    e_date = event.get("end_date", s_date)
+    start = f"{event.get('start_time', '00:00')} {s_date}"
+    return f"{start} - {event.get('end_time', '23:59')}" + (f" {e_date}" if e_date != s_date else "")
+
+def make_font(pixel_size, bold=False, italic=False):
+    font = QFont("Segoe UI")
+    font.setPixelSize(pixel_size)
+    font.setBold(bold)
+    font.setItalic(italic)
+    return font
+
+class EventListModel(QAbstractListModel):
+    # Giữ toàn bộ danh sách nhưng chỉ lộ ra view `loaded` dòng đầu, mỗi lần nạp thêm một trang
+    EventRole = Qt.UserRole + 1
+    total_changed = Signal(int)
+
+    def __init__(self, events, page_size=None, parent=None):
+        super().__init__(parent)
+        self.events = list(events)
+        self.page_size = page_size
+        self.loaded = len(self.events) if page_size is None else min(page_size, len(self.events))
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.loaded
+
+    def total(self):
+        return len(self.events)
+
+    def has_more(self):
+        return self.loaded < len(self.events)
+
+    def load_more(self):
+        # Không dùng canFetchMore/fetchMore: lưới có chiều cao cố định nên view luôn thấy dòng cuối và sẽ tự nạp hết
+        if not self.has_more(): return
+        count = min(self.page_size or len(self.events), len(self.events) - self.loaded)
+        self.beginInsertRows(QModelIndex(), self.loaded, self.loaded + count - 1)
+        self.loaded += count
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid(): return None
+        event = self.events[index.row()]
+        if role == Qt.DisplayRole: return event["title"]
+        if role == self.EventRole: return event
+        return None
+
+    def set_events(self, events):
+        self.beginResetModel()
+        self.events = list(events)
+        self.loaded = len(self.events) if self.page_size is None else min(self.page_size, len(self.events))
+        self.endResetModel()
+        self.total_changed.emit(len(self.events))
+
+    def row_of(self, event_id):
+        return next((i for i, e in enumerate(self.events) if e["id"] == event_id), -1)
+
+    def insert_event(self, row, event):
+        if row > self.loaded or (row == self.loaded and self.has_more()):
+            self.events.insert(row, event) # Rơi vào phần chưa nạp, sẽ hiện khi cuộn tới
+        else:
+            self.beginInsertRows(QModelIndex(), row, row)
+            self.events.insert(row, event)
+            self.loaded += 1
+            self.endInsertRows()
+        self.total_changed.emit(len(self.events))
+
+    def refresh_event(self, event_id):
+        row = self.row_of(event_id)
+        if 0 <= row < self.loaded: self.dataChanged.emit(self.index(row), self.index(row))
+
+    def remove_event(self, event_id):
+        row = self.row_of(event_id)
+        if row < 0: return None
+        if row < self.loaded:
+            self.beginRemoveRows(QModelIndex(), row, row)
+            event = self.events.pop(row)
+            self.loaded -= 1
+            self.endRemoveRows()
+        else:
+            event = self.events.pop(row)
+        self.total_changed.emit(len(self.events))
+        return event
+
+class EventCardDelegate(QStyledItemDelegate):
+    # Vẽ thẻ sự kiện trực tiếp thay vì tạo QFrame/QLabel cho từng sự kiện
+    COUNTDOWN_STYLES = {
+        "upcoming": (QColor("#E64A19"), make_font(12, bold=True)),
+        "running": (QColor("#388E3C"), make_font(12, bold=True)),
+        "ended": (QColor("#757575"), make_font(12, italic=True)),
+    }
+    TITLE_FONT = make_font(15, bold=True)
+    DATE_FONT = make_font(12)
+    JOINED_FONT = make_font(12, bold=True)
+
+    def __init__(self, show_joined=False, parent=None):
+        super().__init__(parent)
+        self.show_joined = show_joined
+
+    def sizeHint(self, option, index):
+        return QSize(CARD_WIDTH, CARD_HEIGHT)
+
+    @tracer.traced("card_paint", cat="ui")
+    def paint(self, painter, option, index):
+        event = index.data(EventListModel.EventRole)
+        if event is None: return
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        card = QRect(option.rect.x(), option.rect.y(), CARD_WIDTH, CARD_HEIGHT)
+        hover = bool(option.state & QStyle.State_MouseOver)
+        painter.setPen(QPen(QColor(THEME_COLOR if hover else "#E0E0E0"), 1))
+        painter.setBrush(QColor("#FFFDFD" if hover else CARD_BG))
+        painter.drawRoundedRect(QRectF(card).adjusted(0.5, 0.5, -0.5, -0.5), 10, 10)
+
+        x, y, w = card.x() + 11, card.y() + 11, POSTER_WIDTH
+        poster_rect = QRect(x, y, w, POSTER_HEIGHT)
+        clip = QPainterPath()
+        clip.addRoundedRect(QRectF(poster_rect), 6, 6)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(QColor("#eee"))
+        painter.drawPath(clip)
+        pix = image_loader().pixmap(event.get("poster", ""), POSTER_WIDTH, POSTER_HEIGHT, owner=getattr(option.widget, "image_owner", None))
+        if pix is None:
+            painter.setPen(QColor("#999"))
+            painter.setFont(self.DATE_FONT)
+            painter.drawText(poster_rect, Qt.AlignCenter, "Đang tải ảnh...")
+        elif not pix.isNull():
+            painter.save()
+            painter.setClipPath(clip)
+            painter.drawPixmap(poster_rect.center().x() - pix.width() // 2, poster_rect.center().y() - pix.height() // 2, pix)
+            painter.restore()
+        y += POSTER_HEIGHT + 5
+
+        painter.setPen(QColor("#333"))
+        painter.setFont(self.TITLE_FONT)
+        title_rect = QFontMetrics(self.TITLE_FONT).boundingRect(QRect(x, y, w, 60), Qt.TextWordWrap, event["title"])
+        title_rect.setHeight(min(title_rect.height(), 60))
+        painter.drawText(QRect(x, y, w, title_rect.height()), Qt.AlignLeft | Qt.AlignTop | Qt.TextWordWrap, event["title"])
+        y += title_rect.height() + 5
+
+        s_date = event.get("start_date", event.get("date"))
+        date_str = s_date + (f" - {event.get('end_date')}" if event.get('end_date') and event.get('end_date') != s_date else "")
+        y = self.draw_line(painter, x, y, w, f"📅 {date_str}", QColor("#666"), self.DATE_FONT)
+
+        if self.show_joined and db.data["current_user"]["id"] in event["participants"]:
+            y = self.draw_line(painter, x, y, w, "✅ Đã tham gia", QColor("#388E3C"), self.JOINED_FONT)
+
+        state, text = countdown_status(event["id"], time.time())
+        if state:
+            color, font = self.COUNTDOWN_STYLES[state]
+            self.draw_line(painter, x, y + 5, w, text, color, font)
+        painter.restore()
+
+    def draw_line(self, painter, x, y, w, text, color, font):
+        height = QFontMetrics(font).height()
+        painter.setPen(color)
+        painter.setFont(font)
+        painter.drawText(QRect(x, y, w, height), Qt.AlignLeft | Qt.AlignVCenter, text)
+        return y + height + 5
+
+class EventGridView(QListView):
+    # Chỉ vẽ các thẻ đang nằm trong vùng nhìn thấy; chiều cao được đặt theo số hàng để cuộn bằng thanh cuộn của màn hình
+    def __init__(self, model, delegate, spacing, parent=None):
+        super().__init__(parent)
+        self.setModel(model)
+        self.setItemDelegate(delegate)
+        self.setViewMode(QListView.IconMode)
+        self.setFlow(QListView.LeftToRight)
+        self.setWrapping(True)
+        self.setResizeMode(QListView.Adjust)
+        self.setMovement(QListView.Static)
+        self.setUniformItemSizes(True)
+        self.setGridSize(QSize(CARD_WIDTH + spacing, CARD_HEIGHT + spacing))
+        self.setSelectionMode(QAbstractItemView.NoSelection)
+        self.setFocusPolicy(Qt.NoFocus)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setFrameShape(QFrame.NoFrame)
+        self.setMouseTracking(True)
+        self.setStyleSheet("QListView { background-color: transparent; }")
+        self.viewport().setCursor(Qt.PointingHandCursor)
+        for signal in (model.rowsInserted, model.rowsRemoved, model.modelReset): signal.connect(self.update_height)
+        countdown_ticker().register(self)
+        # Thẻ bị huỷ khi tải lại danh sách thì các yêu cầu giải mã ảnh chưa chạy của nó cũng bị huỷ theo
+        self.image_owner = owner = object()
+        loader = image_loader()
+        loader.image_ready.connect(self.on_image_ready)
+        self.destroyed.connect(lambda *_: loader.cancel(owner))
+        self.update_height()
+
+    def columns(self):
+        return max(1, self.viewport().width() // self.gridSize().width())
+
+    def update_height(self):
+        rows = -(-self.model().rowCount() // self.columns())
+        self.setFixedHeight(rows * self.gridSize().height())
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.update_height()
+
+    def wheelEvent(self, event):
+        event.ignore()
+
+    def update_time(self, now):
+        self.viewport().update()
+
+    def on_image_ready(self, key):
+        self.viewport().update()
 
 class StyledInput(QLineEdit):
     def __init__(self, placeholder, is_password=False):
@@ -408,6 +2837,299 @@ class BaseScreen(QWidget):
         self.layout.setContentsMargins(0, 0, 0, 0)
         self.layout.setAlignment(Qt.AlignTop)
 
+class EventListScreen(BaseScreen):
+    SHOW_JOINED = False
+    GRID_SPACING = 20
+    SECTION_SPACING = 20
+    PAGE_SIZE = EVENT_PAGE_SIZE
+    EMPTY_TEXT = {True: "Hiện chưa có sự kiện nào.", False: "Không có sự kiện cũ."}
+
+    def __init__(self, nav_callback):
+        super().__init__(nav_callback)
+        self.sections_key = None
+        self.sections_valid_until = 0
+        self.sections_cache = ([], [])
+        self.section_views = {}
+        self.built_for = None
+        self.expired_expanded = False
+        self.scroll_watched = False
+        self.search_text = ""
+        self.search_section = None
+        self.tag_filter = set()
+        self.tag_mode = "and"
+        self.facet_layout = None
+        self.search_future = None
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.run_search)
+        self.search_poll = QTimer(self)
+        self.search_poll.setInterval(20)
+        self.search_poll.timeout.connect(self.poll_search)
+        db.subscribe(self.on_data_changed)
+
+    def show_content(self):
+        # Chỉ dựng lại toàn bộ ở lần hiển thị đầu hoặc khi đổi tài khoản; còn lại được vá qua on_data_changed
+        user = db.data.get("current_user")
+        if not user or user["id"] != self.built_for or not self.section_views: self.load_content()
+        QTimer.singleShot(0, self.check_scroll_end)
+
+    def reload(self):
+        self.load_content()
+
+    def event_sections(self):
+        now = time.time()
+        if self.sections_key != db.time_index.version or now > self.sections_valid_until:
+            ongoing, expired = db.time_index.partition(now)
+            self.sections_cache = ([db.get_event(i) for i in ongoing], [db.get_event(i) for i in expired])
+            self.sections_key = db.time_index.version
+            # Kết quả còn đúng cho tới khi sự kiện đang diễn ra kết thúc sớm nhất hết giờ
+            self.sections_valid_until = db.time_index.times(ongoing[0])[1] if ongoing else float("inf")
+        return self.sections_cache
+
+    def invalidate_sections(self):
+        self.sections_key = None
+
+    def render_search_box(self):
+        # Ô tìm kiếm + vùng kết quả; các mục sự kiện được đặt trong sections_widget để ẩn đi khi đang tìm
+        self.watch_scroll()
+        search_input = QLineEdit(self.search_text)
+        search_input.setPlaceholderText("🔍 Tìm sự kiện theo tên, mô tả, địa điểm, phân loại...")
+        search_input.setClearButtonEnabled(True)
+        search_input.textChanged.connect(self.on_search_text)
+        self.content_layout.addWidget(search_input)
+
+        self.results_widget = QWidget()
+        results_layout = QVBoxLayout(self.results_widget)
+        results_layout.setContentsMargins(0, 0, 0, 0)
+        header = QLabel()
+        header.setProperty("class", "header")
+        lbl_empty = QLabel("Không tìm thấy sự kiện phù hợp.")
+        lbl_empty.setStyleSheet("color: #777; font-style: italic; margin-left: 20px;")
+        model = EventListModel([], self.PAGE_SIZE)
+        view = EventGridView(model, EventCardDelegate(self.SHOW_JOINED), self.GRID_SPACING)
+        view.clicked.connect(lambda index: self.open_event(index.data(EventListModel.EventRole)))
+        self.search_section = {"title": "🔎 Kết Quả Tìm Kiếm", "collapsible": False, "header": header, "model": model, "view": view, "empty": lbl_empty}
+        model.total_changed.connect(lambda total: self.update_section_header(self.search_section))
+        for widget in (header, lbl_empty, view): results_layout.addWidget(widget)
+        self.results_widget.setVisible(False)
+        self.content_layout.addWidget(self.results_widget)
+
+        self.sections_widget = QWidget()
+        self.sections_layout = QVBoxLayout(self.sections_widget)
+        self.sections_layout.setContentsMargins(0, 0, 0, 0)
+        self.content_layout.addWidget(self.sections_widget)
+        if self.search_text.strip(): self.run_search()
+
+    def render_facet_bar(self):
+        # Các nút lọc theo phân loại kèm số sự kiện; nút được dựng lại mỗi khi bộ lọc hoặc dữ liệu đổi
+        bar = QWidget()
+        self.facet_layout = QHBoxLayout(bar)
+        self.facet_layout.setContentsMargins(0, 0, 0, 0)
+        self.facet_layout.setSpacing(8)
+        scroll = QScrollArea()
+        scroll.setWidget(bar)
+        scroll.setWidgetResizable(True)
+        scroll.setFixedHeight(44)
+        scroll.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.content_layout.insertWidget(self.content_layout.indexOf(self.results_widget), scroll) # Ngay dưới ô tìm kiếm
+        self.update_facets()
+
+    def update_facets(self):
+        if self.facet_layout is None or not isValid(self.facet_layout): return
+        while self.facet_layout.count():
+            item = self.facet_layout.takeAt(0)
+            if item.widget():
+                item.widget().hide()
+                item.widget().deleteLater()
+        self.tag_filter &= set(db.tags.labels)
+        # AND: số đếm là số sự kiện còn lại nếu chọn thêm nhãn đó; OR: số sự kiện của từng nhãn
+        scope = db.tags.match(self.tag_filter, "and") if self.tag_mode == "and" and self.tag_filter else None
+        counts = db.tags.counts(scope)
+        shown = sorted(counts, key=lambda k: (-counts[k], db.tags.labels[k]))[:FACET_LIMIT]
+        shown += [k for k in self.tag_filter if k not in shown]
+        if not shown: return
+        combo = QComboBox()
+        combo.addItem("Có tất cả nhãn (AND)", "and")
+        combo.addItem("Có ít nhất một nhãn (OR)", "or")
+        combo.setCurrentIndex(0 if self.tag_mode == "and" else 1)
+        combo.currentIndexChanged.connect(lambda i, c=combo: self.set_tag_mode(c.itemData(i)))
+        self.facet_layout.addWidget(combo)
+        for key in shown:
+            btn = QPushButton(f"{db.tags.labels[key]} ({counts.get(key, 0)})")
+            btn.setCheckable(True)
+            btn.setChecked(key in self.tag_filter)
+            btn.setCursor(Qt.PointingHandCursor)
+            btn.setProperty("class", "chip")
+            btn.clicked.connect(lambda checked, k=key: self.toggle_tag(k))
+            self.facet_layout.addWidget(btn)
+        self.facet_layout.addStretch()
+
+    def toggle_tag(self, key):
+        self.tag_filter ^= {key}
+        self.apply_filters()
+
+    def set_tag_mode(self, mode):
+        self.tag_mode = mode
+        if self.tag_filter: self.apply_filters()
+        else: self.update_facets()
+
+    def allowed_ids(self):
+        return db.tags.match(self.tag_filter, self.tag_mode) if self.tag_filter else None
+
+    def filter_events(self, events):
+        allowed = self.allowed_ids()
+        return events if allowed is None else [e for e in events if e["id"] in allowed]
+
+    def apply_filters(self):
+        # Chỉ nạp lại dữ liệu cho các model; widget giữ nguyên
+        if not self.sections_alive(): return
+        ongoing, expired = self.event_sections()
+        self.section_views[True]["model"].set_events(self.filter_events(ongoing))
+        self.section_views[False]["model"].set_events(self.filter_events(expired))
+        if self.search_text.strip(): self.run_search()
+        self.update_facets()
+
+    def on_search_text(self, text):
+        self.search_text = text
+        self.search_timer.start()
+
+    def run_search(self):
+        if not self.search_section or not isValid(self.search_section["view"]): return
+        text = self.search_text.strip()
+        if not text:
+            self.search_future = None
+            self.results_widget.setVisible(False)
+            self.sections_widget.setVisible(True)
+            return
+        # Kết quả của truy vấn cũ hơn sẽ bị bỏ qua vì search_future đã trỏ sang truy vấn mới
+        self.search_future = search_executor.submit(db.search_events, text)
+        self.search_poll.start()
+
+    def poll_search(self):
+        future = self.search_future
+        if future is None: self.search_poll.stop(); return
+        if not future.done(): return
+        self.search_poll.stop()
+        self.search_future = None
+        if not isValid(self.search_section["view"]): return
+        events = self.filter_events([e for e in map(db.get_event, future.result()) if e])
+        self.search_section["model"].set_events(events)
+        self.sections_widget.setVisible(False)
+        self.results_widget.setVisible(True)
+
+    @tracer.traced("render_event_section", cat="ui", arg=1)
+    def render_event_section(self, title, icon, is_ongoing):
+        # Mục hết hạn mặc định thu gọn: chỉ dựng model (để đếm và vá dữ liệu), view được tạo khi mở ra lần đầu
+        self.watch_scroll()
+        if is_ongoing:
+            header = QLabel()
+        else:
+            header = QPushButton()
+            header.setCursor(Qt.PointingHandCursor)
+            header.clicked.connect(self.toggle_expired)
+        header.setProperty("class", "header")
+        self.sections_layout.addWidget(header)
+        ongoing, expired = self.event_sections()
+        filtered = self.filter_events(ongoing if is_ongoing else expired)
+
+        lbl_empty = QLabel(self.EMPTY_TEXT[is_ongoing])
+        lbl_empty.setStyleSheet("color: #777; font-style: italic; margin-left: 20px;")
+        lbl_empty.setVisible(not filtered)
+        self.sections_layout.addWidget(lbl_empty)
+
+        holder = QVBoxLayout()
+        self.sections_layout.addLayout(holder)
+        model = EventListModel(filtered, self.PAGE_SIZE)
+        section = {"title": f"{icon} {title}", "collapsible": not is_ongoing, "header": header, "model": model, "view": None, "holder": holder, "empty": lbl_empty}
+        model.total_changed.connect(lambda total, s=section: self.update_section_header(s))
+        self.section_views[is_ongoing] = section
+        if is_ongoing or self.expired_expanded: self.build_section_view(section)
+        self.update_section_header(section)
+        self.sections_layout.addSpacing(self.SECTION_SPACING)
+
+    @tracer.traced("build_section_view", cat="ui")
+    def build_section_view(self, section):
+        view = EventGridView(section["model"], EventCardDelegate(self.SHOW_JOINED), self.GRID_SPACING)
+        view.clicked.connect(lambda index: self.open_event(index.data(EventListModel.EventRole)))
+        section["view"] = view
+        section["holder"].addWidget(view)
+
+    def update_section_header(self, section):
+        total = section["model"].total()
+        text = f"{section['title']} ({total})"
+        if section["collapsible"]: text = ("▼ " if self.expired_expanded else "▶ ") + text
+        section["header"].setText(text)
+        section["empty"].setVisible(not total)
+
+    def toggle_expired(self):
+        section = self.section_views[False]
+        self.expired_expanded = not self.expired_expanded
+        if section["view"] is None: self.build_section_view(section)
+        else: section["view"].setVisible(self.expired_expanded)
+        self.update_section_header(section)
+
+    def watch_scroll(self):
+        if self.scroll_watched: return
+        self.scroll_watched = True
+        bar = self.scroll.verticalScrollBar()
+        bar.valueChanged.connect(self.check_scroll_end)
+        bar.rangeChanged.connect(self.check_scroll_end)
+
+    def check_scroll_end(self, *args):
+        # Nạp trang tiếp theo khi còn cách đáy chưa tới một hàng thẻ; nạp xong, rangeChanged sẽ gọi lại nếu vẫn chưa lấp đầy
+        if not self.isVisible() or not self.sections_alive(): return
+        bar = self.scroll.verticalScrollBar()
+        if bar.value() < bar.maximum() - CARD_HEIGHT: return
+        searching = not self.results_widget.isHidden()
+        for section in [self.search_section] if searching else [self.section_views.get(True), self.section_views.get(False)]:
+            if not section or section["view"] is None or section["view"].isHidden(): continue
+            if section["model"].has_more():
+                section["model"].load_more()
+                return
+
+    def sections_alive(self):
+        return True in self.section_views and isValid(self.section_views[True]["view"])
+
+    def on_event_ended(self, event_id):
+        if not self.sections_alive(): return
+        event = self.section_views[True]["model"].remove_event(event_id)
+        if event: self.section_views[False]["model"].insert_event(0, event)
+
+    def on_data_changed(self, change, payload):
+        if change == "data_reloaded":
+            self.built_for = None
+            if self.isVisible(): self.show_content()
+            return
+        if not self.sections_alive(): return
+        if change in ("event_updated", "event_deleted"):
+            event_id = payload["event"]["id"] if change == "event_updated" else payload["event_id"]
+            for view in self.section_views.values(): view["model"].remove_event(event_id)
+        if change in ("event_added", "event_updated"): self.place_event(payload["event"])
+        elif change == "participation_changed":
+            for view in self.section_views.values(): view["model"].refresh_event(payload["event_id"])
+            self.search_section["model"].refresh_event(payload["event_id"])
+        if change != "participation_changed":
+            if self.search_text.strip(): self.search_timer.start()
+            self.update_facets()
+
+    def place_event(self, event):
+        times = db.time_index.times(event["id"])
+        if not times: return
+        allowed = self.allowed_ids()
+        if allowed is not None and event["id"] not in allowed: return
+        is_ongoing = times[1] >= time.time()
+        # Giữ đúng thứ tự của partition(): đang diễn ra tăng dần theo giờ kết thúc, hết hạn giảm dần
+        sign = 1 if is_ongoing else -1
+        model = self.section_views[is_ongoing]["model"]
+        # Tìm nhị phân tự viết vì bisect_right(..., key=) chỉ có từ Python 3.10
+        lo, hi = 0, len(model.events)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if sign * times[1] < sign * db.time_index.times(model.events[mid]["id"])[1]: hi = mid
+            else: lo = mid + 1
+        model.insert_event(lo, event)
+
 class AuthScreen(BaseScreen):
     def __init__(self, nav_callback, title_text):
         super().__init__(nav_callback)
@@ -566,9 +3288,27 @@ class ForgotPasswordScreen(AuthScreen):
         btn_submit.setProperty("class", "primary")
         btn_submit.clicked.connect(self.do_reset)
         self.content_layout.addWidget(self.txt_email)
+        # Qua máy chủ chung phải có mã xác nhận do quản trị máy chủ cung cấp
+        self.txt_code = None
+        if isinstance(db, RemoteDataManager):
+            self.txt_code = StyledInput("Mã xác nhận")
+            btn_code = QPushButton("Gửi Yêu Cầu Mã Xác Nhận")
+            btn_code.setProperty("class", "secondary")
+            btn_code.clicked.connect(self.request_code)
+            self.content_layout.addWidget(btn_code)
+            self.content_layout.addWidget(self.txt_code)
         self.content_layout.addWidget(self.txt_new_pass)
         self.content_layout.addWidget(self.txt_confirm)
         self.content_layout.addWidget(btn_submit)
+    def request_code(self):
+        email = self.txt_email.text().strip()
+        if not is_valid_email(email):
+            QMessageBox.warning(self, "Lỗi", "Email không hợp lệ")
+            return
+        db.request_reset(email)
+        QMessageBox.information(self, "Đã gửi yêu cầu", "Liên hệ quản trị máy chủ để nhận mã xác nhận (hiệu lực "
+                                f"{SERVER_RESET_TTL // 60} phút).")
+
     def do_reset(self):
         email = self.txt_email.text().strip()
         pwd = self.txt_new_pass.text()
@@ -579,20 +3319,15 @@ class ForgotPasswordScreen(AuthScreen):
         if pwd != confirm:
             QMessageBox.warning(self, "Lỗi", "Mật khẩu không khớp")
             return
-        found = False
-        for user in db.data["users"]:
-            if user["email"] == email:
-                user["password"] = pwd
-                db.save_data()
-                found = True
-                break
-        if found:
+        ok = db.reset_password(email, pwd, self.txt_code.text().strip()) if self.txt_code else db.reset_password(email, pwd)
+        if ok:
             QMessageBox.information(self, "Thành công", "Đổi mật khẩu thành công.")
             self.nav("login")
         else:
-            QMessageBox.warning(self, "Lỗi", "Email không tồn tại.")
+            QMessageBox.warning(self, "Lỗi", "Email hoặc mã xác nhận không đúng." if self.txt_code else "Email không tồn tại.")
 
 class EventDetailDialog(QDialog):
+    @tracer.traced("EventDetailDialog", cat="ui")
     def __init__(self, event, user, parent=None):
         super().__init__(parent)
         self.event_data = event # FIX TÊN BIẾN
@@ -600,8 +3335,22 @@ class EventDetailDialog(QDialog):
         self.setWindowTitle(event["title"])
         self.setMinimumSize(600, 700)
         self.setStyleSheet(STYLESHEET + """ QScrollArea { background-color: transparent; } """)
+        self.poster_key = ImageLoader.key(event.get("poster", ""), 500, 280, "fit")
+        self.image_owner = owner = object()
+        loader = image_loader()
+        loader.image_ready.connect(self.on_image_ready)
+        self.finished.connect(lambda *_: loader.cancel(owner))
         self.setup_ui()
 
+    def show_poster(self):
+        pix = image_loader().pixmap(self.event_data.get("poster", ""), 500, 280, "fit", owner=self.image_owner)
+        if pix is None: self.lbl_poster.setText("Đang tải ảnh...")
+        elif not pix.isNull(): self.lbl_poster.setPixmap(pix)
+        else: self.lbl_poster.setText("")
+
+    def on_image_ready(self, key):
+        if key == self.poster_key and isValid(self.lbl_poster): self.show_poster()
+
     def setup_ui(self):
         layout = QVBoxLayout(self)
         scroll = QScrollArea()
@@ -616,11 +3365,8 @@ class EventDetailDialog(QDialog):
         lbl_poster.setFixedSize(500, 280)
         lbl_poster.setStyleSheet("background-color: #ddd; border: 1px solid #ccc; border-radius: 8px;")
         lbl_poster.setAlignment(Qt.AlignCenter)
-        if os.path.exists(self.event_data.get("poster", "")):
-            pix = QPixmap(self.event_data["poster"]).scaled(500, 280, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-            lbl_poster.setPixmap(pix)
-        else:
-            lbl_poster.setText("")
+        self.lbl_poster = lbl_poster
+        self.show_poster()
         v_content.addWidget(lbl_poster, 0, Qt.AlignCenter)
 
         lbl_title = QLabel(self.event_data["title"])
@@ -654,8 +3400,12 @@ class EventDetailDialog(QDialog):
         grid.addWidget(QLabel("<b>Đã Tham Gia:</b>"), 3, 0)
         self.lbl_participants = QLabel(text_tham_gia)
         grid.addWidget(self.lbl_participants, 3, 1)
-        
-        add_info_row(4, "Phân loại:", self.event_data.get("tags", ""))
+        grid.addWidget(QLabel("<b>Danh Sách Chờ:</b>"), 4, 0)
+        self.lbl_waitlist = QLabel()
+        grid.addWidget(self.lbl_waitlist, 4, 1)
+        self.update_waitlist_label()
+
+        add_info_row(5, "Phân loại:", self.event_data.get("tags", ""))
         v_content.addWidget(info_frame)
 
         v_content.addWidget(QLabel("<b>Mô tả:</b>"))
@@ -701,27 +3451,49 @@ class EventDetailDialog(QDialog):
         layout.addLayout(btn_box)
 
     def check_expired(self):
-        try:
-            e_date_str = self.event_data.get("end_date", self.event_data.get("date"))
-            return datetime.strptime(e_date_str, "%d/%m/%Y").date() < datetime.now().date()
-        except: return True
+        times = db.time_index.times(self.event_data.get("id"))
+        return times is None or times[1] < time.time()
+
+    def update_waitlist_label(self):
+        position, total = db.waitlist_position(self.event_data["id"], self.user["id"])
+        if position: self.lbl_waitlist.setText(f"Bạn đang ở vị trí {position}/{total}")
+        else: self.lbl_waitlist.setText(f"{total} người đang chờ" if total else "Không có")
 
     def update_join_btn_state(self):
-        if db.data["current_user"]["id"] in self.event_data["participants"]:
+        participants = self.event_data["participants"]
+        position, _ = db.waitlist_position(self.event_data["id"], db.data["current_user"]["id"])
+        if db.data["current_user"]["id"] in participants:
             self.btn_join.setText("Hủy Tham Gia")
             self.btn_join.setProperty("class", "secondary")
+        elif position:
+            self.btn_join.setText("Rời Danh Sách Chờ")
+            self.btn_join.setProperty("class", "secondary")
+        elif event_capacity(self.event_data) is not None and len(participants) >= event_capacity(self.event_data):
+            self.btn_join.setText("Vào Danh Sách Chờ")
+            self.btn_join.setProperty("class", "primary")
         else:
             self.btn_join.setText("Tham Gia")
             self.btn_join.setProperty("class", "primary")
+        self.btn_join.setEnabled(True)
 
     def toggle_join(self):
-        status, count = db.toggle_participation(self.event_data['id'], db.data["current_user"]["id"])
+        user_id = db.data["current_user"]["id"]
+        if user_id not in self.event_data["participants"] and not db.waitlist_position(self.event_data['id'], user_id)[0]:
+            conflicts = db.join_conflicts(self.event_data['id'], user_id)
+            if conflicts:
+                lines = "\n".join(f"• {e['title']} ({event_time_text(e)})" for e in conflicts[:5])
+                msg = f"Sự kiện này trùng thời gian với sự kiện bạn đã tham gia:\n{lines}\n\nVẫn tham gia?"
+                if QMessageBox.question(self, "Trùng lịch", msg, QMessageBox.Yes | QMessageBox.No) != QMessageBox.Yes: return
+        status, count = db.toggle_participation(self.event_data['id'], user_id, waitlist=True)
         if status:
             max_p = self.event_data.get('max_participants', '∞')
             self.lbl_participants.setText(f"{count}/{max_p} sinh viên" if str(max_p).isdigit() else f"{count} sinh viên")
-            if status == "added": self.event_data["participants"].append(db.data["current_user"]["id"])
-            else: self.event_data["participants"].remove(db.data["current_user"]["id"])
+            self.update_waitlist_label()
             self.update_join_btn_state()
+            if status == "waitlisted":
+                position, _ = db.waitlist_position(self.event_data['id'], user_id)
+                QMessageBox.information(self, "Danh sách chờ", f"Sự kiện đã đủ người, bạn đang ở vị trí {position} trong danh sách chờ.\n"
+                                        "Khi có người hủy tham gia, bạn sẽ được tự động thêm vào sự kiện.")
 
     def edit_event(self): self.done(2)
     def delete_event(self):
@@ -730,18 +3502,17 @@ class EventDetailDialog(QDialog):
             self.done(3)
 
 class EventWizard(QWidget):
+    # Một instance dùng chung cho cả tạo mới lẫn chỉnh sửa; bind() gắn lại form với sự kiện cần sửa
     def __init__(self, nav_callback, event_data=None):
         super().__init__()
         self.nav = nav_callback
-        self.edit_mode = event_data is not None
-        self.event_id = event_data['id'] if self.edit_mode else None
-        self.init_ui(event_data)
+        self.init_ui()
+        self.bind(event_data)
 
-    def init_ui(self, event_data):
+    def init_ui(self):
         layout = QVBoxLayout(self)
-        header_text = "Chỉnh Sửa Sự Kiện" if self.edit_mode else "Tạo Sự Kiện Mới"
-        lbl_header = QLabel(header_text)
-        lbl_header.setProperty("class", "title")
+        self.lbl_header = QLabel()
+        self.lbl_header.setProperty("class", "title")
         btn_back = QPushButton("← Quay Lại")
         btn_back.setObjectName("BackBtn")
         btn_back.clicked.connect(lambda: self.nav("manage_event"))
@@ -749,12 +3520,12 @@ class EventWizard(QWidget):
         header_layout = QHBoxLayout()
         header_layout.addWidget(btn_back)
         header_layout.addStretch()
-        header_layout.addWidget(lbl_header)
+        header_layout.addWidget(self.lbl_header)
         header_layout.addStretch()
         layout.addLayout(header_layout)
 
-        form_scroll = QScrollArea()
-        form_scroll.setWidgetResizable(True)
+        self.form_scroll = QScrollArea()
+        self.form_scroll.setWidgetResizable(True)
         form_content = QWidget()
         form_layout = QGridLayout(form_content)
         form_layout.setSpacing(10)
@@ -784,6 +3555,7 @@ class EventWizard(QWidget):
         btn_poster.clicked.connect(self.choose_poster)
         self.inp_content = QTextEdit() 
         self.inp_tags = QLineEdit()
+        self.inp_tags.setPlaceholderText("VD: Hội thảo, CNTT, Tình nguyện")
         self.inp_max = QLineEdit()
         self.inp_fee = QLineEdit("0")
         
@@ -809,8 +3581,8 @@ class EventWizard(QWidget):
         add_row(8, "Số lượng tối đa:", self.inp_max)
         add_row(9, "Lệ phí:", self.inp_fee)
         
-        form_scroll.setWidget(form_content)
-        layout.addWidget(form_scroll)
+        self.form_scroll.setWidget(form_content)
+        layout.addWidget(self.form_scroll)
         
         btn_box = QHBoxLayout()
         btn_cancel = QPushButton("Hủy")
@@ -823,8 +3595,26 @@ class EventWizard(QWidget):
         btn_box.addWidget(btn_cancel)
         btn_box.addWidget(btn_save)
         layout.addLayout(btn_box)
-        
+
+    def bind(self, event_data=None):
+        self.edit_mode = event_data is not None
+        self.event_id = event_data['id'] if self.edit_mode else None
+        self.lbl_header.setText("Chỉnh Sửa Sự Kiện" if self.edit_mode else "Tạo Sự Kiện Mới")
+        self.clear_form()
         if self.edit_mode: self.load_data(event_data)
+        self.form_scroll.verticalScrollBar().setValue(0)
+
+    def clear_form(self):
+        for w in (self.inp_title, self.inp_location, self.inp_poster, self.inp_tags, self.inp_max, self.inp_desc, self.inp_content): w.clear()
+        self.inp_fee.setText("0")
+        self.inp_start_date.setDate(QDate.currentDate())
+        self.inp_end_date.setDate(QDate.currentDate())
+        self.inp_start_time.setTime(QTime(0, 0))
+        self.inp_end_time.setTime(QTime(0, 0))
+
+    def deactivate(self):
+        # Rời khỏi form: xóa nội dung (kể cả HTML và lịch sử undo) để instance nằm chờ không giữ bộ nhớ
+        self.clear_form()
 
     def choose_poster(self):
         fname, _ = QFileDialog.getOpenFileName(self, "Chọn Poster", "", "Images (*.png *.jpg *.jpeg)")
@@ -864,12 +3654,20 @@ class EventWizard(QWidget):
             "max_participants": self.inp_max.text(),
             "fee": self.inp_fee.text(),
         }
+        conflicts = db.location_conflicts(data, self.event_id if self.edit_mode else None)
+        if conflicts:
+            lines = "\n".join(f"• {e['title']} ({event_time_text(e)})" for e in conflicts[:5])
+            more = f"\n... và {len(conflicts) - 5} sự kiện khác" if len(conflicts) > 5 else ""
+            msg = f"Địa điểm \"{data['location']}\" đã có sự kiện trùng thời gian:\n{lines}{more}\n\nVẫn lưu sự kiện?"
+            if QMessageBox.question(self, "Trùng lịch", msg, QMessageBox.Yes | QMessageBox.No) != QMessageBox.Yes: return
         
         if self.edit_mode: db.update_event(self.event_id, data)
         else: db.add_event(data)
         self.nav("manage_event")
 
-class HomeScreen(BaseScreen):
+class HomeScreen(EventListScreen):
+    SHOW_JOINED = True
+
     def __init__(self, navigator):
         super().__init__(navigator)
         self.navbar = self.create_navbar()
@@ -881,6 +3679,12 @@ class HomeScreen(BaseScreen):
         self.content_layout.setContentsMargins(20, 20, 20, 20)
         self.scroll.setWidget(self.content_widget)
         self.layout.addWidget(self.scroll)
+        self.image_owner = object()
+        self.avatar_key = None
+        image_loader().image_ready.connect(self.on_image_ready)
+
+    def on_image_ready(self, key):
+        if key == self.avatar_key: self.update_avatar_button()
 
     def create_navbar(self):
         navbar = QFrame()
@@ -935,16 +3739,8 @@ class HomeScreen(BaseScreen):
         self.scroll.setWidget(self.content_widget)
         self.content_layout = QVBoxLayout(self.content_widget)
         self.content_layout.setContentsMargins(20, 20, 20, 20)
-
-        avatar_path = self.current_user.get("avatar", "")
-        if os.path.exists(avatar_path):
-            pix = mask_image_circular(QPixmap(avatar_path), 40)
-            self.btn_avatar.setText("")  
-            self.btn_avatar.setIcon(QIcon(pix))
-            self.btn_avatar.setIconSize(QSize(36, 36))
-        else:
-            self.btn_avatar.setIcon(QIcon()) 
-            self.btn_avatar.setText("👤")
+        self.built_for = self.current_user["id"]
+        self.update_avatar_button()
 
         if role == "admin":
             btn_container = QHBoxLayout()
@@ -961,88 +3757,35 @@ class HomeScreen(BaseScreen):
             
             self.content_layout.addLayout(btn_container)
 
+        self.render_search_box()
+        self.render_facet_bar()
         self.render_event_section("Sự Kiện Đang Diễn Ra", "🟢", is_ongoing=True)
         self.render_event_section("Sự Kiện Đã Hết Hạn", "🔴", is_ongoing=False)
         self.content_layout.addStretch()
 
-    def render_event_section(self, title, icon, is_ongoing):
-        header = QLabel(f"{icon} {title}")
-        header.setProperty("class", "header")
-        self.content_layout.addWidget(header)
-        events = db.data["events"]
-        filtered = []
-        now = datetime.now().date()
-        for e in events:
-            try:
-                e_date = datetime.strptime(e.get("end_date", e.get("date")), "%d/%m/%Y").date()
-                if (is_ongoing and e_date >= now) or (not is_ongoing and e_date < now): filtered.append(e)
-            except: pass 
-        
-        if not filtered:
-            lbl_empty = QLabel("Hiện chưa có sự kiện nào." if is_ongoing else "Không có sự kiện cũ.")
-            lbl_empty.setStyleSheet("color: #777; font-style: italic; margin-left: 20px;")
-            self.content_layout.addWidget(lbl_empty)
-            return
-
-        grid_widget = QWidget()
-        grid = QGridLayout(grid_widget)
-        grid.setSpacing(20)
-        col = 0; row = 0; MAX_COL = 4
-        for event in filtered:
-            card = self.create_event_card(event)
-            grid.addWidget(card, row, col)
-            col += 1
-            if col >= MAX_COL: col = 0; row += 1
-        self.content_layout.addWidget(grid_widget)
-        self.content_layout.addSpacing(20)
-
-    def create_event_card(self, event):
-        card = QFrame()
-        card.setObjectName("Card")
-        card.setFixedSize(230, 310)
-        card.setCursor(Qt.PointingHandCursor)
-        card.mousePressEvent = lambda ev: self.open_event_detail(event)
-
-        vbox = QVBoxLayout(card)
-        vbox.setContentsMargins(10,10,10,10)
-        vbox.setSpacing(5)
-        
-        lbl_img = QLabel()
-        lbl_img.setStyleSheet("background-color: #eee; border-radius: 6px;")
-        lbl_img.setFixedSize(208, 140)
-        lbl_img.setAlignment(Qt.AlignCenter)
-        if os.path.exists(event.get("poster", "")):
-            pix = QPixmap(event.get("poster")).scaled(208, 140, Qt.KeepAspectRatioByExpanding, Qt.SmoothTransformation)
-            lbl_img.setPixmap(pix)
-        vbox.addWidget(lbl_img)
-
-        lbl_name = QLabel(event["title"])
-        lbl_name.setWordWrap(True)
-        lbl_name.setStyleSheet("font-weight: bold; font-size: 15px; color: #333;")
-        lbl_name.setAlignment(Qt.AlignTop)
-        vbox.addWidget(lbl_name)
-        
-        s_date = event.get("start_date", event.get("date"))
-        date_str = s_date + (f" - {event.get('end_date')}" if event.get('end_date') and event.get('end_date') != s_date else "")
-        lbl_date = QLabel(f"📅 {date_str}")
-        lbl_date.setStyleSheet("color: #666; font-size: 12px;")
-        vbox.addWidget(lbl_date)
-
-        if db.data["current_user"]["id"] in event["participants"]:
-            lbl_joined = QLabel("✅ Đã tham gia")
-            lbl_joined.setStyleSheet("color: #388E3C; font-weight: bold; font-size: 12px;")
-            vbox.addWidget(lbl_joined)
+    def update_avatar_button(self):
+        avatar_path = self.current_user.get("avatar", "")
+        self.avatar_key = ImageLoader.key(avatar_path, 40, 40)
+        pix = avatars.get(avatar_path, 40, owner=self.image_owner)
+        if pix is not None and not pix.isNull():
+            self.btn_avatar.setText("")  
+            self.btn_avatar.setIcon(QIcon(pix))
+            self.btn_avatar.setIconSize(QSize(36, 36))
+        else:
+            self.btn_avatar.setIcon(QIcon()) 
+            self.btn_avatar.setText("👤")
 
-        vbox.addWidget(EventCountdown(event))
-        vbox.addStretch()
-        return card
+    def on_data_changed(self, change, payload):
+        super().on_data_changed(change, payload)
+        if change == "user_updated" and self.built_for == payload["user"]["id"]:
+            self.current_user = payload["user"]
+            self.update_avatar_button()
 
-    def open_event_detail(self, event):
+    def open_event(self, event):
         user = db.data["current_user"]
         dialog = EventDetailDialog(event, user, self)
         res = dialog.exec()
         if res in [2, 3]: self.nav("manage_event")
-        else: self.load_content()
 
 class ProfileScreen(BaseScreen):
     def __init__(self, navigator):
@@ -1052,6 +3795,13 @@ class ProfileScreen(BaseScreen):
         self.content_widget = QWidget()
         self.scroll.setWidget(self.content_widget)
         self.layout.addWidget(self.scroll)
+        self.image_owner = object()
+        self.avatar_path = None
+        image_loader().image_ready.connect(self.on_image_ready)
+
+    def on_image_ready(self, key):
+        if self.avatar_path and key == ImageLoader.key(self.avatar_path, 150, 150) and isValid(self.lbl_avatar):
+            self.update_avatar_display(self.avatar_path)
         
     def refresh_ui(self):
         user = db.data["current_user"]
@@ -1171,8 +3921,12 @@ class ProfileScreen(BaseScreen):
         main_layout.addLayout(right_panel, 3)
 
     def update_avatar_display(self, path):
-        if path and os.path.exists(path):
-            pix = mask_image_circular(QPixmap(path), 150)
+        self.avatar_path = path
+        pix = avatars.get(path, 150, owner=self.image_owner)
+        if pix is None:
+            self.lbl_avatar.setPixmap(QPixmap())
+            self.lbl_avatar.setText("Đang tải ảnh...")
+        elif not pix.isNull():
             self.lbl_avatar.setPixmap(pix)
         else:
             self.lbl_avatar.setPixmap(QPixmap())
@@ -1182,10 +3936,12 @@ class ProfileScreen(BaseScreen):
     def change_avatar(self):
         fname, _ = QFileDialog.getOpenFileName(self, "Chọn Ảnh Đại Diện", "", "Images (*.png *.jpg *.jpeg)")
         if fname:
+            avatars.invalidate(fname) # File có thể đã được sửa tại chỗ kể từ lần chọn trước
             self.update_avatar_display(fname)
             self.fields["avatar_new_path"] = fname 
             self.on_data_changed()
     def remove_avatar(self):
+        avatars.invalidate(self.avatar_path)
         self.update_avatar_display("") 
         self.fields["avatar_new_path"] = "" 
         self.on_data_changed()
@@ -1225,7 +3981,11 @@ class ProfileScreen(BaseScreen):
             db.delete_account()
             self.nav("start")
 
-class ManageEventScreen(BaseScreen):
+class ManageEventScreen(EventListScreen):
+    GRID_SPACING = 15
+    SECTION_SPACING = 30
+    EMPTY_TEXT = {True: "Hiện chưa có sự kiện nào.", False: "Hiện chưa có sự kiện nào."}
+
     def __init__(self, navigator):
         super().__init__(navigator)
         self.scroll = QScrollArea()
@@ -1241,6 +4001,7 @@ class ManageEventScreen(BaseScreen):
         self.scroll.setWidget(self.content_widget)
         self.content_layout = QVBoxLayout(self.content_widget)
         self.content_layout.setContentsMargins(20, 20, 20, 20)
+        self.built_for = db.data["current_user"]["id"] if db.data.get("current_user") else None
             
         header_layout = QGridLayout()
         
@@ -1266,82 +4027,97 @@ class ManageEventScreen(BaseScreen):
         self.content_layout.addWidget(btn_create)
         self.content_layout.addSpacing(20)
         
+        self.render_search_box()
         self.render_event_section("Sự Kiện Đang Diễn Ra", "🟢", is_ongoing=True)
         self.render_event_section("Sự Kiện Đã Hết Hạn", "🔴", is_ongoing=False)
         self.content_layout.addStretch()
 
-    def render_event_section(self, title, icon, is_ongoing):
-        header = QLabel(f"{icon} {title}")
-        header.setProperty("class", "header")
-        self.content_layout.addWidget(header)
-        events = db.data["events"]
-        filtered = []
-        now = datetime.now().date()
-        for e in events:
-            try:
-                e_date = datetime.strptime(e.get("end_date", e.get("date")), "%d/%m/%Y").date()
-                if (is_ongoing and e_date >= now) or (not is_ongoing and e_date < now): filtered.append(e)
-            except: pass 
-        
-        if not filtered:
-            lbl_empty = QLabel("Hiện chưa có sự kiện nào.")
-            lbl_empty.setStyleSheet("color: #777; font-style: italic; margin-left: 20px;")
-            self.content_layout.addWidget(lbl_empty)
-            return
-
-        grid_widget = QWidget()
-        grid = QGridLayout(grid_widget)
-        grid.setSpacing(15)
-        col = 0; row = 0; MAX_COL = 4
-        for e in filtered:
-            card = self.create_event_card(e)
-            grid.addWidget(card, row, col)
-            col += 1
-            if col >= MAX_COL: col = 0; row += 1
-        self.content_layout.addWidget(grid_widget)
-        self.content_layout.addSpacing(30)
-
-    def create_event_card(self, event):
-        card = QFrame()
-        card.setObjectName("Card")
-        card.setFixedSize(230, 310)
-        card.setCursor(Qt.PointingHandCursor)
-        card.mousePressEvent = lambda ev: self.open_event_popup(event)
-
-        vbox = QVBoxLayout(card)
-        vbox.setContentsMargins(10,10,10,10)
-        lbl_img = QLabel()
-        lbl_img.setStyleSheet("background-color: #eee; border-radius: 6px;")
-        lbl_img.setFixedSize(208, 140)
-        lbl_img.setAlignment(Qt.AlignCenter)
-        if os.path.exists(event.get("poster", "")):
-            pix = QPixmap(event.get("poster")).scaled(208, 140, Qt.KeepAspectRatioByExpanding, Qt.SmoothTransformation)
-            lbl_img.setPixmap(pix)
-        vbox.addWidget(lbl_img)
-
-        lbl_name = QLabel(event["title"])
-        lbl_name.setWordWrap(True)
-        lbl_name.setStyleSheet("font-weight: bold; font-size: 15px; color: #333;")
-        lbl_name.setAlignment(Qt.AlignTop)
-        vbox.addWidget(lbl_name)
-        
-        s_date = event.get("start_date", event.get("date"))
-        date_str = s_date + (f" - {event.get('end_date')}" if event.get('end_date') and event.get('end_date') != s_date else "")
-        lbl_date = QLabel(f"📅 {date_str}")
-        lbl_date.setStyleSheet("color: #666; font-size: 12px;")
-        vbox.addWidget(lbl_date)
-        vbox.addWidget(EventCountdown(event))
-        vbox.addStretch()
-        return card
-
-    def open_event_popup(self, event):
-        role = db.data["current_user"]["role"]
-        dialog = EventDetailDialog(event, {"role": role}, self)
+    def open_event(self, event):
+        dialog = EventDetailDialog(event, db.data["current_user"], self)
         res = dialog.exec()
         if res == 2: self.nav("edit_event", event)
-        elif res == 3: self.load_content()
+
+class SplashScreen(QWidget):
+    def __init__(self):
+        super().__init__()
+        layout = QVBoxLayout(self)
+        layout.setAlignment(Qt.AlignCenter)
+        logo = QLabel()
+        logo.setPixmap(get_logo_pixmap(120))
+        logo.setAlignment(Qt.AlignCenter)
+        status = QLabel("Đang tải dữ liệu...")
+        status.setStyleSheet("color: #777;")
+        status.setAlignment(Qt.AlignCenter)
+        layout.addWidget(logo)
+        layout.addWidget(status)
+
+def widget_count(widget):
+    return len(widget.findChildren(QWidget)) + 1
+
+class ScreenManager:
+    # Vòng đời màn hình trong QStackedWidget: tạo khi cần lần đầu rồi dùng lại; màn hình tạm đang ẩn
+    # bị gỡ theo thứ tự ít dùng gần đây nhất khi tổng số widget của chúng vượt ngân sách
+    def __init__(self, stack, types, nav_callback, transient=(), budget=SCREEN_WIDGET_BUDGET):
+        self.stack = stack
+        self.types = types
+        self.nav = nav_callback
+        self.transient = set(transient)
+        self.budget = budget
+        self.screens = OrderedDict()
+        self.created = 0
+        self.evicted = 0
+
+    def peek(self, name):
+        return self.screens.get(name)
+
+    def get(self, name):
+        screen = self.screens.get(name)
+        if screen is None:
+            screen = self.screens[name] = self.types[name](self.nav)
+            self.stack.addWidget(screen)
+            self.created += 1
+        self.screens.move_to_end(name)
+        return screen
+
+    def activate(self, screen):
+        previous = self.stack.currentWidget()
+        self.stack.setCurrentWidget(screen)
+        if previous is not screen and hasattr(previous, "deactivate"): previous.deactivate()
+        self.trim()
+        if SCREEN_STATS: print(f"screens: {self.stats()}", file=sys.stderr)
+
+    def trim(self):
+        current = self.stack.currentWidget()
+        idle = [(name, screen) for name, screen in self.screens.items() if name in self.transient and screen is not current]
+        costs = {name: widget_count(screen) for name, screen in idle}
+        total = sum(costs.values())
+        for name, _ in idle:
+            if total <= self.budget: break
+            total -= costs[name]
+            self.release(name)
+
+    def release(self, name):
+        screen = self.screens.pop(name, None)
+        if screen is None: return
+        self.stack.removeWidget(screen)
+        screen.deleteLater()
+        self.evicted += 1
+
+    def stats(self):
+        return {"screens": list(self.screens), "stack": self.stack.count(),
+                "widgets": {name: widget_count(screen) for name, screen in self.screens.items()},
+                "app_widgets": len(QApplication.allWidgets()), "created": self.created, "evicted": self.evicted}
 
 class MainWindow(QMainWindow):
+    # Màn hình chỉ được tạo khi navigate() cần đến lần đầu; các màn hình tạm có thể bị gỡ khi không dùng
+    SCREEN_TYPES = {
+        "start": StartScreen, "login": LoginScreen, "register": RegisterScreen,
+        "forgot_pass": ForgotPasswordScreen, "home": HomeScreen,
+        "profile": ProfileScreen, "manage_event": ManageEventScreen,
+        "event_wizard": EventWizard,
+    }
+    TRANSIENT_SCREENS = ("start", "login", "register", "forgot_pass", "profile", "event_wizard")
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Quản Lý Sự Kiện - PTIT")
@@ -1349,39 +4125,233 @@ class MainWindow(QMainWindow):
         self.setStyleSheet(STYLESHEET)
         self.stack = QStackedWidget()
         self.setCentralWidget(self.stack)
-        self.screens = {}
-        self.init_screens()
+        self.screens = ScreenManager(self.stack, self.SCREEN_TYPES, self.navigate, self.TRANSIENT_SCREENS)
+        self.splash = SplashScreen()
+        self.stack.addWidget(self.splash)
+        self.installEventFilter(self)
+        self.load_timer = QTimer(self)
+        self.load_timer.setInterval(DATA_POLL_MS)
+        self.load_timer.timeout.connect(self.check_data_loaded)
+
+    def start(self):
+        db.load_async()
+        self.load_timer.start()
+
+    def eventFilter(self, obj, event):
+        if obj is self and event.type() == QEvent.Paint:
+            startup.mark("first_frame")
+            self.removeEventFilter(self)
+        return super().eventFilter(obj, event)
+
+    def check_data_loaded(self):
+        if not db.ready.is_set(): return
+        self.load_timer.stop()
+        # Bộ đếm giờ đọc time_index nên chỉ gắn sau khi luồng nạp dữ liệu đã xong
+        ticker = countdown_ticker()
+        ticker.watch_window(self)
+        ticker.event_ended.connect(self.on_event_ended)
+        if isinstance(db, RemoteDataManager) or db.shared:
+            self.sync_timer = QTimer(self)
+            self.sync_timer.setInterval(SHARED_POLL_MS if db.shared else REMOTE_SYNC_MS)
+            self.sync_timer.timeout.connect(self.sync_remote)
+            self.sync_timer.start()
         if db.data.get("current_user"): self.navigate("home")
         else: self.navigate("start")
+        self.stack.removeWidget(self.splash)
+        self.splash.deleteLater()
+        self.splash = None
+        startup.mark("first_screen")
+        if db.load_error: QMessageBox.warning(self, "Lỗi dữ liệu", f"Không đọc được dữ liệu đã lưu:\n{db.load_error}")
+        QTimer.singleShot(0, self.finish_startup)
+
+    def sync_remote(self):
+        try: db.sync()
+        except (OSError, RemoteError): pass # Mất kết nối: thử lại ở lần hẹn giờ sau
 
-    def init_screens(self):
-        self.screens["start"] = StartScreen(self.navigate)
-        self.screens["login"] = LoginScreen(self.navigate)
-        self.screens["register"] = RegisterScreen(self.navigate)
-        self.screens["forgot_pass"] = ForgotPasswordScreen(self.navigate)
-        self.screens["home"] = HomeScreen(self.navigate)
-        self.screens["profile"] = ProfileScreen(self.navigate)
-        self.screens["manage_event"] = ManageEventScreen(self.navigate)
-        for s in self.screens.values(): self.stack.addWidget(s)
+    def finish_startup(self):
+        startup.mark("first_screen_painted")
+        startup.emit()
 
+    def on_event_ended(self, event_id):
+        for name in ("home", "manage_event"):
+            screen = self.screens.peek(name)
+            if screen: screen.on_event_ended(event_id)
+
+    @tracer.traced("navigate", cat="ui", arg=1)
     def navigate(self, screen_name, data=None):
         self.setUpdatesEnabled(False) 
         try:
-            if screen_name == "create_event":
-                wiz = EventWizard(self.navigate)
-                self.stack.addWidget(wiz)
-                self.stack.setCurrentWidget(wiz)
-            elif screen_name == "edit_event":
-                wiz = EventWizard(self.navigate, data)
-                self.stack.addWidget(wiz)
-                self.stack.setCurrentWidget(wiz)
-            elif screen_name in self.screens:
-                if screen_name == "home": self.screens["home"].load_content()
-                elif screen_name == "manage_event": self.screens["manage_event"].load_content()
-                elif screen_name == "profile": self.screens["profile"].refresh_ui()
-                self.stack.setCurrentWidget(self.screens[screen_name])
+            if screen_name in ("create_event", "edit_event"):
+                screen = self.screens.get("event_wizard")
+                screen.bind(data if screen_name == "edit_event" else None)
+            elif screen_name in self.SCREEN_TYPES:
+                screen = self.screens.get(screen_name)
+                if screen_name in ("home", "manage_event"): screen.show_content()
+                elif screen_name == "profile": screen.refresh_ui()
+            else: return
+            self.screens.activate(screen)
         finally:
             self.setUpdatesEnabled(True)
+        tracer.sample_memory(screen_name)
+
+def file_format(path, fmt=None):
+    if fmt: return fmt
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+def read_rows(path, fmt):
+    # Đọc từng dòng một; dòng JSON hỏng được trả về là None để báo lỗi đúng số dòng
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        if fmt == "csv":
+            for line_no, row in enumerate(csv.DictReader(f), start=2): yield line_no, row
+        else:
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip(): continue
+                try: row = json.loads(line)
+                except ValueError: row = None
+                yield line_no, row if isinstance(row, dict) else None
+
+def text_field(row, key):
+    value = row.get(key)
+    return "" if value is None else str(value).strip()
+
+def validate_user_batch(manager, batch, seen):
+    checked = []
+    for line_no, row in batch:
+        if row is None: checked.append((line_no, None, "Dòng không đọc được")); continue
+        user = {key: text_field(row, key) for key in USER_FIELDS}
+        user["password"] = text_field(row, "password")
+        user["role"] = user["role"] or "student"
+        user["gender"] = user["gender"] or "Nam"
+        if not user["username"]: problem = "Thiếu tên đăng nhập"
+        elif not is_valid_email(user["email"]): problem = "Email không hợp lệ"
+        elif not is_valid_password(user["password"]): problem = "Mật khẩu không đủ mạnh"
+        elif user["role"] not in ("student", "admin"): problem = "Vai trò phải là student hoặc admin"
+        else: problem = None
+        checked.append((line_no, user, problem))
+    # Kiểm tra trùng qua chỉ mục tên đăng nhập/email, mỗi lô chỉ lấy khoá một lần
+    with manager.lock:
+        for line_no, user, problem in checked:
+            if problem: yield line_no, None, problem; continue
+            keys = ("u:" + user["username"].lower(), "e:" + user["email"].lower())
+            if user["username"].lower() in manager._users_by_username or user["email"].lower() in manager._users_by_email or keys[0] in seen or keys[1] in seen:
+                yield line_no, None, "duplicate"; continue
+            seen.update(keys)
+            yield line_no, user, None
+
+def validate_event_batch(manager, batch, seen):
+    checked = []
+    for line_no, row in batch:
+        if row is None: checked.append((line_no, None, None, "Dòng không đọc được")); continue
+        event = {key: text_field(row, key) for key in EVENT_FIELDS}
+        event["start_time"] = event["start_time"] or "00:00"
+        event["end_time"] = event["end_time"] or "23:59"
+        event["end_date"] = event["end_date"] or event["start_date"]
+        event["date"] = event["start_date"]
+        times = parse_event_times(event)
+        if not event["title"] or not event["location"]: problem = "Thiếu tên hoặc địa điểm"
+        elif not times: problem = "Ngày giờ không hợp lệ (dd/MM/yyyy, HH:mm)"
+        elif times[1] < times[0]: problem = "Thời gian kết thúc trước thời gian bắt đầu"
+        elif event["max_participants"] and not event["max_participants"].isdigit(): problem = "Số lượng tối đa phải là số"
+        else: problem = None
+        checked.append((line_no, event, times, problem))
+    # Trùng = cùng tên, cùng địa điểm, cùng khung giờ; tra qua chỉ mục lịch theo địa điểm
+    with manager.lock:
+        for line_no, event, times, problem in checked:
+            if problem: yield line_no, None, problem; continue
+            title = fold_text(event["title"])
+            key = (title, location_key(event["location"])) + times
+            existing = manager.schedule.location_conflicts(event["location"], *times)
+            if key in seen or any(fold_text(manager.get_event(i)["title"]) == title and manager.schedule.times[i] == times for i in existing):
+                yield line_no, None, "duplicate"; continue
+            seen.add(key)
+            yield line_no, event, None
+
+def import_file(kind, path, fmt=None, manager=None):
+    manager = manager or db
+    validate = validate_user_batch if kind == "users" else validate_event_batch
+    report = {"imported": 0, "duplicates": 0, "errors": []}
+    staged, seen = [], set()
+
+    def commit_staged():
+        # Ghi theo từng đợt cố định để bộ nhớ không tăng theo kích thước file; seen là trạng thái duy nhất giữ cho cả file
+        imported = manager.bulk_import(users=staged)[0] if kind == "users" else manager.bulk_import(events=staged)[1]
+        report["imported"] += imported
+        report["duplicates"] += len(staged) - imported
+        staged.clear()
+
+    rows = read_rows(path, file_format(path, fmt))
+    while True:
+        batch = list(islice(rows, IMPORT_BATCH))
+        if not batch: break
+        for line_no, record, problem in validate(manager, batch, seen):
+            if problem == "duplicate": report["duplicates"] += 1
+            elif problem: report["errors"].append((line_no, problem))
+            else: staged.append(record)
+        if len(staged) >= IMPORT_COMMIT_ROWS: commit_staged()
+    if staged: commit_staged()
+    return report
+
+def export_row(kind, item, include_passwords):
+    if kind == "users":
+        row = {"id": item["id"], **{key: item.get(key, "") for key in USER_FIELDS}}
+        if include_passwords: row["password"] = item.get("password", "")
+    else:
+        row = {"id": item["id"], **{key: item.get(key, "") for key in EVENT_FIELDS}}
+        row["participants"] = list(item.get("participants", ()))
+    return row
+
+def export_file(kind, path, fmt=None, include_passwords=False, manager=None):
+    # Ghi từng dòng ra file, không dựng toàn bộ nội dung trong bộ nhớ
+    manager = manager or db
+    with manager.lock: items = list(manager.data[kind])
+    fields = ["id", *(USER_FIELDS if kind == "users" else EVENT_FIELDS)]
+    if kind == "users" and include_passwords: fields.append("password")
+    if kind == "events": fields.append("participants")
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        if file_format(path, fmt) == "csv":
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            for item in items:
+                row = export_row(kind, item, include_passwords)
+                if kind == "events": row["participants"] = ";".join(row["participants"])
+                writer.writerow(row)
+        else:
+            for item in items: f.write(json.dumps(export_row(kind, item, include_passwords), ensure_ascii=False) + "\n")
+    return len(items)
+
+def run_cli(argv):
+    parser = argparse.ArgumentParser(prog="main.py", description="Nhập/xuất hàng loạt người dùng và sự kiện (không mở giao diện)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="Chạy máy chủ dữ liệu dùng chung cho nhiều máy khách (EVENT_APP_SERVER=host:port)")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=SERVER_PORT)
+    for name in ("import", "export"):
+        cmd = commands.add_parser(name)
+        cmd.add_argument("kind", choices=("users", "events"))
+        cmd.add_argument("path")
+        cmd.add_argument("--format", choices=("csv", "jsonl"), help="Mặc định đoán theo đuôi file")
+        if name == "export": cmd.add_argument("--include-passwords", action="store_true")
+    args = parser.parse_args(argv)
+    if isinstance(db, RemoteDataManager):
+        print("Lệnh này làm việc trên file dữ liệu cục bộ; hãy chạy trên máy chủ (bỏ EVENT_APP_SERVER).", file=sys.stderr)
+        return 2
+    db.load_data()
+    if args.command == "serve":
+        db.change_log = ChangeLog()
+        try: asyncio.run(EventServer(db).serve(args.host, args.port))
+        except KeyboardInterrupt: pass
+        finally: db.flush()
+        return 0
+    started = time.perf_counter()
+    if args.command == "import":
+        report = import_file(args.kind, args.path, args.format)
+        for line_no, problem in report["errors"][:20]: print(f"Dòng {line_no}: {problem}", file=sys.stderr)
+        if len(report["errors"]) > 20: print(f"... và {len(report['errors']) - 20} lỗi khác", file=sys.stderr)
+        print(f"Đã nhập {report['imported']} {args.kind}, bỏ qua {report['duplicates']} bản trùng, {len(report['errors'])} dòng lỗi ({time.perf_counter() - started:.2f}s)")
+        return 1 if report["errors"] else 0
+    count = export_file(args.kind, args.path, args.format, args.include_passwords)
+    print(f"Đã xuất {count} {args.kind} ra {args.path} ({time.perf_counter() - started:.2f}s)")
+    return 0
 
 def resource_path(relative_path):
     if hasattr(sys, '_MEIPASS'):
@@ -1389,9 +4359,15 @@ def resource_path(relative_path):
     return os.path.join(os.path.abspath("."), relative_path)
 
 if __name__ == "__main__":
+    startup.mark("modules_loaded")
+    if len(sys.argv) > 1 and sys.argv[1] in ("import", "export", "serve"): sys.exit(run_cli(sys.argv[1:]))
     app = QApplication(sys.argv)
+    app.aboutToQuit.connect(db.flush)
+    startup.mark("qapplication")
     window = MainWindow()
     icon_path = resource_path(LOGO_PATH)
     window.setWindowIcon(QIcon(icon_path))
     window.show()
+    startup.mark("window_shown")
+    window.start()
     sys.exit(app.exec())
\ No newline at end of file